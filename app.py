@@ -1,40 +1,93 @@
+import time
+_import_started = time.perf_counter()
+import asyncio
 import os
+import re
 import json
-from flask import Flask, render_template, request, jsonify
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
 from database import *
+from context_builder import build_context, context_ids, hydrate_groups
+import metrics
+from semantic_cache import SemanticCache
+from knowledge_base import knowledge_context, get_knowledge_index, KNOWLEDGE_TOKEN_BUDGET, KNOWLEDGE_TOP_SECTIONS
+from history import history_window, history_stats, fold_history, afold_history, fold_pool, format_line
+from faq_answers import FaqAnswers, FAQ_ANSWERS_ENABLED, content_hash
+import intent_classifier
+from streaming import sse, CategoryStreamParser
+from json_repair import repair_category_json, validate_id_groups, JSONRepairError
+from category_descriptions import category_descriptions
+from translation import (
+    translation_prompt, translate_to_hindi, atranslate_to_hindi,
+    translate_batch_to_hindi, atranslate_batch_to_hindi
+)
 from typing import Annotated
 from typing_extensions import TypedDict
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langgraph.checkpoint.memory import MemorySaver
+from checkpoint_store import SqliteCheckpointSaver
+from sessions import SessionStore, SESSION_COOKIE, SESSION_COOKIE_MAX_AGE, SESSION_HEADER
+from scheduler import llm_scheduler, Overloaded
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.graph.message import add_messages 
+from langgraph.channels.untracked_value import UntrackedValue
 from typing_extensions import TypedDict
-from bs4 import BeautifulSoup
 import requests
 from urllib.parse import urlparse
 import json
-import tiktoken
 import html
 
 app = Flask(__name__)
 
-CORS(app)
+CORS(app, expose_headers=[SESSION_HEADER])
 
-memory = MemorySaver()
-thread_id = 1
+# Checkpoints in a SQLite file shared by every worker; 'memory' keeps them per process
+CHECKPOINTER = os.getenv('CHECKPOINTER', 'sqlite')
+memory = SqliteCheckpointSaver() if CHECKPOINTER == 'sqlite' else MemorySaver()
+session_store = SessionStore(checkpointer=memory)
+metrics.register_collector('sessions', session_store.stats)
+
+
+def checkpoint_stats():
+    if isinstance(memory, SqliteCheckpointSaver):
+        return memory.stats()
+    return {'backend': 'memory', 'threads': len(memory.storage)}
+
+
+metrics.register_collector('checkpoints', checkpoint_stats)
+
+# Final specialised answers, reused for rephrasings of the same question
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+answer_cache = SemanticCache(
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+    maxsize=int(os.getenv('SEMANTIC_CACHE_SIZE', '512')),
+    ttl=int(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+)
+metrics.register_collector('answer_cache', answer_cache.stats)
 
 class State(TypedDict):
     intent: str
     user_query: Annotated[list, add_messages]
     pages_summary = str
-    context: Annotated[list, add_messages]
+    # Per-turn values: replaced by each turn and never checkpointed
+    context: Annotated[str, UntrackedValue]
     response: Annotated[list, add_messages]
     language: str
+    retrieval: Annotated[dict, UntrackedValue]
+    # Catalog rows listed in context, by id, for id-only answers
+    context_rows: Annotated[dict, UntrackedValue]
+    semantic_cache: Annotated[dict, UntrackedValue]
+    # Rolling summary of the user turns before the history window, and how many it covers
+    history_summary: str
+    history_summarized: int
 
 graph_builder=StateGraph(State)
 
 def clean_html(html_text):
+    from bs4 import BeautifulSoup
     decoded_html = html.unescape(html_text)
     soup = BeautifulSoup(decoded_html, 'html.parser')
     for tag in soup(['style', 'script']):
@@ -49,6 +102,7 @@ def remove_src_attributes(html_text):
 
 
 def clean_html_truncate(html_text, max_words=250):
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_text or "", "html.parser")
     plain_text = soup.get_text(separator=" ")
     words = plain_text.split()
@@ -74,39 +128,19 @@ def truncate_context(text_or_list, max_words: int = 700) -> str:
     return ' '.join(words[:max_words])
 
 
-def translate_to_hindi(text: str) -> str:
-    try:
-        translation_prompt = PromptTemplate.from_template(
-            """You are a professional translator. Translate the following text into Hindi.
-            
-            Preserve:
-            - Formatting
-            - Structure (headings, bullet points, etc.)
-            - Punctuation
-            - Names of people, places, and organizations (as appropriate)
-            - Do not give the answer as here is the hindi translation. Give give response as given in the english text.
-            - Preserve the gender as well.
-
-            Text:
-            {text}
-
-            Hindi Translation:
-            """
-        )
-        chain = translation_prompt | llm
-        result = chain.invoke({'text': text})
-        return result.content
-    except Exception as e:
-        print("Translation error:", e)
-        return text 
-    
-
 def truncate_text(text, max_tokens=850):
     words = text.split()
     return ' '.join(words[:max_tokens])
 
 
+# Set by async_app while it serves: fetches pages on its pooled async
+# HTTP client for summarise handlers running on its blocking pool
+page_fetcher = None
+
+
 def extract_page_content(url):
+    if page_fetcher is not None:
+        return page_fetcher(url)
     try:
         with requests.get(url, stream=True) as response:
             response.raise_for_status()
@@ -149,7 +183,7 @@ def summarise_content(data, language):
     )
 
     try:
-        chain = qa_prompt | llm
+        chain = qa_prompt | get_llm()
         response = chain.invoke({'context': truncated_text})
         english_response = response.content
 
@@ -164,408 +198,653 @@ def summarise_content(data, language):
 
 # Intent Classification
 #------------------------------------------------------------------------------------------------
-def identify_intent(state: State):
-    latest_question = (
-        state["user_query"][-1].content
-        if state["user_query"]
-        else ""
-    )
+classification_prompt = PromptTemplate.from_template(
+    """
+    You are an intent classification model for the Indian Culture Portal (IPC).
+    Classify the user query into one of these intents:
+
+    1. Greeting:
+    - The user greets you (e.g., "Hello", "Hi").
+    2. General:
+    - The user asks about your capabilities, who you are, or general questions not requiring data lookup.
+    - Includes administrative questions about the portal itself and categories description.(e.g., "Who developed this portal?", "What can you do?", "What is NVLI", "Url of a particular category", "What is a particular category about", "What is folktales about", What is timeless trends category about", "Description of ebooks").
+    3. Specialised:
+    - The user asks for specific information about Indian culture, history, books, or content that requires searching databases or knowledge content.
+    - Example: "Tell me about Mughal architecture."
+    4. Unknown:
+    - The query is unclear or does not fit any category.
+
+    **Examples:**
+
+    - "Hi there" -> Greeting
+    - "What can you do?" -> General
+    - "Explain Vedic literature." -> Specialised
+    - "asdlkj" -> Unknown
+
+    User Query:
+    {latest_question}
+
+    Respond with only the intent name (Greeting, General, Specialised, Unknown). No explanation.
+    """
+)
+
+
+def classify_intent_with_llm(latest_question):
+    response = (classification_prompt | get_llm()).invoke({"latest_question": latest_question})
+    return response.content.strip()
+
+
+async def aclassify_intent_with_llm(latest_question):
+    response = await (classification_prompt | get_llm()).ainvoke({"latest_question": latest_question})
+    return response.content.strip()
 
-    # Build the prompt template
-    classification_prompt = PromptTemplate.from_template(
-        """
-            You are an intent classification model for the Indian Culture Portal (IPC).
-            Classify the user query into one of these intents:
-
-            1. Greeting:
-            - The user greets you (e.g., "Hello", "Hi").
-            2. General:
-            - The user asks about your capabilities, who you are, or general questions not requiring data lookup.
-            - Includes administrative questions about the portal itself and categories description.(e.g., "Who developed this portal?", "What can you do?", "What is NVLI", "Url of a particular category", "What is a particular category about", "What is folktales about", What is timeless trends category about", "Description of ebooks").
-            3. Specialised:
-            - The user asks for specific information about Indian culture, history, books, or content that requires searching databases or knowledge content.
-            - Example: "Tell me about Mughal architecture."
-            4. Unknown:
-            - The query is unclear or does not fit any category.
-
-            **Examples:**
-
-            - "Hi there" -> Greeting
-            - "What can you do?" -> General
-            - "Explain Vedic literature." -> Specialised
-            - "asdlkj" -> Unknown
-
-            User Query:
-            {latest_question}
-
-            Respond with only the intent name (Greeting, General, Specialised, Unknown). No explanation.
-            """
-    )
 
-    chain = classification_prompt | llm
+def latest_user_question(state: State):
+    return state["user_query"][-1].content if state["user_query"] else ""
 
-    response = chain.invoke({"latest_question": latest_question})
-    intent = response.content.strip()
 
+def intent_update(intent):
     print("Intent Classification Response:", intent)
     return {"intent": intent}
 
 
+def identify_intent(state: State):
+    question = latest_user_question(state)
+    retrieval = start_retrieval(question)
+    # Local rules / nearest-centroid first, LLM only when unsure
+    return {**intent_update(intent_classifier.classify(question, classify_intent_with_llm)), **retrieval}
+
+
+async def aidentify_intent(state: State):
+    question = latest_user_question(state)
+    retrieval = start_retrieval(question)
+    return {**intent_update(await intent_classifier.aclassify(question, aclassify_intent_with_llm)), **retrieval}
+
+
 # handles greeting response
 #------------------------------------------------------------------------------------------------
-def greeting_answer(state:State):
+greeting_prompt = PromptTemplate.from_template(
+    """ Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deal with Indian Culture and History.
+    When a greets you you should reply with a formal greeting.
 
-    language = state['language']
+    Talk about your capabilities:  search through books, Q/A through the content, summarise the information (Only mention these capabilities no more no less).
+    Do not give any content here
+    Add emojis wherever necessary. But not much of it.
+    keep the answer short and sweet
+    List capabilities in points but not give description of it.
+    """
+)
 
-    qa_prompt = PromptTemplate.from_template(
-      """ Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deal with Indian Culture and History.
-           When a greets you you should reply with a formal greeting.
-
-           Talk about your capabilities:  search through books, Q/A through the content, summarise the information (Only mention these capabilities no more no less).
-           Do not give any content here
-           Add emojis wherever necessary. But not much of it.
-           keep the answer short and sweet
-           List capabilities in points but not give description of it.
-        """
-    )
 
+def greeting_answer(state:State):
     if state['intent'] == "Greeting":
-        chain = qa_prompt | llm
-        response = chain.invoke({'question': state['user_query']})
+        answer = precomputed_answer(state)
+        if answer is not None:
+            return {'response': answer}
+
+        chain = greeting_prompt | get_llm()
+        response = chain.invoke({'question': state['user_query']}, config={'tags': ['answer']})
         content = response.content
-        
-        if language == 'hi':
+
+        if state['language'] == 'hi':
             content = translate_to_hindi(content)
 
         return {'response': content}
-    
+
+
+async def agreeting_answer(state: State):
+    if state['intent'] == "Greeting":
+        answer = precomputed_answer(state)
+        if answer is not None:
+            return {'response': answer}
+
+        chain = greeting_prompt | get_llm()
+        response = await chain.ainvoke({'question': state['user_query']}, config={'tags': ['answer']})
+        content = response.content
+
+        if state['language'] == 'hi':
+            content = await atranslate_to_hindi(content)
+
+        return {'response': content}
+
 
 # handles general query response
 #------------------------------------------------------------------------------------------------
+general_prompt = PromptTemplate.from_template(
+    """
+    Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deals with Indian Culture and History.
+
+    Instructions:
+    - The following is the conversation history so far.
+    - Use it only for additional context if needed.
+    - Focus on answering ONLY the latest user question.
+    - Do not repeat prior answers unless explicitly asked.
+    - Do not every start you answer with a greeting.
+    - Answer capabilites in pointers.
+    - Give the url of category when asked about a prticular category. Urls should be hyperlinks. Hyperlink name should be same as the category name. Do not give them as texts.
+    - Whenever asked about categories give a brief intro as well.
+    - Keep your answer under 100-120 words.
+
+    Context:
+    {knowledge_context}
+
+    Conversation History:
+    {conversation_history}
+
+    Latest User Question:
+    {latest_question}
+
+    Response:
+    """
+)
+
+
+def format_history(messages):
+    return '\n'.join(format_line(msg) for msg in messages).strip()
+
+
+def knowledge_for(query):
+    """Sections of the portal knowledge relevant to the query, within the token budget"""
+    knowledge, report = get_knowledge_index().context(query)
+    print('knowledge sections', report)
+    metrics.increment('knowledge.prompts')
+    metrics.increment('knowledge.tokens', report['tokens'])
+    return knowledge
+
+
+def general_history(state: State):
+    """Recent turns verbatim plus the rolling summary of the older ones"""
+    window = history_window(
+        state['user_query'],
+        summary=state.get('history_summary') or '',
+        summarized=state.get('history_summarized') or 0
+    )
+    print('history tokens', window.tokens)
+    history_stats.record(window.tokens)
+    return window
+
+
+def general_query_inputs(state: State, window):
+    # The previous user turn helps place follow-ups like "tell me more about it"
+    user_turns = [msg.content for msg in state['user_query'] if msg.type == 'human'][-2:]
+    return {
+        'conversation_history': window.text(),
+        'latest_question': latest_user_question(state),
+        'knowledge_context': knowledge_for(' '.join(user_turns))
+    }
+
+
 def general_query_answer(state: State):
-    language = state['language']
-
-    knowledge_context = """
-        Recognizing the ongoing need to position itself for the digital future, 
-        Indian Culture is an initiative by the Ministry of Culture. A platform that 
-        hosts data of cultural relevance from various repositories and institutions all 
-        over India.
-        The Indian Culture Portal is a part of the National Virtual Library of India project, 
-        funded by the Ministry of Culture, Government of India. The portal has been created and 
-        developed by the Indian Institute of Technology (IIT), Bombay. 
-        The content is available both in 18 languages.
+    answer = precomputed_answer(state)
+    if answer is not None:
+        return {'response': answer}
 
-        
-        Categories available on the website:
-            1. Original Catgegories (Prepared with original research by reserachers done here):
-                subcategory 1: Cultural Expressions
-                List of them:
-                    Classical Dances of Indian (India's classical dances are a vibrant expression of its 
-                    diverse cultural heritage, deeply rooted in tradition, mythology, and spiritual practice. 
-                    Each form tells stories through graceful movements, intricate rhythms, and expressive gestures. 
-                    These dance forms not only reflect regional identities but also embody centuries-old philosophies 
-                    and artistic disciplines. This category explores the origins, evolution, and unique characteristics of 
-                    India's classical dance styles, offering a window into the artistic soul of the nation.)
-                    (url = https://icpdelhi.nvli.in/classical-dances-of-india),
-                    
-                    Festivals Of India (To experience the festivals of India is to experience the grandeur 
-                    and richness of the Indian cultural heritage. The festivals of India thrive in a culture 
-                    of diversity, and the celebration of these festivals has become a time for cross-cultural 
-                    exchanges. Filled with rituals, music, performances, culinary treats, and more, each 
-                    festival presents its own fascinating history and unique charm. A large diversity of 
-                    customs, traditions, and tales are also associated with festivals. Learn about the 
-                    cultural diversity, customs and traditions, as well as the fascinating stories 
-                    associated with the festivals presented in the categories below, or explore the vibrant 
-                    festivals of the states by clicking on the map or finding your favourite festival.)
-                    (url = https://icpdelhi.nvli.in/festivals-of-india), 
-                    
-                    Food And Culture(The Indian culinary repertoire reflects the cultural diversity of the 
-                    country. The term “Indian food” denotes a mélange of flavours from different parts of 
-                    the country and showcases centuries of cultural exchange with the far corners of the 
-                    world. Here, on our portal, we are making a small effort of gradually building a 
-                    treasure trove of information about the countless exquisite flavours of our country. 
-                    It is an ongoing venture and over time we aim to capture as much as possible of the 
-                    incredible culinary diversity of this land.), Musical Instruments Of India
-                    (url = https://icpdelhi.nvli.in/food-and-culture),
-
-                    Musical Instruments of India(The Musical Instruments section of the Indian Culture 
-                    portal contains information about a range of instruments from across India. 
-                    The Indian Culture portal has researched and is happy to present information 
-                    about the countless exquisite musical instruments of our country.)
-                    (url = https://icpdelhi.nvli.in/musical-instruments-of-india),
-
-                    Textiles and fabrics of India (Textiles and Fabrics of India is an attempt to showcase 
-                    and celebrate the long and diverse tradition of Textiles in India. The history of this 
-                    craft goes back to the ancient period. This section highlights and honours the 
-                    craftsmanship of the Indian handloom workers, embroiderers, block printers, painters 
-                    and others who have immensely contributed to build a distinct textile industry for India.)
-                    (url = https://icpdelhi.nvli.in/textiles-and-fabrics-of-india),
-
-                    Timeless Trends (n both its traditional and modern manifestations, Indian art exhibits a 
-                    powerful sense of design and a vivid imagination. These are reflected in sculptures, 
-                    paintings, murals, architecture, coins, and items of personal adornment like jewellery, 
-                    clothing, and more. Surviving the vagaries of time, many of these artefacts are now 
-                    preserved in museums, archaeological sites and cultural institutions. These seemingly 
-                    ordinary artefacts act as a repository of knowledge that conveys information about the 
-                    society of their time. Timeless Trends celebrates the interconnectedness of the past and 
-                    the present and attempts to discover the links between the cultures and traditions we 
-                    cherish, the structures and sites that dot our modern landscapes, and the little things 
-                    that we do and say every day.) (url = https://icpdelhi.nvli.in/timeless-trends),
-                    
-                subcategory 2: Legends and Legacies
-                    Folktales Of India (India has a rich and diverse tradition of folktales, shaped by its many languages, 
-                    cultures, and regions. These stories—ranging from fables and fairytales to myths and legends—have been 
-                    passed down through generations, reflecting the values, beliefs, and imaginations of the people. 
-                    Fables use animal characters to teach moral lessons, while fairytales often involve magical beings, 
-                    heroic quests, and transformations. Myths recount the exploits of gods and divine beings, explaining 
-                    creation, duty, and cosmic order, whereas legends celebrate the lives of saints, warriors, poets, and 
-                    jesters whose deeds live on in collective memory. Whether shared in gatherings, temples, courts, or 
-                    classrooms, these tales continue to captivate audiences, preserving the spirit of India's vibrant 
-                    storytelling heritage.) (url = https://icpdelhi.nvli.in/folktales-of-india),
-                    
-                    Healing Through The Ages(The 'Healing Through the Ages' category aims to trace the various dimensions and understanding of ailments and cures across India. It is a repository 
-                    which brings together the different meanings of 'health' and provides an overview of both conventional 
-                    and unconventional approaches to maintaining balance and restoring a sense of well-being. It will help 
-                    you traverse historical, regional and cultural boundaries, and help you to cultivate a nuanced 
-                    understanding of suffering and healing.) (url = https://icpdelhi.nvli.in/healing-through-the-ages),
-
-                    Iconic Battles Of India(Warfare has shaped the course of Indian history. The subcontinent 
-                    has witnessed epic battles that not only altered its destiny but also influenced the world 
-                    at large. This section delves into twelve iconic battles that changed the tide of Indian 
-                    history, tracing the evolution of warfare across different eras. Each of these conflicts 
-                    marked the rise or fall of dynasties, introduced new systems of governance, and gave birth 
-                    to lasting traditions, beliefs, and cultural patterns that continue to shape India's 
-                    identity today.) (url = https://icpdelhi.nvli.in/iconic-battles-of-india),
-                     
-                    Jewellery Of The Nizams (url = https://icpdelhi.nvli.in/jewellery-of-the-nizams),
-                    
-                    Legendary Figures Of India(Throughout its rich and diverse history India has been home 
-                    to towering personalities whose contributions transcended their time. This category 
-                    explores the lives and legacies of such extraordinary individuals who have profoundly 
-                    shaped India's history through their vision courage and intellect. Spanning a diverse 
-                    spectrum of emperors spiritual leaders social reformers scholars and freedom fighters 
-                    these iconic personalities represent the enduring spirit of resilience innovation and 
-                    leadership. Their contributions not only influenced the course of the nation's political 
-                    and cultural development but also continue to inspire generations with their unwavering 
-                    commitment to justice knowledge and progress. Through their remarkable journeys they have 
-                    helped define the soul of India and left an indelible imprint on its collective memory.)
-                    (url = https://icpdelhi.nvli.in/legendary-figures-of-india),
-                
-                subcategory 3: Pan India Explorations
-                    Historic Cities Of India(The map of India is dotted with cities that so many of us call home. Many of these cities have origins in our collective history. While they may now be modern and dynamic centres, they continue to represent centuries of culture and heritage that even today, sets them apart from every other city across the globe. Explore these unique urban centres and everything that they have to offer at your own pace, through a virtual expedition. Click on the icons to the right to begin a virtual visit to these historic cities! Each city has its own story, one that is told here through a collection of rare photographs, multimedia, specially-narrated tales, and more. We invite you to sift through them, explore, and discover your own favourite stories about every city.) (url = 'https://icpdelhi.nvli.in/historic-cities-of-india'),
-                    States Of India(India, a vast and vibrant nation, is a mosaic of diverse states, each woven with a unique thread of culture, history, and tradition. From the majestic, snow-capped mountains in the north to the sun-drenched coastlines in the south, each state offers a rich and varied blend of languages, cuisines, arts, and festivals. This category delves into the architectural marvels that adorn the country, the profound literary contributions from various corners, and the abundant interesting anecdotes that shape each state's identity. It also meticulously charts the historical development of these regions through different ages, reflecting India's millennia- old heritage. Each state, with its distinct character, forms a thread in the extraordinary fabric of India.) (url = 'https://icpdelhi.nvli.in/states-of-india'),
-                    Unesco (url = https://icpdelhi.nvli.in/unesco),
-                
-                subcategory 4: Built Heritage
-                    3d Explorations(The Indian culinary repertoire reflects the cultural diversity of the country. The term “Indian food” denotes a mélange of flavours from different parts of the country and showcases centuries of cultural exchange with the far corners of the world. Here, on our portal, we are making a small effort of gradually building a treasure trove of information about the countless exquisite flavours of our country. It is an ongoing venture and over time we aim to capture as much as possible of the incredible culinary diversity of this land.) (url = https://icpdelhi.nvli.in/3d-Explorations),
-                    Ajanta Caves(The Ajantā caves are rock-cut Buddhist cave temples carved out of a horseshoe shaped valley near the Waghora river at the edge of the Indyadhri range. The caves are a UNESCO World Heritage site and are thronged by thousands of tourists who come to admire its serene location, rock-cut architecture and beautiful Buddhist paintings that are found in the caves. These 30 rock-cut caves are part of a constellation of Buddhist cave temples dotting the Sahayādri or Western Ghats in Maharashtra. But Ajantā is unique as it hosts the finest specimens of art - Cave 9 and 10 contain the oldest Buddhist narrative paintings in India.) (url = https://icpdelhi.nvli.in/3d-Explorations),
-                    Forts Of India(The Forts of India are some of the most awe-inspiring monuments found in the country. From the Himalayas to the peninsular tip, from the deserts to the lush valleys of North-East, forts adorn each and every corner of the landscape of the Indian subcontinent. This section aims to provide a comprehensive overview of these magnificent monuments that bear the stories of the political vicissitudes of our country.) (url = https://icpdelhi.nvli.in/forts-of-india),
-                
-                subcategory 5: Footprint of Freedom
-                    Districts Of Defiance(The history of the freedom movement in India comprises a multitude of revolutionary events that helped achieve independence. While a few momentous upheavals and personalities stand out in this historical narrative, the independence of India is also attributed to a series of valuable yet lesser-known incidents that took place in different districts across the country. The Digital District Repository is an attempt to discover and document the memory of these countless stories, events, sites and individuals.) (url = https://icpdelhi.nvli.in/digital-district-repository),
-                    Freedom Archive(This section contains a collection of rare archival material such as books, photographs, gazetteers, letters, newspaper clippings and much more on the freedom struggle of India. The freedom movement engulfed the entire country and people from all walks of life joined hands to drive the foreign oppressors out of this land. Even after more than 7 decades of freedom, these stories of courage, selflessness and determination continue to inspire and instill pride in us. The present section aims to preserve and bring to light rare glimpses of the fight for freedom in the form of digital records.) (url = https://icpdelhi.nvli.in/freedom-archive),
-                
-                subcategory 6: Cultural Chronicles
-                    Photo Essays (url = https://icpdelhi.nvli.in/photo-essays),
-                    Retrieved Artefacts Of India(For millennia, India has been a melting pot of diverse cultures, boasting a rich heritage of breathtaking sculptures and artwork. Yet, over centuries, conquerors and colonial powers relentlessly pillaged this heritage, a trend continued by modern looters and smugglers. Consequently, much of India's historical wealth found its way to Western museums and private collections, resulting in a profound cultural loss that deprives future generations of their rich and intricate heritage. The theft or loss of an artefact signifies the erasure of a piece of history and the collective memory it embodies. Removing artefacts from their original locations strips them of their intrinsic significance, depriving future generations of cultural insights. However, in the past decade, concerted efforts by Indian and international governments, NGOs, journalists, and heritage activists have succeeded in repatriating 358 artefacts back to India. Explore this section to delve into the world of Retrieved Artefacts, uncovering their repatriation stories, heritage, and the legal frameworks that protect them.) (url = https://icpdelhi.nvli.in/retrieved-artefacts-of-india),
-                    Snippets (url = https://icpdelhi.nvli.in/retrieved-artefacts-of-india),
-                    Stories (url = https://icpdelhi.nvli.in/stories),
+    window = general_history(state)
+    fold = fold_pool.submit(fold_history, window, get_llm()) if window.fold else None
 
-            2. Textual Repository: Archives (url = https://icpdelhi.nvli.in/archives), E-Books (url = https://icpdelhi.nvli.in/e-books), Gazettes and Gazetteers (url = https://icpdelhi.nvli.in/gazettes-and-gazetteers), Indian National Bibliography (url = https://inb.nvli.in/cgi-bin/koha/opac-search.pl?advsearch=1&idx=kw&limit=branch%3ACRL&sort_by=relevance&do=Search),
-            Manuscripts (url = https://icpdelhi.nvli.in/manuscripts), Other-Collections (url = https://icpdelhi.nvli.in/other-collections), Rare Books (url = https://icpdelhi.nvli.in/rare-books), Reports and Proceedings (url = https://icpdelhi.nvli.in/reports-and-proceedings) , Research Papers (url = https://icpdelhi.nvli.in/research-papers), Union Catalogue (url = https://indianculture.gov.in/union-catalogue),
+    chain = general_prompt | get_llm()
+    response = chain.invoke(general_query_inputs(state, window), config={'tags': ['answer']})
+    content = response.content
 
-            3. Audio & Visual Repository: Audios (url = https://icpdelhi.nvli.in/audios), Images (url = https://icpdelhi.nvli.in/images), Intangible-Cultural-Heritage (url = https://icpdelhi.nvli.in/intangible-cultural-heritage), Museum-Collections (url = https://icpdelhi.nvli.in/museum-collections), 
-            Paintings(url = https://icpdelhi.nvli.in/paintings), Photos-Archives (url = https://icpdelhi.nvli.in/photo-archives), Videos (url = https://icpdelhi.nvli.in/videos),
+    if state['language'] == 'hi':
+        content = translate_to_hindi(content)
 
-            4. Activities (Games): Crossword (url = https://icpdelhi.nvli.in/Crossword), Puzzle (url = https://icpdelhi.nvli.in/Puzzle), Quiz (url = https://icpdelhi.nvli.in/Quiz),
+    return {'response': content, **(fold.result() if fold else {})}
 
-            5. Tools: Flagship Events: The Indian Culture Portal (ICP) was an integral participant in five flagship events organized by the Ministry of Culture. Beyond its interactive and informative exhibition booths, ICP played a pivotal role in the conceptualization, design, and production of key publications and launches. Through thoughtfully curated content, immersive visitor experiences, and innovative communication tools, ICP contributes significantly to the dissemination and celebration of India's cultural heritage (url = https://icpdelhi.nvli.in/flagship-events),
-                      Outreach: Discover how the Indian Culture Portal connects with institutions, communities, and experts across the country to preserve and promote India’s rich cultural heritage. Our outreach initiatives foster collaboration, build awareness, and bring culture closer to people through workshops, partnerships, and public engagement (url = https://icpdelhi.nvli.in/outreach),
-                      Publications: This section showcases original publications, books, and graphic novels developed by the Indian Culture Portal, alongside publications created by partner organizations within the Ministry of Culture. It also includes select works that were officially unveiled during key Ministry events (url = https://icpdelhi.nvli.in/publications),
 
+async def ageneral_query_answer(state: State):
+    answer = precomputed_answer(state)
+    if answer is not None:
+        return {'response': answer}
 
-        Capabilties: Q/A with the content, Search the website, summarise pages when pages contain lot of text.
-        """
+    window = general_history(state)
 
-    qa_prompt = PromptTemplate.from_template(
-        """
-            Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deals with Indian Culture and History.
-
-            Instructions:
-            - The following is the conversation history so far.
-            - Use it only for additional context if needed.
-            - Focus on answering ONLY the latest user question.
-            - Do not repeat prior answers unless explicitly asked.
-            - Do not every start you answer with a greeting.
-            - Answer capabilites in pointers.
-            - Give the url of category when asked about a prticular category. Urls should be hyperlinks. Hyperlink name should be same as the category name. Do not give them as texts.
-            - Whenever asked about categories give a brief intro as well.
-            - Keep your answer under 100-120 words.
-
-            Context:
-            {knowledge_context}
-
-            Conversation History:
-            {conversation_history}
-
-            Latest User Question:
-            {latest_question}
-
-            Response:
-            """
-                )
-
-    conversation_history = ""
-    for msg in state['user_query']:
-        role = (
-            "User" if msg.type == "human" else
-            "Assistant" if msg.type == "ai" else
-            "System"
-        )
-        conversation_history += f"{role}: {msg.content}\n"
+    async def answer_question():
+        chain = general_prompt | get_llm()
+        response = await chain.ainvoke(general_query_inputs(state, window), config={'tags': ['answer']})
+        content = response.content
 
-    latest_question = state['user_query'][-1].content if state['user_query'] else ""
+        if state['language'] == 'hi':
+            content = await atranslate_to_hindi(content)
+        return content
 
-    chain = qa_prompt | llm
-    response = chain.invoke({
-        'conversation_history': conversation_history.strip(),
-        'latest_question': latest_question,
-        'knowledge_context': knowledge_context
-    })
+    content, folded = await asyncio.gather(answer_question(), afold_history(window, get_llm()))
+    return {'response': content, **folded}
 
-    content = response.content
 
+# Precomputed Greeting / General answers
+#------------------------------------------------------------------------------------------------
+faq_answers = FaqAnswers()
+metrics.register_collector('faq_answers', faq_answers.stats)
+try:
+    # Served straight away when the stored hash still matches the prompts
+    faq_answers.load()
+except Exception as e:
+    print(f"Could not load FAQ answers: {e}")
+
+
+def faq_fingerprint():
+    return content_hash(
+        greeting_prompt.template,
+        general_prompt.template,
+        translation_prompt.template,
+        knowledge_context,
+        KNOWLEDGE_TOKEN_BUDGET,
+        KNOWLEDGE_TOP_SECTIONS
+    )
+
+
+def generate_faq_answer(intent, question, language):
+    """Answer a canonical question the way the responder nodes would, without history"""
+    if intent == 'Greeting':
+        response = (greeting_prompt | get_llm()).invoke({'question': question})
+    else:
+        response = (general_prompt | get_llm()).invoke({
+            'conversation_history': f'User: {question}',
+            'latest_question': question,
+            'knowledge_context': knowledge_for(question)
+        })
+
+    content = response.content
     if language == 'hi':
         content = translate_to_hindi(content)
+    return content
 
-    return {'response': content}
+
+def precomputed_answer(state: State):
+    """Stored answer for this turn, if the FAQ store has one built from the current prompts"""
+    if not FAQ_ANSWERS_ENABLED or faq_answers.fingerprint != faq_fingerprint():
+        return None
+    return faq_answers.match(state['intent'], latest_user_question(state), state['language'])
 
 
 # handles specilaised query responses
 #------------------------------------------------------------------------------------------------
-def specialised_query_answer(state: State):
-    language = state['language']
+specialised_prompt = PromptTemplate.from_template(
+    """
+    Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deals with Indian Culture and History.
+
+    Instructions:
+    - Answer ONLY using the context provided.
+    - Do NOT guess or fabricate anything.
+    - Use the conversation history only if relevant.
+    - Focus on answering ONLY the latest user question.
+    - Group your answer category-wise.
+    - Respond ONLY with a valid JSON array, strictly matching this structure:
+
+    [
+    {{
+        "category": "Category Name",
+        "description": "3-4 lines summary about this category",
+        "resources": [
+        {{
+            "title": "Resource Title",
+            "url": "category url or 'NA'"
+        }}
+        ]
+    }}
+    ]
+
+    DO NOT include markdown, extra quotes, or any text outside the JSON array.
+
+    Context:
+    {context}
+
+    Conversation History:
+    {conversation_history}
+
+    Latest User Question:
+    {latest_question}
+    """
+)
+
+fix_json_prompt = PromptTemplate.from_template(
+    """
+    You are a JSON repair tool.
+    Your task is to correct invalid JSON and return only the corrected JSON list.
+    Only fix formatting issues. Just return the correct JSON—do not alter the original content.
+
+    Input:
+    {bad_json}
+
+    Output:
+    """
+)
+
+
+# Id-only mode: the model returns category groups of context ids and the
+# server fills in titles and urls from the catalog rows. Descriptions come
+# from the precomputed table; the model writes them only for categories
+# missing from it.
+SPECIALISED_ID_ONLY = os.getenv('SPECIALISED_ID_ONLY', 'true').lower() == 'true'
+
+specialised_ids_prompt = PromptTemplate.from_template(
+    """
+    Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deals with Indian Culture and History.
+
+    Instructions:
+    - Answer ONLY using the context provided. Each resource is listed as "- [id] Title | url | description" under its "## Category".
+    - Do NOT guess or fabricate anything.
+    - Use the conversation history only if relevant.
+    - Focus on answering ONLY the latest user question.
+    - Group your answer category-wise and refer to resources ONLY by their numeric id.
+    - Write a 3-4 line description only for these categories: {describe_categories}. For any other category use "".
+    - Respond ONLY with a valid JSON array, strictly matching this structure:
+
+    [
+    {{
+        "category": "Category Name",
+        "ids": [12, 40],
+        "description": ""
+    }}
+    ]
+
+    DO NOT include titles, urls, markdown, extra quotes, or any text outside the JSON array.
+
+    Context:
+    {context}
+
+    Conversation History:
+    {conversation_history}
+
+    Latest User Question:
+    {latest_question}
+    """
+)
+
+
+def latest_context(state: State):
+    return state.get('context') or ''
+
+
+def specialised_query_inputs(state: State):
+    # Only the previous message is passed as history
+    inputs = {
+        'context': latest_context(state),
+        'conversation_history': format_history(state['user_query'][-2:-1]),
+        'latest_question': latest_user_question(state)
+    }
+    if SPECIALISED_ID_ONLY:
+        descriptions = category_descriptions()
+        categories = re.findall(r'^## (.+)$', latest_context(state), re.MULTILINE)
+        undescribed = [category for category in categories if category not in descriptions]
+        inputs['describe_categories'] = ', '.join(undescribed) or 'none'
+    return inputs
+
+
+def specialised_chain():
+    prompt = specialised_ids_prompt if SPECIALISED_ID_ONLY else specialised_prompt
+    return prompt | get_llm()
+
+
+def latest_context_rows(state: State):
+    return state.get('context_rows') or {}
+
 
-    qa_prompt = PromptTemplate.from_template(
-        """
-            Your name is Bharti. You are an AI assistant for the Indian Culture Portal that deals with Indian Culture and History.
-
-            Instructions:
-            - Answer ONLY using the context provided.
-            - Do NOT guess or fabricate anything.
-            - Use the conversation history only if relevant.
-            - Focus on answering ONLY the latest user question.
-            - Group your answer category-wise.
-            - Respond ONLY with a valid JSON array, strictly matching this structure:
-
-            [
-            {{
-                "category": "Category Name",
-                "description": "3-4 lines summary about this category",
-                "resources": [
-                {{
-                    "title": "Resource Title",
-                    "url": "category url or 'NA'"
-                }}
-                ]
-            }}
-            ]
+def stream_hydrate(item, rows, used):
+    """
+    A streamed id group as a category object, or None when nothing in it
+    is usable. rows are the context rows context_memory loaded; used is
+    shared by every group of the stream.
+    """
+    try:
+        answer = hydrate_groups(validate_id_groups([item]), rows, category_descriptions(), used)
+    except JSONRepairError:
+        return None
+    return answer[0] if answer else None
+
+
+def parse_specialised(content, state: State, record=True):
+    """Validated category list from the model output; raises JSONRepairError"""
+    if not SPECIALISED_ID_ONLY:
+        return repair_category_json(content, record=record)
+    groups = repair_category_json(content, record=record, validate=validate_id_groups)
+    answer = hydrate_groups(groups, latest_context_rows(state), category_descriptions())
+    metrics.increment('specialised.id_only.answers')
+    metrics.increment('specialised.id_only.dropped_ids', sum(len(group['ids']) for group in groups) - sum(
+        len(item['resources']) for item in answer
+    ))
+    return answer
+
+
+def invalid_answer(language):
+    return [{
+        "category": "Invalid" if language != "Hindi" else "अमान्य",
+        "description": (
+            "Proper response not returned for the query. Try Again!"
+            if language != "Hindi"
+            else "प्रश्न के लिए उचित उत्तर प्राप्त नहीं हुआ। कृपया पुनः प्रयास करें!"
+        ),
+        "resources": []
+    }]
+
+
+def translatable_fields(parsed_json):
+    """(item, key) for every field of a specialised answer shown translated in Hindi"""
+    return [
+        (item, key)
+        for item in parsed_json if isinstance(item, dict)
+        for key in ("category", "description")
+    ]
+
+
+def specialised_response(parsed_json):
+    json_str = json.dumps(parsed_json, ensure_ascii=False)
+
+    return {
+        'response': [{
+            'role': 'assistant',
+            'content': json_str
+        }]
+    }
+
+
+def parse_answer(content, state: State):
+    """Category list from the model output, or None when only the LLM repair can help"""
+    try:
+        # Fences, prose, trailing commas, quotes and truncation are fixed locally
+        return parse_specialised(content, state)
+    except JSONRepairError as e:
+        print(f"Initial Parsing Error: {e}")
+        return None
 
-            DO NOT include markdown, extra quotes, or any text outside the JSON array.
 
-            Context:
-            {context}
+def parse_repaired(content, state: State):
+    """Category list from the LLM-repaired output, or the Invalid answer"""
+    try:
+        parsed_json = parse_specialised(content, state, record=False)
+        metrics.increment('json_repair.llm')
+        return parsed_json
+    except JSONRepairError as e:
+        print(f"Recovery Parsing Error: {e}")
+        metrics.increment('json_repair.failed')
+        return invalid_answer(state['language'])
 
-            Conversation History:
-            {conversation_history}
 
-            Latest User Question:
-            {latest_question}
-        """
-    )
+def apply_translations(fields, translations):
+    for (item, key), translated in zip(fields, translations):
+        item[key] = translated
+
 
+# The sync and async nodes differ only in invoke / ainvoke
+def specialised_query_answer(state: State):
     if state['intent'] == "Specialised":
-        conversation_history = ""
-        if len(state['user_query']) > 1:
-            prev_msg = state['user_query'][-2]  
-            role = (
-                "User" if prev_msg.type == "human" else
-                "Assistant" if prev_msg.type == "ai" else
-                "System"
-            )
-            conversation_history = f"{role}: {prev_msg.content}\n"
+        response = specialised_chain().invoke(specialised_query_inputs(state), config={'tags': ['answer']})
 
-        latest_question = (
-            state['user_query'][-1].content
-            if state['user_query']
-            else ""
-        )
+        parsed_json = parse_answer(response.content, state)
+        if parsed_json is None:
+            # Last resort: ask the LLM to repair it
+            recovery_response = (fix_json_prompt | get_llm()).invoke({'bad_json': response.content})
+            parsed_json = parse_repaired(recovery_response.content, state)
 
-        chain = qa_prompt | llm
-        response = chain.invoke({
-            'context': state['context'],
-            'conversation_history': conversation_history.strip(),
-            'latest_question': latest_question
-        })
+        if state['language'] == "hi":
+            fields = translatable_fields(parsed_json)
+            apply_translations(fields, translate_batch_to_hindi([item.get(key, "") for item, key in fields]))
 
-        try:
-            parsed_json = json.loads(response.content)
-            if not isinstance(parsed_json, list):
-                raise ValueError("Expected a list of category dictionaries")
-        except Exception as e:
-            print(f"Initial Parsing Error: {e}")
+        return specialised_response(parsed_json)
 
-            fix_json_prompt = PromptTemplate.from_template(
-                """
-                    You are a JSON repair tool.
-                    Your task is to correct invalid JSON and return only the corrected JSON list.
-                    Only fix formatting issues. Just return the correct JSON—do not alter the original content.
 
-                    Input:
-                    {bad_json}
+async def aspecialised_query_answer(state: State):
+    if state['intent'] == "Specialised":
+        response = await specialised_chain().ainvoke(specialised_query_inputs(state), config={'tags': ['answer']})
 
-                    Output:
-                """
-            )
+        parsed_json = parse_answer(response.content, state)
+        if parsed_json is None:
+            # Last resort: ask the LLM to repair it
+            recovery_response = await (fix_json_prompt | get_llm()).ainvoke({'bad_json': response.content})
+            parsed_json = parse_repaired(recovery_response.content, state)
 
-            fix_chain = fix_json_prompt | llm
-            recovery_response = fix_chain.invoke({'bad_json': response.content})
+        if state['language'] == "hi":
+            fields = translatable_fields(parsed_json)
+            apply_translations(fields, await atranslate_batch_to_hindi([item.get(key, "") for item, key in fields]))
 
-            try:
-                parsed_json = json.loads(recovery_response.content)
-                if not isinstance(parsed_json, list):
-                    raise ValueError("Still not a list")
-            except Exception as e2:
-                print(f"Recovery Parsing Error: {e2}")
-                parsed_json = [{
-                    "category": "Invalid" if language != "Hindi" else "अमान्य",
-                    "description": (
-                        "Proper response not returned for the query. Try Again!"
-                        if language != "Hindi"
-                        else "प्रश्न के लिए उचित उत्तर प्राप्त नहीं हुआ। कृपया पुनः प्रयास करें!"
-                    ),
-                    "resources": []
-                }]
-
-        if language == "hi":
-            for item in parsed_json:
-                item["category"] = translate_to_hindi(item.get("category", ""))
-                item["description"] = translate_to_hindi(item.get("description", ""))
-
-        json_str = json.dumps(parsed_json, ensure_ascii=False)
-
-
-        return {
-            'response': [{
-                'role': 'assistant',
-                'content': json_str
-            }]
-        }
+        return specialised_response(parsed_json)
+
+
+# Speculative retrieval
+#------------------------------------------------------------------------------------------------
+# Retrieval only needs the raw query, so with SPECULATIVE_RETRIEVAL on
+# question_type starts it on retrieval_pool before classifying and moves
+# on without waiting. answer_query waits for the result only on the
+# Specialised path; other turns cancel it, or leave it to finish, and
+# count it as waste.
+SPECULATIVE_RETRIEVAL = os.getenv('SPECULATIVE_RETRIEVAL', 'true').lower() == 'true'
+retrieval_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SPECULATIVE_RETRIEVAL_WORKERS', '8')), thread_name_prefix='retrieval'
+)
+
+
+def timed_retrieval(query):
+    started = time.perf_counter()
+    title_ids = fetch_similar_titles(query=query) or []
+    return title_ids, time.perf_counter() - started
+
+
+def start_retrieval(question):
+    """retrieval update with the search for this turn running in the background"""
+    if not SPECULATIVE_RETRIEVAL:
+        return {}
+    # Not worth starting when the local rules already know it is not Specialised
+    intent, confidence, source = intent_classifier.predict(question)
+    if source == 'rule' and intent != 'Specialised':
+        metrics.increment('speculative.skipped')
+        return {'retrieval': {}}
+    return {'retrieval': {'query': question, 'future': retrieval_pool.submit(timed_retrieval, question)}}
+
+
+def record_waste(future):
+    metrics.increment('speculative.wasted')
+    if not future.cancelled() and future.exception() is None:
+        metrics.record_latency('speculative.wasted', future.result()[1])
+
+
+def discard_retrieval(state: State):
+    """Drop this turn's speculative retrieval: cancelled if it has not started, counted as waste either way"""
+    future = (state.get('retrieval') or {}).get('future')
+    if future is None:
+        return
+    if future.cancel():
+        metrics.increment('speculative.cancelled')
+    future.add_done_callback(record_waste)
+
+
+def take_speculative_result(state: State, query):
+    """This turn's speculative retrieval, or None; waits for it on Specialised turns, discards it otherwise"""
+    retrieval = state.get('retrieval') or {}
+    if retrieval.get('query') != query or 'future' not in retrieval:
+        return None
+
+    if state['intent'] != "Specialised":
+        discard_retrieval(state)
+        return None
+
+    try:
+        title_ids, _ = retrieval['future'].result()
+    except Exception as e:
+        print(f"Speculative retrieval failed: {e}")
+        return None
+    metrics.increment('speculative.used')
+    return title_ids
+
+
+# Semantic answer cache
+#------------------------------------------------------------------------------------------------
+# Looked up first, before any LLM call or retrieval, so a repeated
+# question costs one cached embedding. Only the local classifier gates
+# it: questions it settles as anything but Specialised skip the lookup,
+# and the rest are looked up even when classify would still ask the LLM,
+# since answers are only stored for Specialised turns. A hit ends the run
+# as a Specialised turn. The key is the question alone, so follow-ups
+# that refer back to earlier turns are neither served from the cache nor
+# stored in it.
+FOLLOW_UP_RE = re.compile(
+    r'\b(it|its|this|that|these|those|they|them|their|he|him|his|she|her|'
+    r'more|same|above|previous|earlier|again|also|else)\b',
+    re.IGNORECASE
+)
+
+
+def depends_on_history(messages):
+    return len(messages) > 1 and bool(FOLLOW_UP_RE.search(messages[-1].content))
+
+
+def cache_query(state: State):
+    """The question to look up, or None when the turn must not use the cache"""
+    question = latest_user_question(state)
+    intent, confidence, source = intent_classifier.predict(question)
+    if intent != 'Specialised' and intent_classifier.is_decided(intent, confidence, source):
+        return None
+    if depends_on_history(state['user_query']):
+        metrics.increment('answer_cache.skipped_follow_up')
+        return None
+    return validate_query(question)
+
+
+def cache_lookup(embedding, language):
+    """semantic_cache update: the embedding to store the answer under, and the cached answer or None"""
+    cached = answer_cache.lookup(embedding, language)
+    if cached is None:
+        return {'semantic_cache': {'embedding': embedding, 'answer': None}}
+    json_data, similarity = cached
+    print(f"Semantic cache hit (similarity {similarity:.3f})")
+    return {'intent': 'Specialised', 'semantic_cache': {'embedding': embedding, 'answer': json_data}}
+
+
+def cached_answer(state: State):
+    try:
+        query = cache_query(state)
+        if query is None:
+            return {'semantic_cache': {}}
+        return cache_lookup(embed_query(query), state['language'])
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return {'semantic_cache': {}}
+
+
+async def acached_answer(state: State):
+    try:
+        query = cache_query(state)
+        if query is None:
+            return {'semantic_cache': {}}
+        return cache_lookup(await aembed_query(query), state['language'])
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return {'semantic_cache': {}}
+
+
+def route_after_cache(state: State):
+    """A cache hit ends the run; everything else goes on to classification"""
+    if (state.get('semantic_cache') or {}).get('answer') is not None:
+        return END
+    return 'question_type'
 
 
 # Answer Queries
 #------------------------------------------------------------------------------------------------
 def answer_query(state:State):
+    latest_question = state['user_query'][-1].content if state['user_query'] else ''
+    speculative_ids = take_speculative_result(state, latest_question)
+
     if state['intent'] == "Greeting":
         print("Debug: Greeting detected, skipping SQL query.")
         return {'context': ''}  
@@ -573,17 +852,28 @@ def answer_query(state:State):
     elif state['intent'] == "Specialised":
         query = state['user_query'][-1]
 
-        similar_title_ids = fetch_similar_titles(vector_store=vector_store, query=query.content) or []
+        if speculative_ids is not None:
+            similar_title_ids = speculative_ids
+        else:
+            similar_title_ids = fetch_similar_titles(query=query.content) or []
 
         if similar_title_ids:
             sql_query_result = generate_sql_query(ids=similar_title_ids)
-            context = sql_query_result.to_string() if isinstance(sql_query_result, pd.DataFrame) else sql_query_result
+            context, report = build_context(sql_query_result, similar_title_ids)
             print('context', context)
+            print('context tokens', report)
+            metrics.increment('context.tokens', report['tokens'])
+            # Kept for hydrating id-only answers without reading the catalog again
+            listed = context_ids(context)
+            rows = {
+                row.id: row
+                for category_rows in sql_query_result.values() for row in category_rows if row.id in listed
+            }
         else:
             print("Debug: No similar titles found.")
-            context = ''
+            context, rows = '', {}
 
-        return {'context': context}
+        return {'context': context, 'context_rows': rows}
     
     else:
         print("Debug: Unknown intent, returning empty context.")
@@ -592,92 +882,324 @@ def answer_query(state:State):
 
 # Langgraph
 #------------------------------------------------------------------------------------------------
-graph_builder.add_node("question_type", identify_intent)
-graph_builder.add_node("context_memory", answer_query)
-graph_builder.add_node("greeting_response", greeting_answer)
-graph_builder.add_node("general_query_response", general_query_answer)
-graph_builder.add_node("specialised_query_response", specialised_query_answer)
+def route_by_intent(state: State):
+    """Send each turn to the single responder for its intent"""
+    return {
+        'Greeting': 'greeting_response',
+        'General': 'general_query_response',
+        'Specialised': 'specialised_query_response'
+    }.get(state['intent'], END)
+
+
+def instrumented(name, node, anode=None):
+    """
+    Count executions and time a graph node under node.<name> in /metrics.
+    anode is the coroutine used under ainvoke/astream; nodes without one
+    run their blocking sync version on the event loop's default executor.
+    """
+    def run(state: State):
+        metrics.increment(f'node.{name}.calls')
+        with metrics.timed(f'node.{name}'):
+            return node(state)
+
+    async def arun(state: State):
+        metrics.increment(f'node.{name}.calls')
+        with metrics.timed(f'node.{name}'):
+            if anode is None:
+                return await asyncio.to_thread(node, state)
+            return await anode(state)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def build_graph():
+    graph_builder.add_node("question_type", instrumented("question_type", identify_intent, aidentify_intent))
+    graph_builder.add_node("context_memory", instrumented("context_memory", answer_query))
+    graph_builder.add_node("greeting_response", instrumented("greeting_response", greeting_answer, agreeting_answer))
+    graph_builder.add_node("general_query_response", instrumented("general_query_response", general_query_answer, ageneral_query_answer))
+    graph_builder.add_node("specialised_query_response", instrumented("specialised_query_response", specialised_query_answer, aspecialised_query_answer))
+
+
+    if SEMANTIC_CACHE_ENABLED:
+        graph_builder.add_node("cached_answer", instrumented("cached_answer", cached_answer, acached_answer))
+        graph_builder.add_edge(START, "cached_answer")
+        graph_builder.add_conditional_edges("cached_answer", route_after_cache, ['question_type', END])
+    else:
+        graph_builder.add_edge(START, "question_type")
+    graph_builder.add_edge("question_type", "context_memory")
+    graph_builder.add_conditional_edges(
+        "context_memory",
+        route_by_intent,
+        ['greeting_response', 'general_query_response', 'specialised_query_response', END]
+    )
+    graph_builder.add_edge("greeting_response", END)
+    graph_builder.add_edge("general_query_response", END)
+    graph_builder.add_edge("specialised_query_response", END)
 
+    return graph_builder.compile(checkpointer=memory)
 
-graph_builder.add_edge(START,"question_type")
-graph_builder.add_edge("question_type", "context_memory")
-graph_builder.add_edge("context_memory", 'greeting_response')
-graph_builder.add_edge("context_memory", "general_query_response")
-graph_builder.add_edge("context_memory", 'specialised_query_response')
-graph_builder.add_edge("greeting_response", END)
-graph_builder.add_edge("general_query_response", END)
-graph_builder.add_edge("specialised_query_response", END)
 
-graph = graph_builder.compile(checkpointer=memory)
+def get_graph():
+    """Compiled graph, built on first use"""
+    return lazy_client('graph', build_graph)
 
 
+# Warm-up
+#------------------------------------------------------------------------------------------------
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'true').lower() == 'true'
+warmup_done = threading.Event()
+warmup_error = None
 
-@app.post('/chat')
-def query():
-    global thread_id
 
-    events_list = []
-    answer = ''
-    
-    data = request.get_json()
-    user_query = data['query']
-    language = data['language']
+def run_warmup():
+    """Initialise clients and the graph in the background; /ready reports when done"""
+    global warmup_error
+    started = time.perf_counter()
+    try:
+        warm_up()
+        get_graph()
+    except Exception as e:
+        warmup_error = str(e)
+        print(f"Warm-up failed: {e}")
+    finally:
+        startup_timings['warmup'] = round(time.perf_counter() - started, 3)
+        warmup_done.set()
+
+    # After readiness: until the answers exist the nodes simply call the LLM
+    if FAQ_ANSWERS_ENABLED and warmup_error is None:
+        try:
+            # Only generates what the stored file lacks or what its hash invalidated
+            generated = faq_answers.ensure(faq_fingerprint(), generate_faq_answer)
+            print(f"FAQ answers ready ({generated} generated)")
+        except Exception as e:
+            print(f"FAQ answer generation failed: {e}")
+
 
-    config = {"configurable": {"thread_id": thread_id, "language": language}}
-    events = graph.stream(
-        {
-            'user_query': [{'role': 'user', 'content': user_query}],
-            'language': language
-        },
-        config=config
+def is_cacheable_answer(json_data):
+    """Skip the 'Invalid' fallback and empty answers"""
+    return bool(json_data) and not any(
+        not isinstance(item, dict) or item.get('category') in ('Invalid', 'अमान्य')
+        for item in json_data
     )
-    
-    for event in events:
-        events_list.append(event)
 
 
-    if not events_list:
-        return jsonify({'answer': 'Cannot generate response. Try Again!'}), 404
+def request_session(data, headers, cookies):
+    """(session_id, issued) from the request body, header or cookie"""
+    candidate = (data or {}).get('session_id') or headers.get(SESSION_HEADER) or cookies.get(SESSION_COOKIE)
+    return session_store.resolve(candidate)
 
-    intent = events_list[0]['question_type']['intent']
 
-    # Convenience mapping
-    event_map = {}
-    for ev in events_list:
-        event_map.update(ev)
+def attach_session(response, session_id, issued):
+    response.headers[SESSION_HEADER] = session_id
+    if issued:
+        response.set_cookie(
+            SESSION_COOKIE, session_id, max_age=SESSION_COOKIE_MAX_AGE, httponly=True, samesite='Lax'
+        )
+    return response
+
+
+def chat_config(session_id, language):
+    return {"configurable": {"thread_id": session_store.thread_id(session_id), "language": language}}
+
+
+BUSY_MESSAGE = 'The assistant is busy right now. Please try again in a few seconds.'
+
+
+def busy_payload(field, e):
+    """(body, headers) for a request the LLM scheduler turned away"""
+    return {field: BUSY_MESSAGE, 'retry_after': e.retry_after}, {'Retry-After': str(e.retry_after)}
+
+
+def chat_answer(event_map, user_query, language, session_id):
+    """Build the /chat (payload, status) from the merged node updates"""
+    lookup = (event_map.get('cached_answer') or {}).get('semantic_cache') or {}
+    if lookup.get('answer') is not None:
+        # A cache hit ends the run before question_type
+        session_store.advance(session_id)
+        return {'answer': lookup['answer'], 'cache': 'hit'}, 200
+
+    if 'question_type' not in event_map:
+        return {'answer': 'Cannot generate response. Try Again!'}, 404
+
+    intent = event_map['question_type']['intent']
 
     if intent == 'Specialised':
         # Specialized query returns JSON
         node = event_map.get('specialised_query_response')
         if node:
             json_data = json.loads(node['response'][0]['content'])
-            thread_id += 1
+            # A Specialised answer ends the conversation thread
+            session_store.advance(session_id)
+
+            query_embedding = lookup.get('embedding')
+            if query_embedding is not None and is_cacheable_answer(json_data):
+                answer_cache.store(normalize_query(user_query), query_embedding, language, json_data)
 
-            return jsonify({'answer': json_data}), 200
+            return {'answer': json_data, 'cache': 'miss'}, 200
         else:
-            return jsonify({'answer': 'No specialized response generated.'}), 500
+            return {'answer': 'No specialized response generated.'}, 500
 
     elif intent == 'General':
         node = event_map.get('general_query_response')
         if node:
-            return jsonify({'answer': node['response']}), 200
+            return {'answer': node['response']}, 200
         else:   
-            return jsonify({'answer': 'No general response generated.'}), 500
+            return {'answer': 'No general response generated.'}, 500
 
     elif intent == 'Greeting':
         node = event_map.get('greeting_response')
         if node:
-            return jsonify({'answer': node['response']}), 200
+            return {'answer': node['response']}, 200
         else:
-            return jsonify({'answer': 'No greeting response generated.'}), 500
+            return {'answer': 'No greeting response generated.'}, 500
         
     else:
-        return jsonify({'answer': 'Cannot understand the intent. Please type a proper query.'}), 404
+        return {'answer': 'Cannot understand the intent. Please type a proper query.'}, 404
+
+
+@app.post('/chat')
+def query():
+    events_list = []
+    
+    data = request.get_json()
+    user_query = data['query']
+    language = data['language']
+    session_id, issued = request_session(data, request.headers, request.cookies)
+    metrics.increment('chat.requests')
+
+    try:
+        slot = llm_scheduler.acquire('chat')
+    except Overloaded as e:
+        payload, headers = busy_payload('answer', e)
+        return attach_session(jsonify(payload), session_id, issued), e.status, headers
+
+    config = chat_config(session_id, language)
+    with slot:
+        events = get_graph().stream(
+            {
+                'user_query': [{'role': 'user', 'content': user_query}],
+                'language': language
+            },
+            config=config
+        )
+
+        for event in events:
+            events_list.append(event)
+
+    # Convenience mapping
+    event_map = {}
+    for ev in events_list:
+        event_map.update(ev)
+
+    payload, status = chat_answer(event_map, user_query, language, session_id)
+    return attach_session(jsonify(payload), session_id, issued), status
+
+
+# Streams the same answer as /chat as server-sent events:
+#   progress  {"node", "intent"?}   a graph node finished
+#   token     {"text"}              next piece of a Greeting / General answer
+#   category  {...}                 a complete Specialised category object
+#   answer    {...}                 the final /chat payload, plus "status"
+STREAMED_TEXT_NODES = ('greeting_response', 'general_query_response')
+
+
+@app.post('/chat/stream')
+def chat_stream():
+    data = request.get_json()
+    user_query = data['query']
+    language = data['language']
+    session_id, issued = request_session(data, request.headers, request.cookies)
+    metrics.increment('chat.requests')
+    metrics.increment('chat.stream.requests')
+    started = time.perf_counter()
+
+    # Admitted before the stream starts, so a shed request still gets its status code
+    try:
+        slot = llm_scheduler.acquire('chat')
+    except Overloaded as e:
+        payload, headers = busy_payload('answer', e)
+        return attach_session(jsonify(payload), session_id, issued), e.status, headers
+
+    def generate():
+        first_content = True
+
+        def content_sent():
+            nonlocal first_content
+            if first_content:
+                metrics.record_latency('chat.stream.first_content', time.perf_counter() - started)
+                first_content = False
+
+        # Hindi answers are translated after generation: stream the translation instead
+        streamed_tag = 'translation' if language == 'hi' else 'answer'
+        parser = CategoryStreamParser()
+        event_map = {}
+        # Ids already sent, so a later category cannot repeat a resource
+        streamed_ids = set()
+
+        config = chat_config(session_id, language)
+        events = get_graph().stream(
+            {
+                'user_query': [{'role': 'user', 'content': user_query}],
+                'language': language
+            },
+            config=config,
+            stream_mode=['updates', 'messages']
+        )
+
+        for mode, chunk in events:
+            if mode == 'updates':
+                for node, update in chunk.items():
+                    event_map[node] = update
+                    progress = {'node': node}
+                    if 'intent' in update:
+                        progress['intent'] = update['intent']
+                    yield sse('progress', progress)
+                continue
+
+            message, meta = chunk
+            node = meta.get('langgraph_node')
+            if streamed_tag not in meta.get('tags', []) or not message.content:
+                continue
+            if node in STREAMED_TEXT_NODES:
+                content_sent()
+                yield sse('token', {'text': message.content})
+            elif node == 'specialised_query_response' and language != 'hi':
+                for item in parser.feed(message.content):
+                    if SPECIALISED_ID_ONLY:
+                        item = stream_hydrate(item, event_map['context_memory'].get('context_rows') or {}, streamed_ids)
+                        if item is None:
+                            continue
+                    content_sent()
+                    yield sse('category', item)
+
+        # The answer is complete: hand the slot on before the final payload is built
+        slot.release()
+
+        payload, status = chat_answer(event_map, user_query, language, session_id)
+        content_sent()
+        yield sse('answer', {**payload, 'status': status})
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+    # Also frees the slot when the stream fails or the client goes away before it ends
+    response.call_on_close(slot.release)
+    return attach_session(response, session_id, issued)
 
 
 @app.post('/summarise_page')
 def summarise_page_endpoint():
-    request_data = request.get_json()
+    # Admitted here rather than in summarise_content: the page handlers turn any exception into a 500
+    try:
+        slot = llm_scheduler.acquire('summarise')
+    except Overloaded as e:
+        payload, headers = busy_payload('summary', e)
+        return jsonify(payload), e.status, headers
+    with slot:
+        return summarise_page(request.get_json())
+
+
+def summarise_page(request_data):
+    """Summarise the page at request_data['url']; returns the matching handler's (response, status)"""
     url = request_data['url']
 
     if not url:
@@ -1412,6 +1934,7 @@ def summarise_page_endpoint():
     
     # States of India
     def handle_states(parsed_url, page, nid, language):
+        from bs4 import BeautifulSoup
         try:
             category = parsed_url.split('/')[2].lower().strip()
             sub_category = parsed_url.split('/')[3].lower().strip()
@@ -1655,7 +2178,7 @@ def summarise_page_endpoint():
 
         nid_ = int(parsed_url.split('/')[-1].split('=')[-1])
         sub_category = parsed_url.split('/')[2].lower().strip()
-        tab = ((request.get_json(silent=True) or {}).get('tab') or '').strip().lower()
+        tab = ((request_data or {}).get('tab') or '').strip().lower()
 
         print('healing_nid', nid)
         print('step 1 - tab', tab)
@@ -2044,6 +2567,39 @@ def summarise_page_endpoint():
 #------------------------------------------------------------------------------------
 @app.get('/clear_memory')
 def clear_memory():
-    global thread_id
-    thread_id += 1
-    return jsonify({"message": "Memory cleared successfully"}), 200
+    session_id, issued = request_session(request.args, request.headers, request.cookies)
+    if not issued:
+        session_store.advance(session_id)
+    return attach_session(jsonify({"message": "Memory cleared successfully"}), session_id, issued), 200
+
+
+#------------------------------------------------------------------------------------
+@app.get('/metrics')
+def metrics_endpoint():
+    return jsonify(metrics.snapshot()), 200
+
+
+#------------------------------------------------------------------------------------
+@app.get('/checkpoint_stats')
+def checkpoint_stats_endpoint():
+    return jsonify(checkpoint_stats()), 200
+
+
+#------------------------------------------------------------------------------------
+@app.get('/ready')
+def ready():
+    status = {
+        'ready': warmup_done.is_set() and warmup_error is None,
+        'warmup_finished': warmup_done.is_set(),
+        'error': warmup_error,
+        'startup_seconds': startup_timings
+    }
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+startup_timings['import.app'] = round(time.perf_counter() - _import_started, 3)
+
+if WARMUP_ON_START:
+    threading.Thread(target=run_warmup, name='warmup', daemon=True).start()
+else:
+    warmup_done.set()
@@ -0,0 +1,167 @@
+"""
+Asyncio serving mode for the chat API.
+
+app.py answers every request on a blocking Flask worker, so concurrency
+is capped by the worker count. This module serves /chat, /summarise_page
+and /clear_memory (plus /metrics, /checkpoint_stats and /ready) from a
+single event loop:
+
+- the graph runs through astream and its LLM nodes await Groq directly
+- the semantic cache node embeds queries through the async OpenAI client
+- upstream page fetches share one pooled httpx.AsyncClient
+- whatever still blocks (retrieval, SQLite, the summarise handlers) runs
+  on a bounded thread pool installed as the loop's default executor
+- requests wait for an LLM slot on the loop, in the same scheduler lanes
+  as the Flask routes
+
+Graph state, caches and metrics are the ones app.py uses. Run it under an
+ASGI server:
+
+    hypercorn async_app:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from quart import Quart, request, jsonify
+from quart_cors import cors
+
+import app as sync_app
+import metrics
+from scheduler import llm_scheduler, Overloaded
+
+ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', '32'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+
+app = cors(Quart(__name__), expose_headers=[sync_app.SESSION_HEADER])
+
+blocking_pool = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix='blocking')
+http_client = None
+loop = None
+
+
+@app.before_serving
+async def start_clients():
+    global http_client, loop
+    loop = asyncio.get_running_loop()
+    # asyncio.to_thread and LangGraph's sync-node fallback both use this
+    loop.set_default_executor(blocking_pool)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        timeout=HTTP_TIMEOUT
+    )
+    sync_app.page_fetcher = fetch_page_from_pool
+
+
+@app.after_serving
+async def close_clients():
+    sync_app.page_fetcher = None
+    await http_client.aclose()
+
+
+async def fetch_page_content(url):
+    try:
+        response = await http_client.get(url)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        print(f"Request failed: {e}")
+        return None
+    except Exception as e:
+        print(f"Error fetching page content: {e}")
+        return None
+
+
+def fetch_page_from_pool(url):
+    """extract_page_content for handlers on the blocking pool: the fetch itself runs on the loop"""
+    return asyncio.run_coroutine_threadsafe(fetch_page_content(url), loop).result()
+
+
+def run_summarise_page(request_data):
+    """Run the Flask summarise handlers and return their (json, status)"""
+    with sync_app.app.app_context():
+        result = sync_app.summarise_page(request_data)
+    if result is None:
+        # No handler matched, which fails the request on the Flask server too
+        return {'summary': 'Failed to summarise the page. Try again!'}, 500
+    response, status = result if isinstance(result, tuple) else (result, result.status_code)
+    return response.get_json(), status
+
+
+@app.post('/chat')
+async def query():
+    data = await request.get_json()
+    user_query = data['query']
+    language = data['language']
+    session_id, issued = sync_app.request_session(data, request.headers, request.cookies)
+    metrics.increment('chat.requests')
+
+    try:
+        slot = await llm_scheduler.aacquire('chat')
+    except Overloaded as e:
+        payload, headers = sync_app.busy_payload('answer', e)
+        return sync_app.attach_session(jsonify(payload), session_id, issued), e.status, headers
+
+    config = await asyncio.to_thread(sync_app.chat_config, session_id, language)
+    with slot:
+        events = sync_app.get_graph().astream(
+            {
+                'user_query': [{'role': 'user', 'content': user_query}],
+                'language': language
+            },
+            config=config
+        )
+
+        event_map = {}
+        async for event in events:
+            event_map.update(event)
+
+    # Advancing the session and storing the cached answer write to SQLite
+    payload, status = await asyncio.to_thread(sync_app.chat_answer, event_map, user_query, language, session_id)
+    return sync_app.attach_session(jsonify(payload), session_id, issued), status
+
+
+@app.post('/summarise_page')
+async def summarise_page_endpoint():
+    request_data = await request.get_json()
+    try:
+        slot = await llm_scheduler.aacquire('summarise')
+    except Overloaded as e:
+        payload, headers = sync_app.busy_payload('summary', e)
+        return jsonify(payload), e.status, headers
+
+    with slot:
+        payload, status = await asyncio.to_thread(run_summarise_page, request_data)
+    return jsonify(payload), status
+
+
+@app.get('/clear_memory')
+async def clear_memory():
+    session_id, issued = sync_app.request_session(request.args, request.headers, request.cookies)
+    if not issued:
+        await asyncio.to_thread(sync_app.session_store.advance, session_id)
+    return sync_app.attach_session(jsonify({"message": "Memory cleared successfully"}), session_id, issued), 200
+
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    return jsonify(metrics.snapshot()), 200
+
+
+@app.get('/checkpoint_stats')
+async def checkpoint_stats_endpoint():
+    return jsonify(await asyncio.to_thread(sync_app.checkpoint_stats)), 200
+
+
+@app.get('/ready')
+async def ready():
+    status = {
+        'ready': sync_app.warmup_done.is_set() and sync_app.warmup_error is None,
+        'warmup_finished': sync_app.warmup_done.is_set(),
+        'error': sync_app.warmup_error,
+        'startup_seconds': sync_app.startup_timings
+    }
+    return jsonify(status), 200 if status['ready'] else 503
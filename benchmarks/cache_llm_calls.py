@@ -0,0 +1,78 @@
+"""
+Regression check: a repeated Specialised question makes no LLM call.
+
+Sends each question to /chat twice, on separate sessions, through the
+real graph with the configured LLM, embeddings and search backend. The
+intent classifier's cache is cleared before the repeat, so the repeat
+cannot skip the intent call on the strength of the first run. A repeat
+must be a semantic cache hit, leave the llm.calls counter unchanged and
+never reach question_type or context_memory. Fails (exit status 1)
+otherwise.
+
+    python -m benchmarks.cache_llm_calls
+    python -m benchmarks.cache_llm_calls --query "Books on Mughal miniature painting"
+"""
+import argparse
+import os
+import sys
+
+QUERIES = [
+    'Show me books about classical dance',
+    'Books on Mughal miniature painting',
+    'Tell me about the textiles of Gujarat',
+]
+WATCHED = ('llm.calls', 'node.question_type.calls', 'node.context_memory.calls')
+
+
+def counters(metrics):
+    counts = metrics.snapshot()['counters']
+    return {name: counts.get(name, 0) for name in WATCHED}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--query', action='append', help='question to ask twice; repeatable')
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    import app
+    import intent_classifier
+    import metrics
+
+    if not app.SEMANTIC_CACHE_ENABLED:
+        print('FAIL: SEMANTIC_CACHE_ENABLED is off')
+        sys.exit(1)
+
+    client = app.app.test_client()
+    failures = []
+    checked = 0
+    for query in args.query or QUERIES:
+        body = {'query': query, 'language': args.language}
+        first = client.post('/chat', json=body).get_json()
+        if first.get('cache') != 'miss' or not app.is_cacheable_answer(first.get('answer')):
+            print(f'skip   {query!r}: first answer was not stored ({first.get("cache")})')
+            continue
+
+        checked += 1
+        intent_classifier._cache.clear()
+        before = counters(metrics)
+        repeat = client.post('/chat', json=body).get_json()
+        spent = {name: count - before[name] for name, count in counters(metrics).items()}
+
+        print(f'{repeat.get("cache", "-"):<6} {query!r}: ' + ', '.join(f'{name} +{n}' for name, n in spent.items()))
+        if repeat.get('cache') != 'hit':
+            failures.append(f'{query!r} was not served from the cache')
+        elif any(spent.values()):
+            failures.append(f'{query!r} repeat ran ' + ', '.join(name for name, n in spent.items() if n))
+
+    if not checked:
+        failures.append('no question got a cacheable first answer')
+    if failures:
+        print('FAIL: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK: repeated questions are answered without an LLM call')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark: id lookup through CatalogRepository and the mmap
+RecordStore against the old path (f-string SQL -> SQLDatabase.run ->
+ast.literal_eval -> DataFrame).
+
+    python -m benchmarks.catalog_lookup --db all_categories_data-sqlite.db
+    python -m benchmarks.catalog_lookup --synthetic 50000
+"""
+import argparse
+import ast
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+from langchain_community.utilities import SQLDatabase
+
+from catalog import CatalogRepository
+from record_store import RecordStore, build_record_store
+
+
+def build_synthetic_db(path, rows):
+    """Categories table shaped like the one pandas.to_sql wrote for the real catalog"""
+    categories = [f'Category {i}' for i in range(40)]
+    df = pd.DataFrame({
+        'title': [f'Title number {i}' for i in range(rows)],
+        'category': [categories[i % len(categories)] for i in range(rows)],
+        'description': ['Lorem ipsum dolor sit amet, ' * 12 for _ in range(rows)],
+        'url': [f'https://icpdelhi.nvli.in/item/{i}' for i in range(rows)]
+    })
+    df.index = df.index + 1
+    conn = sqlite3.connect(path)
+    df.to_sql('Categories', conn, index=True, index_label='index')
+    conn.close()
+
+
+def legacy_lookup(db, ids):
+    ids_str = ','.join(str(id) for id in ids)
+    sql_query = f'SELECT "index", title, category, description, url FROM Categories WHERE "index" IN ({ids_str}) ORDER BY category, title'
+    output = ast.literal_eval(db.run(sql_query))
+    df = pd.DataFrame(output, columns=['id', 'title', 'category', 'description', 'url'])
+    return {category: df[df['category'] == category] for category in df['category'].unique()}
+
+
+def time_calls(fn, id_sets):
+    timings = []
+    for ids in id_sets:
+        start = time.perf_counter()
+        fn(ids)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{name:<20} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='all_categories_data-sqlite.db')
+    parser.add_argument('--synthetic', type=int, default=0, help='benchmark a generated catalog of N rows')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--ids', type=int, default=20, help='ids per lookup, as fetch_similar_titles returns')
+    args = parser.parse_args()
+
+    path = args.db
+    if args.synthetic:
+        path = os.path.join(tempfile.mkdtemp(), 'catalog.db')
+        build_synthetic_db(path, args.synthetic)
+
+    db = SQLDatabase.from_uri(f'sqlite:///{path}')
+    repository = CatalogRepository(path)
+    store_path = os.path.join(tempfile.mkdtemp(), 'catalog_records.bin')
+    build_record_store(path, store_path)
+    store = RecordStore(store_path)
+    with repository.connection() as conn:
+        max_id = conn.execute('SELECT MAX("index") FROM Categories').fetchone()[0]
+
+    rng = random.Random(0)
+    id_sets = [rng.sample(range(1, max_id + 1), min(args.ids, max_id)) for _ in range(args.iterations)]
+
+    # Warm both paths so connection setup is not measured
+    legacy_lookup(db, id_sets[0])
+    repository.fetch_grouped(id_sets[0])
+    store.fetch_grouped(id_sets[0])
+
+    print(f'{args.iterations} lookups of {args.ids} ids against {max_id} rows')
+    report('legacy (db.run)', time_calls(lambda ids: legacy_lookup(db, ids), id_sets))
+    report('CatalogRepository', time_calls(repository.fetch_grouped, id_sets))
+    report('RecordStore (mmap)', time_calls(store.fetch_grouped, id_sets))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Memory soak: checkpoint storage under a long stream of chat turns.
+
+Drives a small graph shaped like the chat graph (user_query / context /
+response message channels, one ~1 KB answer per turn) with turns spread
+over many sessions, some of which clear their memory, and reports the
+Python heap, RSS and checkpoint storage as the run goes on. The
+in-process MemorySaver grows with every turn; the bounded
+SqliteCheckpointSaver should level off once max_threads is reached.
+RSS never shrinks within a process, so compare it with one --saver per
+run.
+
+    python -m benchmarks.checkpoint_soak
+    python -m benchmarks.checkpoint_soak --saver sqlite --requests 50000 --max-threads 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Annotated
+
+from typing_extensions import TypedDict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+
+from checkpoint_store import SqliteCheckpointSaver
+
+ANSWER = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 18
+
+
+class State(TypedDict):
+    user_query: Annotated[list, add_messages]
+    context: Annotated[list, add_messages]
+    response: Annotated[list, add_messages]
+
+
+def answer(state: State):
+    return {'context': 'context for ' + state['user_query'][-1].content, 'response': ANSWER}
+
+
+def build_graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node('answer', answer)
+    builder.add_edge(START, 'answer')
+    builder.add_edge('answer', END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def storage(saver):
+    if isinstance(saver, SqliteCheckpointSaver):
+        stats = saver.stats()
+        return stats['threads'], stats['bytes_held'], stats['file_bytes'] + stats['wal_bytes']
+    return len(saver.storage), None, None
+
+
+def soak(name, saver, args):
+    graph = build_graph(saver)
+    generations = {}
+    rng = random.Random(args.seed)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    print(f'\n{name}')
+    print(f'{"requests":>9} {"heap MB":>8} {"rss MB":>7} {"threads":>8} {"held MB":>8} {"file MB":>8} {"req/s":>7}')
+    for request in range(1, args.requests + 1):
+        session = rng.randrange(args.sessions)
+        if rng.random() < args.clear_rate:
+            old = generations.get(session, 0)
+            generations[session] = old + 1
+            if isinstance(saver, SqliteCheckpointSaver):
+                saver.delete_thread(f'{session}:{old}')
+        thread_id = f'{session}:{generations.get(session, 0)}'
+        graph.invoke({'user_query': [{'role': 'user', 'content': f'question {request}'}]},
+                     config={'configurable': {'thread_id': thread_id}})
+
+        if request % args.report_every == 0:
+            heap, _ = tracemalloc.get_traced_memory()
+            threads, held, file_bytes = storage(saver)
+            mb = lambda value: f'{value / 1e6:8.1f}' if value is not None else f'{"-":>8}'
+            print(f'{request:9d} {heap / 1e6:8.1f} {rss_bytes() / 1e6:7.1f} {threads:8d} {mb(held)} {mb(file_bytes)} '
+                  f'{request / (time.perf_counter() - start):7.0f}')
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--saver', choices=['memory', 'sqlite', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=5000, help='distinct sessions the turns are spread over')
+    parser.add_argument('--clear-rate', type=float, default=0.1, help='share of turns that clear the memory first')
+    parser.add_argument('--max-threads', type=int, default=500)
+    parser.add_argument('--history', type=int, default=2, help='checkpoints kept per thread')
+    parser.add_argument('--no-compress', action='store_true')
+    parser.add_argument('--report-every', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.saver in ('memory', 'both'):
+        soak('MemorySaver', MemorySaver(), args)
+    if args.saver in ('sqlite', 'both'):
+        with tempfile.TemporaryDirectory() as tmp:
+            saver = SqliteCheckpointSaver(
+                os.path.join(tmp, 'checkpoints.db'), compress=not args.no_compress,
+                max_threads=args.max_threads, history_per_thread=args.history, maintenance_interval=5
+            )
+            label = f'SqliteCheckpointSaver (max {args.max_threads} threads, {args.history} checkpoints each)'
+            soak(label, saver, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Regression check: the Specialised prompt does not grow with the turn number.
+
+Runs a conversation of Specialised turns on one thread of the real graph
+State and checkpointer. Every turn asks the same question and retrieves
+the same context, so any change in prompt size after the first turn
+comes from earlier turns leaking into it. The prompt is rendered from
+specialised_query_inputs exactly as the answer node does. Fails (exit
+status 1) when the prompt size changes after the second turn, or when
+the context or retrieval channels show up in a saved checkpoint.
+
+    python -m benchmarks.context_growth
+    python -m benchmarks.context_growth --turns 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from langgraph.graph import StateGraph, START, END
+
+from checkpoint_store import SqliteCheckpointSaver
+from context_builder import count_tokens
+
+QUESTION = 'Show me books about classical dance'
+CONTEXT = '\n'.join(['## Books'] + [
+    f'- [{100 + i}] Title {i:02d} | https://example.org/{i:02d} | a short description of the resource'
+    for i in range(20)
+])
+
+
+def build_graph(app, checkpointer, prompt_tokens):
+    prompt = app.specialised_ids_prompt if app.SPECIALISED_ID_ONLY else app.specialised_prompt
+
+    def context_memory(state):
+        return {'context': CONTEXT, 'retrieval': {'query': QUESTION, 'ids': list(range(100, 120))}}
+
+    def specialised_query_response(state):
+        prompt_tokens.append(count_tokens(prompt.format(**app.specialised_query_inputs(state))))
+        return {'response': '[]'}
+
+    builder = StateGraph(app.State)
+    builder.add_node('context_memory', context_memory)
+    builder.add_node('specialised_query_response', specialised_query_response)
+    builder.add_edge(START, 'context_memory')
+    builder.add_edge('context_memory', 'specialised_query_response')
+    builder.add_edge('specialised_query_response', END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    import app
+
+    prompt_tokens = []
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        saver = SqliteCheckpointSaver(os.path.join(tmp, 'checkpoints.db'))
+        graph = build_graph(app, saver, prompt_tokens)
+        config = {'configurable': {'thread_id': 'context-growth'}}
+        for _ in range(args.turns):
+            graph.invoke({'user_query': [{'role': 'user', 'content': QUESTION}], 'language': 'en'}, config=config)
+
+        saved = saver.get_tuple(config).checkpoint['channel_values']
+        for channel in ('context', 'retrieval'):
+            if channel in saved:
+                failures.append(f'{channel} is stored in the checkpoint')
+
+    for turn in range(0, len(prompt_tokens), max(1, len(prompt_tokens) // 10)):
+        print(f'turn {turn + 1:4d}: {prompt_tokens[turn]} prompt tokens')
+    print(f'turn {len(prompt_tokens):4d}: {prompt_tokens[-1]} prompt tokens')
+
+    # The first turn has no previous question in its history
+    baseline = prompt_tokens[1]
+    drift = max(abs(tokens - baseline) for tokens in prompt_tokens[1:])
+    if drift:
+        failures.append(f'prompt size drifts by {drift} tokens over {args.turns} turns')
+
+    if failures:
+        print('FAIL: ' + '; '.join(failures))
+        sys.exit(1)
+    print(f'OK: prompt size independent of turn number (drift {drift} tokens), context not checkpointed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: Specialised context tokens, old DataFrame dump against
+build_context.
+
+The old answer_query sent DataFrame.to_string() of the looked-up rows
+(id, title, category, description, url) to the LLM. This renders random
+id sets of retrieval size both ways and reports the tiktoken counts and
+the saving; build_context itself no longer measures a baseline per
+request.
+
+    python -m benchmarks.context_tokens --db all_categories_data-sqlite.db
+    python -m benchmarks.context_tokens --db all_categories_data-sqlite.db --budget 800
+"""
+import argparse
+import random
+import statistics
+
+import pandas as pd
+
+from catalog import CatalogRepository
+from context_builder import build_context, count_tokens, CONTEXT_TOKEN_BUDGET
+
+
+def legacy_context(grouped):
+    """The context string the old answer_query built from the same rows"""
+    rows = sorted(
+        (row for category_rows in grouped.values() for row in category_rows),
+        key=lambda row: (row.category, row.title or '')
+    )
+    df = pd.DataFrame(
+        [(row.id, row.title, row.category, row.description, row.url) for row in rows],
+        columns=['id', 'title', 'category', 'description', 'url']
+    )
+    return df.to_string()
+
+
+def summary(name, values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f'{name:<16} mean {statistics.mean(values):8.1f}   p50 {statistics.median(values):8.1f}   p95 {p95:8.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='all_categories_data-sqlite.db')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--ids', type=int, default=20, help='ids per context, as fetch_similar_titles returns')
+    parser.add_argument('--budget', type=int, default=CONTEXT_TOKEN_BUDGET, help='build_context token budget')
+    args = parser.parse_args()
+
+    repository = CatalogRepository(args.db)
+    with repository.connection() as conn:
+        max_id = conn.execute('SELECT MAX("index") FROM Categories').fetchone()[0]
+
+    rng = random.Random(0)
+    legacy, packed = [], []
+    for _ in range(args.iterations):
+        ranked_ids = rng.sample(range(1, max_id + 1), min(args.ids, max_id))
+        grouped = repository.fetch_grouped(ranked_ids)
+        if not grouped:
+            continue
+        legacy.append(count_tokens(legacy_context(grouped)))
+        packed.append(build_context(grouped, ranked_ids, max_tokens=args.budget)[1]['tokens'])
+
+    print(f'{len(legacy)} contexts of {args.ids} ids against {max_id} rows (budget {args.budget} tokens)')
+    summary('to_string()', legacy)
+    summary('build_context', packed)
+    saved = [old - new for old, new in zip(legacy, packed)]
+    summary('saved', saved)
+    print(f'saving: {sum(saved) / sum(legacy):.1%} of the old context tokens')
+
+
+if __name__ == '__main__':
+    main()
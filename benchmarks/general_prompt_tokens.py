@@ -0,0 +1,78 @@
+"""
+Benchmark: General prompt size with the whole knowledge_context against
+the sections selected by the knowledge index.
+
+Renders general_prompt for a sample of General questions both ways and
+reports the average prompt tokens before and after, and the sections
+each question was given.
+
+    python -m benchmarks.general_prompt_tokens
+    python -m benchmarks.general_prompt_tokens --budget 500 --top 2
+"""
+import argparse
+import os
+import statistics
+
+from context_builder import count_tokens
+from knowledge_base import knowledge_context, get_knowledge_index, KNOWLEDGE_TOKEN_BUDGET, KNOWLEDGE_TOP_SECTIONS
+
+SAMPLE_QUERIES = [
+    'what can you do',
+    'who are you',
+    'who developed this portal',
+    'what is nvli',
+    'which categories are available',
+    'how many languages is the portal available in',
+    'tell me about the festivals of india category',
+    'give me the link to classical dances',
+    'is there a section on musical instruments',
+    'what is timeless trends about',
+    'where can I read folktales',
+    'what are the iconic battles of india',
+    'do you have anything on the jewellery of the nizams',
+    'show me the historic cities section',
+    'what is in the ajanta caves category',
+    'where can I find rare books and manuscripts',
+    'do you have videos and audio recordings',
+    'is there a quiz or crossword',
+    'what publications has the portal released',
+    'tell me about your outreach programmes',
+    'what is the freedom archive',
+    'what are retrieved artefacts'
+]
+
+
+def prompt_tokens(template, question, knowledge):
+    return count_tokens(template.format(
+        conversation_history=f'User: {question}',
+        latest_question=question,
+        knowledge_context=knowledge
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=int, default=KNOWLEDGE_TOKEN_BUDGET, help='knowledge token budget')
+    parser.add_argument('--top', type=int, default=KNOWLEDGE_TOP_SECTIONS, help='ranked sections per prompt')
+    args = parser.parse_args()
+
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    from app import general_prompt
+
+    knowledge_index = get_knowledge_index()
+    before, after = [], []
+    for question in SAMPLE_QUERIES:
+        knowledge, report = knowledge_index.context(question, max_tokens=args.budget, top_k=args.top)
+        before.append(prompt_tokens(general_prompt.template, question, knowledge_context))
+        after.append(prompt_tokens(general_prompt.template, question, knowledge))
+        print(f'{after[-1]:5d}  {question:<50} {", ".join(report["sections"][len(knowledge_index.pinned):]) or "-"}')
+
+    mean_before, mean_after = statistics.mean(before), statistics.mean(after)
+    print(f'{len(SAMPLE_QUERIES)} General queries, knowledge budget {args.budget} tokens, top {args.top} sections')
+    print(f'prompt tokens before: mean {mean_before:.0f}, max {max(before)}')
+    print(f'prompt tokens after:  mean {mean_after:.0f}, max {max(after)}')
+    print(f'saved per prompt: {mean_before - mean_after:.0f} tokens ({1 - mean_after / mean_before:.1%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: local JSON repair over a corpus of malformed specialised answers.
+
+Reports which layer rescued each output, the outputs that would still
+need the LLM repair call, mismatches against the expected layer and the
+time spent per output. The corpus is JSON lines with an "output" and an
+"expected" layer (null when nothing should rescue it); files captured
+through JSON_REPAIR_CAPTURE_PATH can be passed as extra corpora, their
+recorded "layer" is used as the expectation.
+
+    python -m benchmarks.json_repair_corpus
+    python -m benchmarks.json_repair_corpus --corpus captured.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from json_repair import LAYERS, JSONRepairError, repair
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'malformed_outputs.jsonl')
+
+
+def load_corpus(paths):
+    entries = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    entry = json.loads(line)
+                    entry.setdefault('case', f'{os.path.basename(path)}:{number}')
+                    entry.setdefault('expected', entry.get('layer'))
+                    entries.append(entry)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', action='append', help='extra JSON lines corpus (repeatable)')
+    parser.add_argument('--repeat', type=int, default=200, help='timing iterations per output')
+    args = parser.parse_args()
+
+    entries = load_corpus([DEFAULT_CORPUS] + (args.corpus or []))
+    counts = {layer: 0 for layer in LAYERS + (None,)}
+    mismatches = []
+    timings = []
+
+    for entry in entries:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            try:
+                _, layer = repair(entry['output'])
+            except JSONRepairError:
+                layer = None
+        timings.append((time.perf_counter() - start) * 1000 / args.repeat)
+
+        counts[layer] += 1
+        if layer != entry['expected']:
+            mismatches.append((entry['case'], entry['expected'], layer))
+
+    total = len(entries)
+    print(f'{total} outputs')
+    for layer, count in counts.items():
+        print(f'  {layer or "unrepaired":<12} {count:4d}  ({count / total:6.1%})')
+    rescued = total - counts['strict'] - counts[None]
+    print(f'LLM repair calls avoided: {rescued} of {total - counts["strict"]} malformed outputs')
+    print(f'repair time per output: mean {statistics.mean(timings):.3f} ms, max {max(timings):.3f} ms')
+
+    if mismatches:
+        print('Unexpected layers:')
+        for case, expected, layer in mismatches:
+            print(f'  {case}: expected {expected}, got {layer}')
+
+
+if __name__ == '__main__':
+    main()
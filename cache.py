@@ -0,0 +1,204 @@
+"""
+Small bounded caches shared by the retrieval and answer paths.
+
+LRUCache keeps entries in process memory, DiskCache keeps them in a SQLite
+file so they survive restarts, and TieredCache puts the first in front of
+the second. Values stored on disk must be JSON serialisable.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-memory cache with LRU eviction and an optional TTL in seconds"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class DiskCache:
+    """SQLite-backed cache with LRU eviction and an optional TTL in seconds"""
+
+    def __init__(self, path, namespace, maxsize=100000, ttl=None):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)')
+        self._conn.commit()
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                self._conn.execute(
+                    'UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                    (now, self.namespace, key)
+                )
+                self._conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(value), expires_at, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute(
+            'DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (self.namespace, now)
+        )
+        size = self._size()
+        if size > self.maxsize:
+            # Trim a little below the limit so we don't evict on every insert
+            excess = size - self.maxsize + max(1, self.maxsize // 20)
+            self._conn.execute(
+                """DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?
+                )""",
+                (self.namespace, self.namespace, excess)
+            )
+
+    def _size(self):
+        return self._conn.execute(
+            'SELECT COUNT(*) FROM cache WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+
+    def items(self):
+        """Yield every live (key, value) pair in the namespace"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value FROM cache WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (self.namespace, time.time())
+            ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class TieredCache:
+    """LRUCache in front of an optional DiskCache; disk hits are promoted to memory"""
+
+    def __init__(self, name, maxsize=1024, ttl=None, disk_path=None, disk_maxsize=100000):
+        self.name = name
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk = DiskCache(disk_path, name, maxsize=disk_maxsize, ttl=ttl) if disk_path else None
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        stats = {'memory': self.memory.stats()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
@@ -0,0 +1,118 @@
+"""
+Read-only access to the Categories table of the catalog database.
+
+Lookups go through a small pool of read-only SQLite connections and one
+parameterised statement, so SQLite prepares it once per connection and
+reuses it for any number of ids. Rows come back as CatalogRow tuples,
+grouped by category.
+
+With CATALOG_BACKEND=mmap (the default) the same lookups are served from
+the memory-mapped record store in record_store.py instead, rebuilt from
+the database whenever the database is newer.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple
+
+CATALOG_DB_PATH = os.getenv('CATALOG_DB_PATH', 'all_categories_data-sqlite.db')
+CATALOG_POOL_SIZE = int(os.getenv('CATALOG_POOL_SIZE', '4'))
+CATALOG_BACKEND = os.getenv('CATALOG_BACKEND', 'mmap')
+RECORD_STORE_PATH = os.getenv('RECORD_STORE_PATH', 'catalog_records.bin')
+
+# json_each keeps the statement text identical whatever the number of ids
+LOOKUP_BY_IDS_SQL = (
+    'SELECT "index", title, category, description, url FROM Categories '
+    'WHERE "index" IN (SELECT value FROM json_each(?)) '
+    'ORDER BY category, title'
+)
+
+
+class CatalogRow(NamedTuple):
+    id: int
+    title: str
+    category: str
+    description: str
+    url: str
+
+
+class CatalogRepository:
+    def __init__(self, path=CATALOG_DB_PATH, pool_size=CATALOG_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, opening a new one while the pool is not full"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            conn = self._connect() if can_open else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def fetch_by_ids(self, ids):
+        """Rows for the given ids, ordered by category then title"""
+        if not ids:
+            return []
+        id_list = '[' + ','.join(str(int(id_val)) for id_val in ids) + ']'
+        with self.connection() as conn:
+            rows = conn.execute(LOOKUP_BY_IDS_SQL, (id_list,)).fetchall()
+        return [CatalogRow(*row) for row in rows]
+
+    def fetch_grouped(self, ids):
+        """Rows for the given ids as {category: [CatalogRow, ...]}"""
+        return group_by_category(self.fetch_by_ids(ids))
+
+
+def group_by_category(rows):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.category, []).append(row)
+    return grouped
+
+
+def open_catalog(backend=CATALOG_BACKEND):
+    """The configured catalog: a RecordStore ('mmap') or a CatalogRepository ('sqlite')"""
+    if backend == 'mmap':
+        from record_store import RecordStore, build_record_store
+
+        stale = (
+            not os.path.exists(RECORD_STORE_PATH)
+            or os.path.getmtime(CATALOG_DB_PATH) > os.path.getmtime(RECORD_STORE_PATH)
+        )
+        if stale:
+            build_record_store(CATALOG_DB_PATH, RECORD_STORE_PATH)
+        return RecordStore(RECORD_STORE_PATH)
+
+    return CatalogRepository()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Shared catalog instance, opened on first use"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = open_catalog()
+    return _catalog
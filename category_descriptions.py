@@ -0,0 +1,109 @@
+"""
+Precomputed descriptions of the catalog categories.
+
+Id-only specialised answers take each category's description from this
+table instead of having the LLM write one per answer. Descriptions are
+generated once per category from a sample of its titles and stored in
+the catalog database next to the Categories table. Categories missing
+from the table still get a generated description in the answer.
+
+Build the missing descriptions (or all of them with --force) with:
+
+    python category_descriptions.py [--force]
+"""
+import argparse
+import sqlite3
+import threading
+
+from catalog import CATALOG_DB_PATH, CatalogRepository
+
+DESCRIPTIONS_TABLE = 'CategoryDescriptions'
+SAMPLE_TITLES = 15
+
+DESCRIBE_PROMPT = """
+    You are writing catalog copy for the Indian Culture Portal.
+    Describe the category "{category}" in 2-3 lines for a reader browsing the portal.
+    Base the description only on these sample titles from the category:
+
+    {titles}
+
+    Respond with the description only.
+    """
+
+_descriptions = None
+_lock = threading.Lock()
+
+
+def describe_with_llm(category, titles):
+    from langchain_core.prompts import PromptTemplate
+    from database import get_llm
+
+    chain = PromptTemplate.from_template(DESCRIBE_PROMPT) | get_llm()
+    response = chain.invoke({'category': category, 'titles': '\n'.join(f'- {title}' for title in titles)})
+    return response.content.strip()
+
+
+def build_descriptions(db_path=CATALOG_DB_PATH, describe=describe_with_llm, force=False):
+    """Generate descriptions for the categories that have none; returns how many were written"""
+    conn = sqlite3.connect(db_path)
+    try:
+        if force:
+            conn.execute(f'DROP TABLE IF EXISTS {DESCRIPTIONS_TABLE}')
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {DESCRIPTIONS_TABLE} '
+            '(category TEXT PRIMARY KEY, description TEXT NOT NULL)'
+        )
+        missing = [row[0] for row in conn.execute(
+            f'SELECT DISTINCT category FROM Categories WHERE category IS NOT NULL '
+            f'AND category NOT IN (SELECT category FROM {DESCRIPTIONS_TABLE})'
+        )]
+
+        written = 0
+        for category in missing:
+            titles = [row[0] for row in conn.execute(
+                'SELECT title FROM Categories WHERE category = ? AND title IS NOT NULL LIMIT ?',
+                (category, SAMPLE_TITLES)
+            )]
+            try:
+                description = describe(category, titles)
+            except Exception as e:
+                print(f"Could not describe {category}: {e}")
+                continue
+            conn.execute(f'INSERT OR REPLACE INTO {DESCRIPTIONS_TABLE} VALUES (?, ?)', (category, description))
+            conn.commit()
+            written += 1
+    finally:
+        conn.close()
+
+    reset()
+    return written
+
+
+def category_descriptions():
+    """{category: description}, read once per process; empty until the table is built"""
+    global _descriptions
+    if _descriptions is None:
+        with _lock:
+            if _descriptions is None:
+                try:
+                    with CatalogRepository().connection() as conn:
+                        _descriptions = dict(conn.execute(
+                            f'SELECT category, description FROM {DESCRIPTIONS_TABLE}'
+                        ).fetchall())
+                except sqlite3.OperationalError as e:
+                    print(f"No precomputed category descriptions: {e}")
+                    _descriptions = {}
+    return _descriptions
+
+
+def reset():
+    global _descriptions
+    _descriptions = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute category descriptions')
+    parser.add_argument('--force', action='store_true', help='regenerate every description')
+    args = parser.parse_args()
+
+    print(f'Category descriptions written: {build_descriptions(force=args.force)}')
@@ -0,0 +1,360 @@
+"""
+LangGraph checkpointer on a local SQLite database in WAL mode.
+
+Every worker process opens the same CHECKPOINT_DB_PATH, so a conversation
+continues whichever worker serves its next request. Checkpoints are
+stored whole (channel values included) with their pending writes, the
+same layout as langgraph-checkpoint-sqlite, which keeps reads to one
+row per checkpoint.
+
+Storage is bounded:
+
+- each thread keeps only its CHECKPOINT_HISTORY_PER_THREAD latest
+  checkpoints (and their writes); older ones are deleted on every put
+- threads idle for CHECKPOINT_IDLE_TTL seconds are deleted, and beyond
+  CHECKPOINT_MAX_THREADS the least recently written ones go first
+- with CHECKPOINT_COMPRESS, checkpoints and writes are stored
+  zlib-compressed
+- the freed pages are returned to the file system and the WAL truncated
+
+Eviction and compaction run at most every CHECKPOINT_MAINTENANCE_INTERVAL
+seconds, from whichever request writes next. /checkpoint_stats reports
+the thread count and the bytes held.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+import metrics
+
+CHECKPOINT_DB_PATH = os.getenv('CHECKPOINT_DB_PATH', 'checkpoints.db')
+CHECKPOINT_MAX_THREADS = int(os.getenv('CHECKPOINT_MAX_THREADS', '10000'))
+CHECKPOINT_HISTORY_PER_THREAD = int(os.getenv('CHECKPOINT_HISTORY_PER_THREAD', '2'))
+CHECKPOINT_IDLE_TTL = float(os.getenv('CHECKPOINT_IDLE_TTL', str(24 * 3600)))
+CHECKPOINT_COMPRESS = os.getenv('CHECKPOINT_COMPRESS', 'true').lower() == 'true'
+CHECKPOINT_MAINTENANCE_INTERVAL = float(os.getenv('CHECKPOINT_MAINTENANCE_INTERVAL', '60'))
+
+COMPRESSED_SUFFIX = '+zlib'
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    # Only takes effect on a new database, before the first table is created
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class CompressedSerializer:
+    """Wraps a typed serializer, zlib-compressing its output; uncompressed data still loads"""
+
+    def __init__(self, serde=None, level=6):
+        self.serde = serde or JsonPlusSerializer()
+        self.level = level
+
+    def dumps_typed(self, obj):
+        type_, data = self.serde.dumps_typed(obj)
+        return type_ + COMPRESSED_SUFFIX, zlib.compress(data, self.level)
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_.endswith(COMPRESSED_SUFFIX):
+            return self.serde.loads_typed((type_[:-len(COMPRESSED_SUFFIX)], zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, path=CHECKPOINT_DB_PATH, *, serde=None, compress=CHECKPOINT_COMPRESS,
+                 max_threads=CHECKPOINT_MAX_THREADS, history_per_thread=CHECKPOINT_HISTORY_PER_THREAD,
+                 idle_ttl=CHECKPOINT_IDLE_TTL, maintenance_interval=CHECKPOINT_MAINTENANCE_INTERVAL):
+        super().__init__(serde=CompressedSerializer(serde) if compress else serde)
+        self.path = path
+        self.max_threads = max_threads
+        self.history_per_thread = max(1, history_per_thread)
+        self.idle_ttl = idle_ttl
+        self.maintenance_interval = maintenance_interval
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+        self._last_maintenance = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS threads_lru ON threads (updated_at);
+            """
+        )
+        self._conn.commit()
+
+    def _tuple(self, thread_id, checkpoint_ns, row):
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            'SELECT task_id, channel, type, value FROM writes '
+            'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx',
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return CheckpointTuple(
+            config={'configurable': {
+                'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint_id
+            }},
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {'configurable': {
+                    'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': parent_checkpoint_id
+                }}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ]
+        )
+
+    def get_tuple(self, config):
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        columns = 'checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata'
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f'SELECT {columns} FROM checkpoints '
+                    'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?',
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f'SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? '
+                    'ORDER BY checkpoint_id DESC LIMIT 1',
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            'SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, '
+            'metadata_type, metadata FROM checkpoints'
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append('thread_id = ?')
+            params.append(str(config['configurable']['thread_id']))
+            if (checkpoint_ns := config['configurable'].get('checkpoint_ns')) is not None:
+                clauses.append('checkpoint_ns = ?')
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append('checkpoint_id = ?')
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append('checkpoint_id < ?')
+            params.append(before_id)
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY checkpoint_id DESC'
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                result = self._tuple(thread_id, checkpoint_ns, row)
+                if filter and not all(result.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(result)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint['id'], config['configurable'].get('checkpoint_id'),
+                 type_, serialized, metadata_type, serialized_metadata)
+            )
+            self._conn.execute('INSERT OR REPLACE INTO threads VALUES (?, ?)', (thread_id, time.time()))
+            self._prune_history(thread_id, checkpoint_ns)
+            self._conn.commit()
+        self.maybe_maintain()
+        return {'configurable': {
+            'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint['id']
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=''):
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        # Special channels (errors, interrupts) are replaced, regular writes are kept as first written
+        verb = 'INSERT OR REPLACE' if all(channel in WRITES_IDX_MAP for channel, _ in writes) else 'INSERT OR IGNORE'
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, type_, serialized, task_path))
+        with self._lock:
+            self._conn.executemany(f'{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.commit()
+
+    def _prune_history(self, thread_id, checkpoint_ns):
+        """Drop all but the newest history_per_thread checkpoints of the thread, with their writes"""
+        stale = self._conn.execute(
+            'SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? '
+            'ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?',
+            (thread_id, checkpoint_ns, self.history_per_thread)
+        ).fetchall()
+        if not stale:
+            return
+        rows = [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id, in stale]
+        self._conn.executemany(
+            'DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?', rows
+        )
+        self._conn.executemany(
+            'DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?', rows
+        )
+        self.pruned_checkpoints += len(rows)
+        metrics.increment('checkpoints.pruned', len(rows))
+
+    def _delete_threads(self, thread_ids):
+        rows = [(str(thread_id),) for thread_id in thread_ids]
+        self._conn.executemany('DELETE FROM checkpoints WHERE thread_id = ?', rows)
+        self._conn.executemany('DELETE FROM writes WHERE thread_id = ?', rows)
+        self._conn.executemany('DELETE FROM threads WHERE thread_id = ?', rows)
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._conn.commit()
+
+    def maybe_maintain(self):
+        if time.monotonic() - self._last_maintenance >= self.maintenance_interval:
+            self.maintain()
+
+    def maintain(self):
+        """Evict idle and least recently written threads, then compact the file; returns the evicted count"""
+        self._last_maintenance = time.monotonic()
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                'SELECT thread_id FROM threads WHERE updated_at < ?', (time.time() - self.idle_ttl,)
+            )]
+            self._delete_threads(expired)
+            count = self._conn.execute('SELECT COUNT(*) FROM threads').fetchone()[0]
+            overflow = []
+            if count > self.max_threads:
+                # Trim a little below the limit so we don't evict on every pass
+                excess = count - self.max_threads + max(1, self.max_threads // 20)
+                overflow = [row[0] for row in self._conn.execute(
+                    'SELECT thread_id FROM threads ORDER BY updated_at LIMIT ?', (excess,)
+                )]
+                self._delete_threads(overflow)
+            self._conn.commit()
+
+            evicted = len(expired) + len(overflow)
+            self.evicted_threads += evicted
+            if evicted:
+                metrics.increment('checkpoints.evicted_threads', evicted)
+                print(f"Checkpoints: evicted {len(expired)} idle and {len(overflow)} least recent threads")
+            # Give freed pages back and reset the WAL so the files shrink too
+            self._conn.execute('PRAGMA incremental_vacuum')
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            threads = self._conn.execute('SELECT COUNT(*) FROM threads').fetchone()[0]
+            checkpoints, checkpoint_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints'
+            ).fetchone()
+            writes, write_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM writes'
+            ).fetchone()
+            page_size = self._conn.execute('PRAGMA page_size').fetchone()[0]
+            pages = self._conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = self._conn.execute('PRAGMA freelist_count').fetchone()[0]
+        wal_path = self.path + '-wal'
+        return {
+            'threads': threads,
+            'checkpoints': checkpoints,
+            'writes': writes,
+            'bytes_held': checkpoint_bytes + write_bytes,
+            'file_bytes': pages * page_size,
+            'free_bytes': free_pages * page_size,
+            'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+            'compressed': isinstance(self.serde, CompressedSerializer),
+            'max_threads': self.max_threads,
+            'history_per_thread': self.history_per_thread,
+            'idle_ttl': self.idle_ttl,
+            'evicted_threads': self.evicted_threads,
+            'pruned_checkpoints': self.pruned_checkpoints
+        }
+
+    # SQLite calls block, so the async API runs them off the event loop
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for result in results:
+            yield result
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=''):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current, channel):
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split('.')[0])
+        return f'{current_v + 1:032}.{random.random():016}'
@@ -0,0 +1,164 @@
+"""
+Token-budgeted LLM context for the specialised path.
+
+Catalog rows are packed best-scored first until CONTEXT_TOKEN_BUDGET
+tiktoken tokens are used, skipping repeated titles and cutting each
+description to a few words, then written out grouped by category:
+
+    ## Category
+    - [id] Title | url | short description
+
+In id-only mode the model answers with those ids, and hydrate_groups
+turns its groups back into full category objects from the catalog rows.
+
+The saving against the old DataFrame dump is measured offline by
+benchmarks/context_tokens.py, not on every request.
+"""
+import os
+import re
+import threading
+import time
+
+import tiktoken
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1200'))
+CONTEXT_DESCRIPTION_WORDS = int(os.getenv('CONTEXT_DESCRIPTION_WORDS', '40'))
+
+CONTEXT_ID_RE = re.compile(r'^- \[(\d+)\]', re.MULTILINE)
+
+# Seconds before retrying a failed tiktoken load, doubling up to the maximum
+TIKTOKEN_RETRY_SECONDS = float(os.getenv('TIKTOKEN_RETRY_SECONDS', '30'))
+TIKTOKEN_RETRY_MAX_SECONDS = float(os.getenv('TIKTOKEN_RETRY_MAX_SECONDS', '600'))
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_retry_at = 0.0
+_encoding_backoff = TIKTOKEN_RETRY_SECONDS
+
+
+def get_encoding():
+    """cl100k_base, or None while it cannot be loaded and counts are estimated"""
+    global _encoding, _encoding_retry_at, _encoding_backoff
+    if _encoding is not None or time.monotonic() < _encoding_retry_at:
+        return _encoding
+    # One thread tries the load; the others estimate rather than wait on the download
+    if not _encoding_lock.acquire(blocking=False):
+        return _encoding
+    try:
+        if _encoding is None and time.monotonic() >= _encoding_retry_at:
+            try:
+                _encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                # The BPE file is downloaded on first use; estimate until the next attempt
+                print(f"tiktoken unavailable, estimating token counts for {_encoding_backoff:g}s: {e}")
+                _encoding_retry_at = time.monotonic() + _encoding_backoff
+                _encoding_backoff = min(_encoding_backoff * 2, TIKTOKEN_RETRY_MAX_SECONDS)
+    finally:
+        _encoding_lock.release()
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def shorten(text, max_words):
+    """Strip tags and collapse whitespace, keeping the first max_words words"""
+    text = re.sub(r'<[^>]+>', ' ', text or '').replace('&nbsp;', ' ')
+    words = text.split()
+    if len(words) > max_words:
+        return ' '.join(words[:max_words]) + '…'
+    return ' '.join(words)
+
+
+def build_context(grouped, ranked_ids, max_tokens=CONTEXT_TOKEN_BUDGET,
+                  description_words=CONTEXT_DESCRIPTION_WORDS):
+    """
+    Pack grouped catalog rows into a compact context string.
+
+    ranked_ids is the retrieval order (best first) and decides which rows
+    survive the budget. Returns (context, report) where report holds the
+    row and token counts.
+    """
+    rank = {id_val: position for position, id_val in enumerate(ranked_ids)}
+    rows = [row for category_rows in grouped.values() for row in category_rows]
+    rows.sort(key=lambda row: rank.get(row.id, len(rank)))
+
+    packed = {}
+    seen_titles = set()
+    used = 0
+    duplicates = 0
+    for row in rows:
+        title_key = ' '.join((row.title or '').lower().split())
+        if title_key in seen_titles:
+            duplicates += 1
+            continue
+
+        line = f'- [{row.id}] {row.title} | {row.url or "NA"} | {shorten(row.description, description_words)}'
+        cost = count_tokens(line) + 1
+        if row.category not in packed:
+            cost += count_tokens(f'## {row.category}') + 1
+        if used + cost > max_tokens:
+            break
+
+        seen_titles.add(title_key)
+        packed.setdefault(row.category, []).append(line)
+        used += cost
+
+    lines = []
+    for category, category_lines in packed.items():
+        lines.append(f'## {category}')
+        lines.extend(category_lines)
+    context = '\n'.join(lines)
+
+    packed_rows = sum(len(category_lines) for category_lines in packed.values())
+    tokens = count_tokens(context) if context else 0
+    report = {
+        'rows': packed_rows,
+        'dropped_rows': len(rows) - packed_rows - duplicates,
+        'duplicate_rows': duplicates,
+        'tokens': tokens
+    }
+    return context, report
+
+
+def context_ids(context):
+    """Ids of the rows listed in a build_context string"""
+    return {int(id_val) for id_val in CONTEXT_ID_RE.findall(context or '')}
+
+
+def hydrate_groups(groups, rows, descriptions, used=None):
+    """
+    Full category objects from the model's id groups. rows maps id to
+    CatalogRow and holds only ids that were in the context; unknown and
+    repeated ids are dropped, as are groups left without resources. A
+    group without a generated description gets the precomputed one.
+    Pass the same used set to every call for one answer hydrated group
+    by group, so an id is kept only the first time it appears.
+    """
+    answer = []
+    used = set() if used is None else used
+    for group in groups:
+        resources = []
+        for id_val in group['ids']:
+            row = rows.get(id_val)
+            if row is None or id_val in used:
+                continue
+            used.add(id_val)
+            resources.append({'title': row.title, 'url': row.url or 'NA'})
+        if not resources:
+            continue
+
+        category = group['category']
+        first_row = rows[next(id_val for id_val in group['ids'] if id_val in rows)]
+        description = (
+            group['description']
+            or descriptions.get(category)
+            or descriptions.get(first_row.category)
+            or ''
+        )
+        answer.append({'category': category, 'description': description, 'resources': resources})
+    return answer
@@ -1,18 +1,16 @@
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.documents import Document
-from langchain_community.utilities import SQLDatabase
-from langchain_groq import ChatGroq
-from langchain_core.tracers.langchain import LangChainTracer
-from langchain_core.callbacks import CallbackManager
+import time
+_import_started = time.perf_counter()
 from dotenv import load_dotenv
 load_dotenv()
-import time
 import os
-import pandas as pd
 import re
-import ast
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+from cache import TieredCache
+from catalog import get_catalog
+from knowledge_base import get_knowledge_index
+from lexical import lexical_search, is_confident, reciprocal_rank_fusion
+import metrics
 
 os.environ['LANGSMITH_TRACING']= os.getenv('LANGSMITH_TRACING')
 os.environ['LANGSMITH_ENDPOINT']= os.getenv('LANGSMITH_ENDPOINT')
@@ -22,38 +20,136 @@ PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 os.environ['GROQ_API_KEY'] = os.getenv('GROQ_API_KEY')
 
+# 'pinecone' queries the hosted index, 'local' searches an in-process snapshot of it
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'pinecone')
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', 'titles_index.npz')
+
+# Retrieval cache: query -> embedding, and (query, k, cutoff) -> title ids.
+# Leave RETRIEVAL_CACHE_PATH empty to keep the cache in memory only.
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '2048'))
+RETRIEVAL_CACHE_TTL = int(os.getenv('RETRIEVAL_CACHE_TTL', '86400'))
+RETRIEVAL_CACHE_PATH = os.getenv('RETRIEVAL_CACHE_PATH', 'retrieval_cache.db')
 
-tracer = LangChainTracer()
-callback_manager = CallbackManager([tracer])
+# Fuse FTS5 (BM25) title/description matches with the vector results
+LEXICAL_SEARCH = os.getenv('LEXICAL_SEARCH', 'true').lower() == 'true'
 
-pc = Pinecone(api_key= PINECONE_API_KEY)
 index_name = 'chatbot-titles-index'
 
-if index_name not in pc.list_indexes().names():
-    pc.create_index(
-        name = index_name,
-        dimension = 1536,
-        metric = 'cosine',
-        spec= ServerlessSpec(
-            cloud = 'aws',
-            region= 'us-east-1'
+# ============================================
+# LAZY CLIENTS
+# ============================================
+# Nothing below connects to a provider at import time. Each client is
+# created on first use (or by warm_up) exactly once, even when several
+# threads ask for it at the same moment, and its set-up time is recorded
+# in startup_timings.
+
+startup_timings = {}
+_clients = {}
+_client_locks = {}
+_client_locks_lock = threading.Lock()
+
+
+def lazy_client(name, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _client_locks_lock:
+        lock = _client_locks.setdefault(name, threading.Lock())
+    with lock:
+        client = _clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = factory()
+            startup_timings[name] = round(time.perf_counter() - started, 3)
+            _clients[name] = client
+    return client
+
+
+def _create_pinecone_index():
+    from pinecone import Pinecone, ServerlessSpec
+
+    pc = Pinecone(api_key= PINECONE_API_KEY)
+    if index_name not in pc.list_indexes().names():
+        pc.create_index(
+            name = index_name,
+            dimension = 1536,
+            metric = 'cosine',
+            spec= ServerlessSpec(
+                cloud = 'aws',
+                region= 'us-east-1'
+            )
         )
+        while not pc.describe_index(index_name).status['ready']:
+            time.sleep(1)
+
+    print('Index is Ready')
+    return pc.Index(index_name)
+
+
+def _create_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model='text-embedding-3-small')
+
+
+def _create_vector_store():
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(index = get_pinecone_index(), embedding=get_embeddings())
+
+
+def _create_search_backend():
+    if VECTOR_BACKEND == 'local':
+        return load_local_index()
+    return get_vector_store()
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts every chat model call as llm.calls in /metrics"""
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        metrics.increment('llm.calls')
+
+
+def _create_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        temperature = 0.1,
+        model_name = 'llama-3.1-8b-instant',
+        callbacks = [LLMCallCounter()]
     )
-    while not pc.describe_index(index_name).status['ready']:
-        time.sleep(1)
 
-print('Index is Ready')
 
-# connecting to SQL database
-index  = pc.Index(index_name)
-vector_store = PineconeVectorStore(index = index, embedding=OpenAIEmbeddings(model='text-embedding-3-small'))
-db = SQLDatabase.from_uri(f'sqlite:///all_categories_data-sqlite.db')
+def get_pinecone_index():
+    return lazy_client('pinecone_index', _create_pinecone_index)
+
+
+def get_embeddings():
+    return lazy_client('embeddings', _create_embeddings)
+
+
+def get_vector_store():
+    return lazy_client('vector_store', _create_vector_store)
 
-# initalising an LLM
-llm = ChatGroq(
-    temperature = 0.1,
-    model_name = 'llama-3.1-8b-instant'
-)
+
+def get_search_backend():
+    """Vector store that fetch_similar_titles searches, per VECTOR_BACKEND"""
+    return lazy_client('search_backend', _create_search_backend)
+
+
+def get_llm():
+    return lazy_client('llm', _create_llm)
+
+
+def warm_up():
+    """Create every client up front so the first request doesn't pay for it"""
+    get_catalog()
+    get_llm()
+    get_embeddings()
+    get_search_backend()
+    get_knowledge_index()
+
+
+metrics.register_collector('startup_seconds', lambda: dict(startup_timings))
 
 # ============================================
 # SECURITY VALIDATION FUNCTIONS
@@ -104,93 +200,185 @@ def validate_ids(ids):
 # ============================================
 
 def add_data():
-    df = pd.read_excel('all_categories_data.xlsx')
-    all_titles = df['title']
-    document_list = []
-    ids_list = []
-    for idx, title in enumerate(all_titles):
-        print(f'Adding record count: {idx}')
-        document = Document(page_content = title)
-        document_list.append(document)
-        ids_list.append(str(idx + 1))
-    vector_store.add_documents(documents=document_list, ids=ids_list)
-    print('Data Added Successfully')
+    """Index new or changed catalog titles; see ingest.py for the options"""
+    from ingest import run_ingestion
+    return run_ingestion()
 
 # add_data()
 
 
-def fetch_similar_titles(query, vector_store=vector_store, threshold=0.65):
-    """Fetch similar book titles from vector store"""
+def build_local_index(path=LOCAL_INDEX_PATH):
+    """Snapshot the Pinecone vectors into a local index file"""
+    from local_index import LocalVectorIndex
+    local_index = LocalVectorIndex.from_pinecone(get_pinecone_index(), embedding=get_embeddings())
+    local_index.save(path)
+    print(f'Local index saved: {len(local_index)} vectors -> {path}')
+    return local_index
+
+
+def load_local_index(path=LOCAL_INDEX_PATH):
+    """Load the local index snapshot, building it from Pinecone if missing"""
+    from local_index import LocalVectorIndex
+    if not os.path.exists(path):
+        return build_local_index(path)
+    local_index = LocalVectorIndex.load(path, embedding=get_embeddings())
+    print(f'Local index loaded: {len(local_index)} vectors')
+    return local_index
+
+
+def refresh_local_index():
+    """Re-snapshot the local index and swap it in, e.g. after ingestion"""
+    if VECTOR_BACKEND == 'local':
+        _clients['search_backend'] = build_local_index()
+
+# ============================================
+# RETRIEVAL CACHE
+# ============================================
+
+# Vectors of the query as typed; the older 'query_embeddings' table held vectors of the lowercased key
+embedding_cache = TieredCache(
+    'query_embeddings_text',
+    maxsize=RETRIEVAL_CACHE_SIZE,
+    ttl=RETRIEVAL_CACHE_TTL,
+    disk_path=RETRIEVAL_CACHE_PATH or None
+)
+title_ids_cache = TieredCache(
+    'title_ids',
+    maxsize=RETRIEVAL_CACHE_SIZE,
+    ttl=RETRIEVAL_CACHE_TTL,
+    disk_path=RETRIEVAL_CACHE_PATH or None
+)
+
+
+def normalize_query(query):
+    """Case and whitespace insensitive form of a query, used as cache key"""
+    return ' '.join(query.lower().split())
+
+
+def embed_query(query):
+    """
+    Embed the query as typed, reusing the cached vector for repeated
+    questions; the normalised form is only the cache key.
+    """
+    key = normalize_query(query)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        vector = get_embeddings().embed_query(query)
+        embedding_cache.set(key, vector)
+    return vector
+
+
+async def aembed_query(query):
+    """embed_query through the embeddings client's async API"""
+    key = normalize_query(query)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        vector = await get_embeddings().aembed_query(query)
+        embedding_cache.set(key, vector)
+    return vector
+
+
+def retrieval_cache_stats():
+    return {
+        'query_embeddings': embedding_cache.stats(),
+        'title_ids': title_ids_cache.stats()
+    }
+
+metrics.register_collector('retrieval_cache', retrieval_cache_stats)
+
+
+def fetch_similar_titles(query, vector_store=None, threshold=0.65, k=20, min_score=0.40):
+    """Fetch similar book titles, fusing lexical (FTS5) and vector search"""
+    started = time.perf_counter()
     try:
         query = validate_query(query)
     except ValueError as e:
         print(f"Invalid query: {e}")
         return []
+
+    # Only searches against the configured backend are cached
+    cache_key = None
+    if vector_store is None:
+        vector_store = get_search_backend()
+        cache_key = f'{VECTOR_BACKEND}|{normalize_query(query)}|{k}|{min_score}'
+        title_ids = title_ids_cache.get(cache_key)
+        if title_ids is not None:
+            print('title Ids (cached)', title_ids)
+            _record_retrieval_path('cached', started)
+            return title_ids
+
+    lexical_hits = []
+    if LEXICAL_SEARCH:
+        with metrics.timed('retrieval.lexical'):
+            lexical_hits = lexical_search(query, k=k)
+    lexical_ids = [id_val for id_val, _, _ in lexical_hits]
+
+    if is_confident(query, lexical_hits):
+        # Near-exact title match: no embedding or vector call needed
+        title_ids = lexical_ids
+        path = 'lexical_fast'
+    else:
+        with metrics.timed('retrieval.vector'):
+            result = vector_store.similarity_search_by_vector_with_score(embed_query(query), k=k)
+
+        vector_ids = []
+        for title, score in result:
+            if score > min_score:
+                try:
+                    vector_ids.append(int(title.id))
+                except (ValueError, TypeError):
+                    print(f"Warning: Skipping invalid ID: {title.id}")
+                    continue
+
+        if lexical_ids:
+            title_ids = reciprocal_rank_fusion([vector_ids, lexical_ids])[:k]
+            path = 'hybrid'
+        else:
+            title_ids = vector_ids
+            path = 'vector'
+
+    if cache_key is not None:
+        title_ids_cache.set(cache_key, title_ids)
     
-    result = vector_store.similarity_search_with_score(query=query, k=20)
-    
-    title_ids = []
-    for title, score in result:
-        if score > 0.40:
-            try:
-                title_ids.append(int(title.id))
-            except (ValueError, TypeError):
-                print(f"Warning: Skipping invalid ID: {title.id}")
-                continue
-    
-    print('title Ids', title_ids)
+    print(f'title Ids ({path})', title_ids)
+    _record_retrieval_path(path, started)
     return title_ids
 
 
+def _record_retrieval_path(path, started):
+    metrics.increment(f'retrieval.path.{path}')
+    metrics.record_latency(f'retrieval.path.{path}', time.perf_counter() - started)
+
+
 def generate_sql_query(ids):
     """
     Query database directly - NO LLM NEEDED
-    Returns DataFrame grouped by category
+    Returns {category: [CatalogRow, ...]}
     """
     try:
         ids = validate_ids(ids)
     except ValueError as e:
         print(f"Invalid IDs: {e}")
-        return pd.DataFrame()
+        return {}
     
     if not ids:
         print("No valid IDs provided")
-        return pd.DataFrame()
-    
-    # DIRECT SQL QUERY - No LLM, no parsing errors
-    ids_str = ','.join(str(id) for id in ids)
-    sql_query = f'SELECT "index", title, category, description, url FROM Categories WHERE "index" IN ({ids_str}) ORDER BY category, title'
-    
-    print('SQL query:', sql_query)
+        return {}
     
     try:
-        # Execute query directly
-        query_result = db.run(sql_query)
-        
-        # Parse results
-        output = ast.literal_eval(query_result)
+        grouped = get_catalog().fetch_grouped(ids)
         
-        # Create DataFrame with clear column names
-        df = pd.DataFrame(output, columns=['id', 'title', 'category', 'description', 'url'])
+        print(f"\nFound {sum(len(rows) for rows in grouped.values())} books in {len(grouped)} categories")
+        for category, rows in grouped.items():
+            print(f"  📚 {category} ({len(rows)} books)")
         
-        print(f"\nFound {len(df)} books in {df['category'].nunique()} categories")
-        
-        # Display grouped by category
-        print("\n" + "="*60)
-        for category in df['category'].unique():
-            category_books = df[df['category'] == category]
-            print(f"\n📚 {category} ({len(category_books)} books)")
-            print("-" * 60)
-            for idx, row in category_books.iterrows():
-                print(f"  • {row['title']}")
-                if pd.notna(row['url']):
-                    print(f"    🔗 {row['url']}")
-        print("="*60)
-        
-        return df
+        return grouped
         
     except Exception as e:
         print(f"Error executing query: {e}")
         import traceback
         traceback.print_exc()
-        return pd.DataFrame()
+        return {}
+
+
+startup_timings['import.database'] = round(time.perf_counter() - _import_started, 3)
@@ -0,0 +1,170 @@
+"""
+Precomputed answers for greetings and common General questions.
+
+The greeting prompt never sees the user's words, and questions about the
+portal itself are answered from the static knowledge_context, so these
+answers hardly change between requests. They are generated once per
+(intent, canonical question, language), saved to FAQ_ANSWERS_PATH and
+served without an LLM call. The file records a content hash of the
+prompts and knowledge text it was generated from; when the hash changes
+the answers are regenerated.
+
+    python faq_answers.py [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import metrics
+from text_vectors import featurize, cosine
+
+FAQ_ANSWERS_ENABLED = os.getenv('FAQ_ANSWERS_ENABLED', 'true').lower() == 'true'
+FAQ_ANSWERS_PATH = os.getenv('FAQ_ANSWERS_PATH', 'faq_answers.json')
+# Similarity a General question needs with a canonical question to be served
+FAQ_MATCH_THRESHOLD = float(os.getenv('FAQ_MATCH_THRESHOLD', '0.8'))
+FAQ_LANGUAGES = ('en', 'hi')
+
+# Any greeting gets the single greeting answer: the prompt ignores the question
+CANONICAL_QUESTIONS = {
+    'Greeting': ['hello'],
+    'General': [
+        'what can you do',
+        'who are you',
+        'what is your name',
+        'who developed this portal',
+        'who created the indian culture portal',
+        'what is nvli',
+        'what is the indian culture portal',
+        'which categories are available',
+        'how many languages is the portal available in',
+        'who funds the indian culture portal'
+    ]
+}
+
+
+def content_hash(*parts):
+    """Hash of the prompt and knowledge text the answers depend on"""
+    payload = json.dumps([parts, CANONICAL_QUESTIONS, FAQ_LANGUAGES], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def answer_language(language):
+    # Every language other than Hindi is answered in English
+    return 'hi' if language == 'hi' else 'en'
+
+
+class FaqAnswers:
+    def __init__(self, path=FAQ_ANSWERS_PATH, threshold=FAQ_MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.fingerprint = None
+        self.answers = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = {
+            intent: [(question, featurize(question)) for question in questions]
+            for intent, questions in CANONICAL_QUESTIONS.items()
+        }
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.fingerprint = data.get('hash')
+        self.answers = {
+            (entry['intent'], entry['question'], entry['language']): entry['answer']
+            for entry in data.get('answers', [])
+        }
+
+    def save(self):
+        data = {
+            'hash': self.fingerprint,
+            'answers': [
+                {'intent': intent, 'question': question, 'language': language, 'answer': answer}
+                for (intent, question, language), answer in self.answers.items()
+            ]
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def ensure(self, fingerprint, generate, force=False):
+        """
+        Load the stored answers and generate any that are missing, or all
+        of them when the fingerprint changed. generate(intent, question,
+        language) returns the answer text. Returns the number generated.
+        """
+        with self._lock:
+            self.load()
+            if force or self.fingerprint != fingerprint:
+                self.answers = {}
+            self.fingerprint = fingerprint
+
+            generated = 0
+            for intent, questions in CANONICAL_QUESTIONS.items():
+                for question in questions:
+                    for language in FAQ_LANGUAGES:
+                        key = (intent, question, language)
+                        if key in self.answers:
+                            continue
+                        try:
+                            self.answers[key] = generate(intent, question, language)
+                            generated += 1
+                        except Exception as e:
+                            print(f"FAQ answer generation failed for {key}: {e}")
+            if generated or force:
+                self.save()
+            return generated
+
+    def match(self, intent, query, language):
+        """Stored answer for the query, or None when no canonical question is close enough"""
+        candidates = self._vectors.get(intent)
+        if not candidates or not self.answers:
+            return None
+
+        if intent == 'Greeting':
+            question = candidates[0][0]
+        else:
+            vector = featurize(query)
+            score, question = max((cosine(vector, v), q) for q, v in candidates)
+            if score < self.threshold:
+                question = None
+
+        answer = self.answers.get((intent, question, answer_language(language))) if question else None
+        if answer is None:
+            self.misses += 1
+            metrics.increment('faq.miss')
+        else:
+            self.hits += 1
+            metrics.increment(f'faq.hit.{intent}')
+        return answer
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': FAQ_ANSWERS_ENABLED,
+            'answers': len(self.answers),
+            'hash': self.fingerprint,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the precomputed FAQ answers')
+    parser.add_argument('--force', action='store_true', help='regenerate even when the content hash is unchanged')
+    args = parser.parse_args()
+
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    import app
+
+    count = app.faq_answers.ensure(app.faq_fingerprint(), app.generate_faq_answer, force=args.force)
+    print(f"Generated {count} answers into {app.faq_answers.path}")
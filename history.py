@@ -0,0 +1,204 @@
+"""
+Bounded conversation history for the General prompt.
+
+The newest user turns are kept verbatim, at most HISTORY_MAX_TURNS of
+them and within HISTORY_TOKEN_BUDGET tiktoken tokens. Older turns are
+folded into a rolling summary kept in the graph state (history_summary,
+with history_summarized counting the messages already folded), so each
+turn is summarised exactly once and the summary is extended rather than
+recomputed.
+
+Folding waits until HISTORY_SUMMARY_BATCH turns (or a token budget's
+worth) have left the window; until then they stay in the prompt
+verbatim. The fold runs next to the answer call and uses the summary as
+it was before this turn, so it adds no latency to the request that
+triggers it.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from langchain_core.prompts import PromptTemplate
+
+import metrics
+from context_builder import count_tokens
+
+HISTORY_MAX_TURNS = int(os.getenv('HISTORY_MAX_TURNS', '6'))
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '400'))
+HISTORY_SUMMARY_ENABLED = os.getenv('HISTORY_SUMMARY_ENABLED', 'true').lower() == 'true'
+# Turns that have to leave the window before the summary is extended
+HISTORY_SUMMARY_BATCH = int(os.getenv('HISTORY_SUMMARY_BATCH', '4'))
+HISTORY_SUMMARY_WORDS = int(os.getenv('HISTORY_SUMMARY_WORDS', '80'))
+
+# Per-request samples kept for the history collector
+HISTORY_STATS_WINDOW = 1024
+
+summary_prompt = PromptTemplate.from_template(
+    """You maintain a running summary of what a user has asked an assistant for the Indian Culture Portal.
+
+    Extend the current summary with the new messages. Keep the topics, names and preferences that
+    later questions may refer back to. Use at most {max_words} words and plain sentences.
+
+    Current summary:
+    {summary}
+
+    New messages:
+    {messages}
+
+    Updated summary:
+    """
+)
+
+
+def role_of(message):
+    return (
+        "User" if message.type == "human" else
+        "Assistant" if message.type == "ai" else
+        "System"
+    )
+
+
+def format_line(message):
+    return f"{role_of(message)}: {message.content}"
+
+
+class HistoryWindow(NamedTuple):
+    summary: str
+    # Messages still to fold into the summary, and the history_summarized value once they are
+    fold: list
+    folded_upto: int
+    # Messages left out of the summary so far, oldest first
+    verbatim: list
+    tokens: int
+
+    def text(self):
+        lines = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        lines.extend(format_line(message) for message in self.verbatim)
+        return '\n'.join(lines)
+
+
+class HistoryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = deque(maxlen=HISTORY_STATS_WINDOW)
+        self.requests = 0
+        self.summary_calls = 0
+        self.summary_failures = 0
+        self.folded_messages = 0
+
+    def record(self, tokens):
+        with self._lock:
+            self.requests += 1
+            self.tokens.append(tokens)
+        metrics.increment('history.requests')
+        metrics.increment('history.tokens', tokens)
+
+    def record_fold(self, messages, ok):
+        with self._lock:
+            if ok:
+                self.summary_calls += 1
+                self.folded_messages += messages
+            else:
+                self.summary_failures += 1
+
+    def stats(self):
+        with self._lock:
+            ordered = sorted(self.tokens)
+            return {
+                'max_turns': HISTORY_MAX_TURNS,
+                'token_budget': HISTORY_TOKEN_BUDGET,
+                'summary_enabled': HISTORY_SUMMARY_ENABLED,
+                'requests': self.requests,
+                'mean_tokens': round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+                'p95_tokens': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0,
+                'max_tokens': ordered[-1] if ordered else 0,
+                'summary_calls': self.summary_calls,
+                'summary_failures': self.summary_failures,
+                'folded_messages': self.folded_messages
+            }
+
+
+history_stats = HistoryStats()
+metrics.register_collector('history', history_stats.stats)
+
+# Runs summary folds alongside the sync answer call
+fold_pool = ThreadPoolExecutor(max_workers=int(os.getenv('HISTORY_FOLD_WORKERS', '4')), thread_name_prefix='history')
+
+
+def history_window(messages, summary='', summarized=0, max_turns=HISTORY_MAX_TURNS,
+                   max_tokens=HISTORY_TOKEN_BUDGET, batch=HISTORY_SUMMARY_BATCH):
+    """
+    Split the messages before the latest question into the part kept
+    verbatim and the part due to be folded into the summary.
+    """
+    earlier = messages[:-1]
+    summarized = min(summarized, len(earlier))
+
+    # Newest first, until the turn or token limit
+    keep_from = len(earlier)
+    used = 0
+    while keep_from > summarized and len(earlier) - keep_from < max_turns:
+        cost = count_tokens(format_line(earlier[keep_from - 1])) + 1
+        if used + cost > max_tokens:
+            break
+        used += cost
+        keep_from -= 1
+
+    overflow = earlier[summarized:keep_from]
+    if not HISTORY_SUMMARY_ENABLED:
+        # Without a summary the overflow is simply dropped
+        verbatim = earlier[keep_from:]
+        return HistoryWindow('', [], summarized, verbatim, used)
+
+    overflow_tokens = sum(count_tokens(format_line(message)) + 1 for message in overflow)
+    fold = overflow if len(overflow) >= batch or overflow_tokens > max_tokens else []
+    window = HistoryWindow(summary or '', fold, keep_from if fold else summarized, earlier[summarized:], 0)
+    text = window.text()
+    return window._replace(tokens=count_tokens(text) if text else 0)
+
+
+def summary_inputs(summary, messages):
+    return {
+        'summary': summary or 'None yet.',
+        'messages': '\n'.join(format_line(message) for message in messages),
+        'max_words': HISTORY_SUMMARY_WORDS
+    }
+
+
+def _folded(window, content):
+    history_stats.record_fold(len(window.fold), True)
+    metrics.increment('history.folded_messages', len(window.fold))
+    return {'history_summary': content.strip(), 'history_summarized': window.folded_upto}
+
+
+def _fold_failed(window, e):
+    # The turns stay unsummarised and are offered again on the next request
+    print(f"History summary failed: {e}")
+    history_stats.record_fold(len(window.fold), False)
+    metrics.increment('history.summary_failures')
+    return {}
+
+
+def fold_history(window, llm):
+    """State update folding window.fold into the summary; {} when there is nothing to fold"""
+    if not window.fold:
+        return {}
+    try:
+        chain = summary_prompt | llm
+        response = chain.invoke(summary_inputs(window.summary, window.fold), config={'tags': ['history']})
+    except Exception as e:
+        return _fold_failed(window, e)
+    return _folded(window, response.content)
+
+
+async def afold_history(window, llm):
+    if not window.fold:
+        return {}
+    try:
+        chain = summary_prompt | llm
+        response = await chain.ainvoke(summary_inputs(window.summary, window.fold), config={'tags': ['history']})
+    except Exception as e:
+        return _fold_failed(window, e)
+    return _folded(window, response.content)
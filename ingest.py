@@ -0,0 +1,195 @@
+"""
+Incremental ingestion of the catalog titles into the vector store.
+
+Rows are streamed from the Excel catalog and compared, by content hash,
+against the titles indexed by previous runs. Only new or changed titles
+are embedded and upserted, in batches and with bounded parallelism, and
+titles that disappeared from the catalog are deleted. Progress is saved
+after every batch, so an interrupted run picks up where it stopped when
+started again.
+
+    python ingest.py --batch-size 100 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.documents import Document
+from openpyxl import load_workbook
+
+CATALOG_PATH = os.getenv('CATALOG_XLSX_PATH', 'all_categories_data.xlsx')
+INGEST_STATE_PATH = os.getenv('INGEST_STATE_PATH', 'ingest_state.json')
+
+
+def iter_titles(path=CATALOG_PATH):
+    """Stream (id, title) pairs from the catalog without loading it whole"""
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip().lower() if cell is not None else '' for cell in next(rows)]
+        title_col = header.index('title')
+
+        # Ids are 1-based row positions, matching the "index" column in SQLite
+        for idx, row in enumerate(rows):
+            title = row[title_col] if title_col < len(row) else None
+            if title is None or not str(title).strip():
+                continue
+            yield str(idx + 1), str(title)
+    finally:
+        workbook.close()
+
+
+def title_hash(title):
+    return hashlib.sha256(title.encode('utf-8')).hexdigest()
+
+
+class IngestState:
+    """Content hash of every title currently in the index, saved after each batch"""
+
+    def __init__(self, path=INGEST_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.hashes = json.load(f)
+
+    def mark_indexed(self, items):
+        with self._lock:
+            for id_val, digest in items:
+                self.hashes[id_val] = digest
+            self._save()
+
+    def ids_not_in(self, seen):
+        with self._lock:
+            return [id_val for id_val in self.hashes if id_val not in seen]
+
+    def mark_deleted(self, ids):
+        with self._lock:
+            for id_val in ids:
+                self.hashes.pop(id_val, None)
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp_path, self.path)
+
+
+def _upsert_batch(vector_store, state, batch):
+    documents = [Document(page_content=title) for _, title, _ in batch]
+    ids = [id_val for id_val, _, _ in batch]
+    vector_store.add_documents(documents=documents, ids=ids)
+    state.mark_indexed((id_val, digest) for id_val, _, digest in batch)
+    return len(batch)
+
+
+def _delete_batch(vector_store, state, ids):
+    vector_store.delete(ids=ids)
+    state.mark_deleted(ids)
+    return len(ids)
+
+
+def run_ingestion(path=CATALOG_PATH, batch_size=100, workers=4, full=False,
+                  assume_indexed=False, vector_store=None, state_path=INGEST_STATE_PATH):
+    """
+    Bring the vector store in line with the catalog.
+
+    full re-embeds every title; assume_indexed records the current catalog
+    as already indexed without embedding anything, for adopting an index
+    built before incremental ingestion existed.
+    """
+    if vector_store is None:
+        from database import get_vector_store
+        vector_store = get_vector_store()
+
+    started = time.time()
+    state = IngestState(state_path)
+    seen = set()
+    summary = {'upserted': 0, 'deleted': 0, 'unchanged': 0, 'failed_batches': 0}
+
+    def collect(done):
+        for future in done:
+            try:
+                summary[future.kind] += future.result()
+            except Exception as e:
+                summary['failed_batches'] += 1
+                print(f"Batch failed, will be retried on the next run: {e}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+
+        def submit(kind, fn, *args):
+            # Bounded parallelism: never more than `workers` batches queued at once
+            nonlocal in_flight
+            if len(in_flight) >= workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(fn, vector_store, state, *args)
+            future.kind = kind
+            in_flight.add(future)
+
+        batch = []
+        for id_val, title in iter_titles(path):
+            seen.add(id_val)
+            digest = title_hash(title)
+            if not full and state.hashes.get(id_val) == digest:
+                summary['unchanged'] += 1
+                continue
+            batch.append((id_val, title, digest))
+            if len(batch) >= batch_size:
+                if assume_indexed:
+                    state.mark_indexed((i, d) for i, _, d in batch)
+                else:
+                    submit('upserted', _upsert_batch, batch)
+                batch = []
+        if batch:
+            if assume_indexed:
+                state.mark_indexed((i, d) for i, _, d in batch)
+            else:
+                submit('upserted', _upsert_batch, batch)
+
+        removed = state.ids_not_in(seen)
+        for start in range(0, len(removed), batch_size):
+            submit('deleted', _delete_batch, removed[start:start + batch_size])
+
+        collect(wait(in_flight).done)
+
+    summary['seconds'] = round(time.time() - started, 2)
+    print('Ingestion finished:', summary)
+
+    if summary['upserted'] or summary['deleted']:
+        import database
+        database.title_ids_cache.clear()
+        database.refresh_local_index()
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index catalog titles into the vector store')
+    parser.add_argument('--file', default=CATALOG_PATH)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--state', default=INGEST_STATE_PATH)
+    parser.add_argument('--full', action='store_true', help='re-embed every title')
+    parser.add_argument('--assume-indexed', action='store_true',
+                        help='record the catalog as indexed without embedding')
+    args = parser.parse_args()
+
+    result = run_ingestion(
+        path=args.file,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        full=args.full,
+        assume_indexed=args.assume_indexed,
+        state_path=args.state
+    )
+    raise SystemExit(1 if result['failed_batches'] else 0)
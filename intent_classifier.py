@@ -0,0 +1,261 @@
+"""
+Local first-stage intent classifier for /chat.
+
+Queries are classified by keyword rules first, then by a nearest-centroid
+model over labelled example queries with question words and other
+stopwords removed, so "what is" or "who was" cannot decide the match. A
+centroid result skips the LLM only when it is close enough to its
+centroid, clearly ahead of the runner-up, and one of the intents in
+INTENT_CENTROID_INTENTS (Specialised and Greeting by default; centroid
+General answers go to the LLM until the agreement rate shows they can be
+trusted). Recent decisions are cached, and the fast-path rate plus the
+agreement rate with the LLM (on fallbacks and on a sample of fast-path
+decisions) go to /metrics.
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+
+import metrics
+from cache import LRUCache
+from text_vectors import featurize, cosine, centroid, words
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.35'))
+# Cosine to the best centroid below which the margin alone is not trusted
+INTENT_MIN_SIMILARITY = float(os.getenv('INTENT_MIN_SIMILARITY', '0.12'))
+# Centroid intents allowed to skip the LLM; rule hits always do
+INTENT_CENTROID_INTENTS = set(
+    filter(None, (name.strip() for name in os.getenv('INTENT_CENTROID_INTENTS', 'Specialised,Greeting').split(',')))
+)
+INTENT_CACHE_SIZE = int(os.getenv('INTENT_CACHE_SIZE', '2048'))
+# Share of fast-path decisions re-checked by the LLM in the background
+INTENT_SHADOW_RATE = float(os.getenv('INTENT_SHADOW_RATE', '0.02'))
+
+INTENTS = ('Greeting', 'General', 'Specialised', 'Unknown')
+
+GREETING_RE = re.compile(
+    r'^\s*(hi+|hello+|hey+|hii+|namaste|namaskar|greetings|good\s+(morning|afternoon|evening|day)|'
+    r'हेलो|नमस्ते|नमस्कार)(\s+(there|bharti|bot|all))?\s*[!.,]*\s*$',
+    re.IGNORECASE
+)
+GENERAL_RE = re.compile(
+    r'\b(what\s+can\s+you\s+do|who\s+are\s+you|what\s+are\s+you|your\s+(name|capabilities|features)|'
+    r'who\s+(developed|created|built|made)\s+(this|the)\s+(portal|website|site)|what\s+is\s+nvli|'
+    r'how\s+can\s+you\s+help|(url|link|hyperlink)\s+(of|to|for))\b',
+    re.IGNORECASE
+)
+
+# Question words and fillers shared by every intent
+STOPWORDS = {
+    'a', 'about', 'all', 'am', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'can', 'could', 'did', 'do',
+    'does', 'for', 'from', 'give', 'has', 'have', 'how', 'i', 'in', 'into', 'is', 'it', 'its', 'know',
+    'me', 'more', 'my', 'of', 'on', 'or', 'please', 'some', 'tell', 'that', 'the', 'their', 'there',
+    'this', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who', 'whom', 'why', 'will',
+    'with', 'would', 'you', 'your'
+}
+
+EXAMPLES = {
+    'Greeting': [
+        'hi', 'hello', 'hey there', 'good morning', 'namaste', 'hello bharti',
+        'hi, how are you', 'greetings', 'good evening', 'hey bharti how are you doing'
+    ],
+    'General': [
+        'what can you do', 'who are you', 'who developed this portal', 'what is nvli',
+        'what is the indian culture portal', 'url of the folktales category',
+        'what is folktales about', 'what is timeless trends category about',
+        'description of ebooks', 'link to rare books section', 'which categories are available',
+        'what are your capabilities', 'how many languages is the portal available in',
+        'who funds the indian culture portal', 'what is the photo essays section',
+        'give me the link of festivals of india category', 'what is in the archives category'
+    ],
+    'Specialised': [
+        'tell me about mughal architecture', 'explain vedic literature', 'books on kathak',
+        'charaka samhita', 'history of the maratha empire', 'buddhist cave paintings of ajanta',
+        'manuscripts on ayurveda', 'rare books about the freedom struggle', 'kathakali dance costumes',
+        'temples of south india', 'folk songs of rajasthan', 'life of rani lakshmibai',
+        'battle of plassey', 'traditional textiles of gujarat', 'gazetteers of bengal presidency',
+        'sculptures of khajuraho', 'recipes from kerala cuisine', 'musical instrument sitar history',
+        'find books on indian philosophy', 'documents about the salt satyagraha',
+        'what is kathak', 'what is bharatanatyam', 'what is a sitar', 'what is a tabla', 'what is odissi',
+        'what is the rigveda', 'what is ayurveda', 'what is madhubani painting', 'what is yoga',
+        'who was shivaji', 'who was ashoka', 'who was akbar', 'who was tipu sultan',
+        'who is rani lakshmibai', 'who was mahatma gandhi', 'who was subhas chandra bose',
+        'who was bhagat singh', 'who was rabindranath tagore', 'who was swami vivekananda',
+        'who built the taj mahal', 'when was the qutub minar built', 'where is hampi',
+        'why is diwali celebrated', 'how is holi celebrated', 'significance of durga puja',
+        'pongal harvest festival', 'onam festival of kerala', 'chhau dance of purulia',
+        'kuchipudi dance form', 'hindustani classical music ragas', 'carnatic music composers',
+        'veena and sarod instruments', 'red fort of delhi', 'forts of rajasthan', 'ellora caves',
+        'konark sun temple', 'stepwells of gujarat', 'jewellery of the nizams', 'banarasi silk sarees',
+        'pashmina shawls of kashmir', 'pattachitra scroll paintings', 'warli tribal art',
+        'folktales of assam', 'panchatantra stories', 'mahabharata and ramayana', 'upanishads',
+        'sanskrit manuscripts', 'mughal miniature paintings', 'chola bronze sculptures',
+        'indus valley civilisation', 'vijayanagara empire', 'gupta dynasty', 'revolt of 1857',
+        'quit india movement', 'jallianwala bagh massacre', 'dandi march', 'biryani of hyderabad',
+        'spices of kerala', 'unesco world heritage sites in india', 'retrieved artefacts of india',
+        'freedom fighters of bengal', 'historic cities of india', 'healing traditions of siddha',
+        'unani medicine', 'archives of the british raj', 'photos of the partition'
+    ],
+    'Unknown': [
+        'asdlkj', 'qwerty', 'zzzz', '???', 'lkjhg fdsa', 'xyz abc 123', 'hmm', 'ok', '...'
+    ]
+}
+
+_centroids = None
+
+
+def features(text):
+    """Vector of the text's content words"""
+    return featurize(' '.join(word for word in words(text) if word not in STOPWORDS))
+
+_cache = LRUCache(maxsize=INTENT_CACHE_SIZE)
+_stats_lock = threading.Lock()
+_stats = {'rule': 0, 'centroid': 0, 'cached': 0, 'llm': 0, 'checked': 0, 'agreed': 0}
+
+
+def _get_centroids():
+    global _centroids
+    if _centroids is None:
+        _centroids = {
+            label: centroid(features(text) for text in texts)
+            for label, texts in EXAMPLES.items()
+        }
+    return _centroids
+
+
+def predict(query):
+    """Return (intent, confidence, source) without calling the LLM"""
+    text = (query or '').strip()
+    if not re.search(r'[^\W\d_]', text):
+        return 'Unknown', 1.0, 'rule'
+    if GREETING_RE.match(text):
+        return 'Greeting', 1.0, 'rule'
+    if GENERAL_RE.search(text):
+        return 'General', 1.0, 'rule'
+
+    vector = features(text)
+    scores = sorted(
+        ((cosine(vector, c), label) for label, c in _get_centroids().items()),
+        reverse=True
+    )
+    (best_score, best_label), (second_score, _) = scores[0], scores[1]
+    if best_score < INTENT_MIN_SIMILARITY:
+        # Not close to any example: a large margin between two weak matches means nothing
+        return best_label, 0.0, 'centroid'
+    # Relative margin over the runner-up: 0 when tied, 1 when nothing else matches
+    confidence = (best_score - second_score) / best_score
+    return best_label, confidence, 'centroid'
+
+
+def _count(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def _record_agreement(local_intent, llm_intent):
+    _count('checked')
+    if local_intent == llm_intent:
+        _count('agreed')
+
+
+def _shadow_check(query, local_intent, llm_classify):
+    try:
+        _record_agreement(local_intent, llm_classify(query))
+    except Exception as e:
+        print(f"Intent shadow check failed: {e}")
+
+
+async def _ashadow_check(query, local_intent, allm_classify):
+    try:
+        _record_agreement(local_intent, await allm_classify(query))
+    except Exception as e:
+        print(f"Intent shadow check failed: {e}")
+
+
+def is_decided(intent, confidence, source, threshold=INTENT_CONFIDENCE_THRESHOLD):
+    """True when classify takes this predict() result without asking the LLM"""
+    return confidence >= threshold and (source == 'rule' or intent in INTENT_CENTROID_INTENTS)
+
+
+def _local_decision(key, query, threshold):
+    """
+    Return (intent, decided, shadow). decided is False when the local
+    prediction is not confident enough and the LLM has to classify;
+    shadow asks for a background LLM re-check of a fresh local decision.
+    """
+    cached = _cache.get(key)
+    if cached is not None:
+        _count('cached')
+        return cached, True, False
+
+    intent, confidence, source = predict(query)
+    if not is_decided(intent, confidence, source, threshold):
+        return intent, False, False
+
+    _count(source)
+    metrics.increment(f'intent.{source}.{intent}')
+    return intent, True, bool(INTENT_SHADOW_RATE) and random.random() < INTENT_SHADOW_RATE
+
+
+def _llm_decision(local_intent, intent):
+    _count('llm')
+    metrics.increment(f'intent.llm.{intent}')
+    _record_agreement(local_intent, intent)
+    return intent
+
+
+def _remember(key, intent):
+    if intent in INTENTS:
+        _cache.set(key, intent)
+    return intent
+
+
+def classify(query, llm_classify, threshold=INTENT_CONFIDENCE_THRESHOLD):
+    """
+    Intent for a query, calling llm_classify(query) only when the local
+    prediction is below the confidence threshold.
+    """
+    key = ' '.join((query or '').lower().split())
+    intent, decided, shadow = _local_decision(key, query, threshold)
+    if shadow:
+        threading.Thread(
+            target=_shadow_check, args=(query, intent, llm_classify), daemon=True
+        ).start()
+    if not decided:
+        intent = _llm_decision(intent, llm_classify(query))
+    return _remember(key, intent)
+
+
+_shadow_tasks = set()
+
+
+async def aclassify(query, allm_classify, threshold=INTENT_CONFIDENCE_THRESHOLD):
+    """classify for the async graph; allm_classify is a coroutine function"""
+    key = ' '.join((query or '').lower().split())
+    intent, decided, shadow = _local_decision(key, query, threshold)
+    if shadow:
+        # Keep a reference so the check is not garbage collected mid-flight
+        task = asyncio.create_task(_ashadow_check(query, intent, allm_classify))
+        _shadow_tasks.add(task)
+        task.add_done_callback(_shadow_tasks.discard)
+    if not decided:
+        intent = _llm_decision(intent, await allm_classify(query))
+    return _remember(key, intent)
+
+
+def stats():
+    with _stats_lock:
+        counts = dict(_stats)
+    total = counts['rule'] + counts['centroid'] + counts['cached'] + counts['llm']
+    fast = total - counts['llm']
+    return {
+        **counts,
+        'fast_path_rate': round(fast / total, 4) if total else 0.0,
+        'llm_agreement_rate': round(counts['agreed'] / counts['checked'], 4) if counts['checked'] else None,
+        'cache': _cache.stats()
+    }
+
+
+metrics.register_collector('intent', stats)
@@ -0,0 +1,248 @@
+"""
+Local repair and schema validation of the specialised answer JSON.
+
+The model is asked for a bare JSON array of categories but regularly adds
+a markdown fence or a sentence of prose, leaves trailing commas, uses
+single quotes or stops mid-array. repair_category_json tries increasingly
+tolerant layers and returns the first result that passes validation:
+
+    strict      json.loads as is
+    extracted   fences and surrounding prose stripped
+    syntax      trailing commas, single quotes and Python literals fixed
+    truncated   cut back to the last complete category and closed
+
+The layer that rescued each response is counted under json_repair.* in
+/metrics. Only when every layer fails does the caller fall back to the
+LLM repair prompt. With JSON_REPAIR_CAPTURE_PATH set, outputs that were
+not valid JSON as returned are appended to that file as JSON lines, to
+grow the corpus benchmarked by benchmarks/json_repair_corpus.py.
+"""
+import json
+import os
+import re
+import threading
+
+import metrics
+
+JSON_REPAIR_CAPTURE_PATH = os.getenv('JSON_REPAIR_CAPTURE_PATH', '')
+
+LAYERS = ('strict', 'extracted', 'syntax', 'truncated')
+
+FENCE_RE = re.compile(r'```[a-zA-Z]*\s*')
+PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+_capture_lock = threading.Lock()
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def strip_fences(text):
+    return FENCE_RE.sub('', text or '').strip()
+
+
+def extract_array(text, to_end=False):
+    """
+    From the first '[' to the last ']'. With to_end, or when there is no
+    closing bracket, everything after the '[' is kept for close_truncated.
+    """
+    start = text.find('[')
+    if start == -1:
+        # A lone category object is still worth keeping
+        start = text.find('{')
+        if start == -1:
+            raise JSONRepairError("No JSON array in response")
+    end = -1 if to_end else text.rfind(']' if text[start] == '[' else '}')
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def fix_syntax(text):
+    """
+    Rewrite single-quoted strings as JSON strings, drop trailing commas
+    and map True/False/None to JSON, leaving string contents untouched.
+    """
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        char = text[i]
+        if char in '"\'':
+            quote = char
+            i += 1
+            chars = []
+            while i < n and text[i] != quote:
+                if text[i] == '\\' and i + 1 < n:
+                    chars.append(text[i:i + 2])
+                    i += 2
+                    continue
+                chars.append('\\"' if text[i] == '"' and quote == "'" else text[i])
+                i += 1
+            body = ''.join(chars)
+            if quote == "'":
+                body = body.replace("\\'", "'")
+            out.append('"' + body + ('"' if i < n else ''))
+            i += 1
+        elif char == ',':
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in ']}':
+                i += 1
+                continue
+            out.append(char)
+            i += 1
+        elif char.isalpha():
+            j = i
+            while j < n and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(PYTHON_LITERALS.get(word, word))
+            i = j
+        else:
+            out.append(char)
+            i += 1
+    return ''.join(out)
+
+
+def close_truncated(text):
+    """Keep the complete top-level items of a cut-off array and close it"""
+    depth = 0
+    in_string = escaped = False
+    last_complete = None
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            depth -= 1
+            if depth == 1:
+                last_complete = position
+            elif depth == 0:
+                return text[:position + 1]
+    if last_complete is None:
+        raise JSONRepairError("Truncated before the first complete category")
+    return text[:last_complete + 1] + ']'
+
+
+def validate_categories(parsed):
+    """
+    Check the category/description/resources schema and return the
+    cleaned list. Missing descriptions and urls get defaults, resources
+    without a title are dropped; anything else raises JSONRepairError.
+    """
+    if isinstance(parsed, dict):
+        lists = [value for value in parsed.values() if isinstance(value, list)]
+        if 'category' in parsed:
+            parsed = [parsed]
+        elif len(lists) == 1:
+            parsed = lists[0]
+    if not isinstance(parsed, list) or not parsed:
+        raise JSONRepairError("Expected a non-empty list of category dictionaries")
+
+    categories = []
+    for item in parsed:
+        if not isinstance(item, dict) or not isinstance(item.get('category'), str) or not item['category'].strip():
+            raise JSONRepairError(f"Invalid category entry: {item!r:.80}")
+        resources = item.get('resources') or []
+        if not isinstance(resources, list):
+            raise JSONRepairError("resources must be a list")
+        categories.append({
+            **item,
+            'description': item.get('description') if isinstance(item.get('description'), str) else '',
+            'resources': [
+                {**resource, 'url': resource.get('url') or 'NA'}
+                for resource in resources
+                if isinstance(resource, dict) and isinstance(resource.get('title'), str) and resource['title'].strip()
+            ]
+        })
+    return categories
+
+
+def validate_id_groups(parsed):
+    """
+    Check the id-only schema, [{"category", "ids", "description"?}], and
+    return it with ids as ints. Numeric strings are accepted as ids.
+    """
+    if isinstance(parsed, dict):
+        lists = [value for value in parsed.values() if isinstance(value, list)]
+        if 'category' in parsed:
+            parsed = [parsed]
+        elif len(lists) == 1:
+            parsed = lists[0]
+    if not isinstance(parsed, list) or not parsed:
+        raise JSONRepairError("Expected a non-empty list of category groups")
+
+    groups = []
+    for item in parsed:
+        if not isinstance(item, dict) or not isinstance(item.get('category'), str) or not item['category'].strip():
+            raise JSONRepairError(f"Invalid category group: {item!r:.80}")
+        ids = item.get('ids', item.get('resource_ids')) or []
+        if not isinstance(ids, list):
+            raise JSONRepairError("ids must be a list")
+        try:
+            ids = [int(str(id_val).strip('[] ')) for id_val in ids]
+        except ValueError:
+            raise JSONRepairError(f"Non-numeric id in {ids!r:.80}")
+        description = item.get('description')
+        groups.append({
+            'category': item['category'],
+            'ids': ids,
+            'description': description if isinstance(description, str) else ''
+        })
+    return groups
+
+
+def _candidates(content):
+    yield 'strict', lambda: content
+    extracted = lambda: extract_array(strip_fences(content))
+    yield 'extracted', extracted
+    yield 'syntax', lambda: fix_syntax(extracted())
+    yield 'truncated', lambda: close_truncated(fix_syntax(extract_array(strip_fences(content), to_end=True)))
+
+
+def repair(content, validate=validate_categories):
+    """Return (parsed, layer) for the first layer whose output validates"""
+    errors = []
+    for layer, candidate in _candidates(content or ''):
+        try:
+            return validate(json.loads(candidate())), layer
+        except (ValueError, TypeError) as e:
+            errors.append(f"{layer}: {e}")
+    raise JSONRepairError('; '.join(errors))
+
+
+def capture(content, layer):
+    with _capture_lock:
+        with open(JSON_REPAIR_CAPTURE_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'output': content, 'layer': layer}, ensure_ascii=False) + '\n')
+
+
+def repair_category_json(content, record=True, validate=validate_categories):
+    """
+    Parsed and validated category list from a model response. Raises
+    JSONRepairError when no layer can rescue it; record=False skips the
+    metrics and capture (used for the LLM repair prompt's own output).
+    validate_id_groups checks the id-only answer format instead.
+    """
+    try:
+        parsed, layer = repair(content, validate)
+    except JSONRepairError:
+        if record:
+            metrics.increment('json_repair.unrepaired')
+            if JSON_REPAIR_CAPTURE_PATH:
+                capture(content, None)
+        raise
+
+    if record:
+        metrics.increment(f'json_repair.{layer}')
+        if JSON_REPAIR_CAPTURE_PATH and layer != 'strict':
+            capture(content, layer)
+    return parsed
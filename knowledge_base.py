@@ -0,0 +1,410 @@
+"""
+Portal knowledge for General answers, split into addressable sections.
+
+The hand-written description of the portal covers every category with
+its description and url, far more than any single General question
+needs. Each category and portal fact is a Section; a local index of
+text_vectors features picks the sections most similar to the question
+and only those go into the prompt, packed within KNOWLEDGE_TOKEN_BUDGET
+tiktoken tokens. The portal overview and the category list are always
+included so identity and "what is available" questions keep their
+answer.
+
+knowledge_context is the full text of every section, as the prompt used
+to carry it; benchmarks/general_prompt_tokens.py compares the two.
+"""
+import math
+import os
+import threading
+from typing import NamedTuple
+
+from context_builder import count_tokens
+from text_vectors import featurize, centroid, cosine, normalize
+
+KNOWLEDGE_TOKEN_BUDGET = int(os.getenv('KNOWLEDGE_TOKEN_BUDGET', '700'))
+KNOWLEDGE_TOP_SECTIONS = int(os.getenv('KNOWLEDGE_TOP_SECTIONS', '3'))
+# Similarity a section needs with the question to be considered at all
+KNOWLEDGE_MIN_SCORE = float(os.getenv('KNOWLEDGE_MIN_SCORE', '0.08'))
+
+# Subcategories of the categories prepared with original research on the portal
+ORIGINAL_GROUPS = (
+    'Cultural Expressions', 'Legends and Legacies', 'Pan India Explorations',
+    'Built Heritage', 'Footprint of Freedom', 'Cultural Chronicles'
+)
+
+
+class Section(NamedTuple):
+    id: str
+    group: str
+    title: str
+    text: str
+
+
+SECTIONS = [
+    Section('portal', 'Portal', 'About the Indian Culture Portal', """
+        Recognizing the ongoing need to position itself for the digital future, Indian Culture
+        is an initiative by the Ministry of Culture. A platform that hosts data of cultural
+        relevance from various repositories and institutions all over India. The Indian Culture
+        Portal is a part of the National Virtual Library of India project, funded by the
+        Ministry of Culture, Government of India. The portal has been created and developed by
+        the Indian Institute of Technology (IIT), Bombay. The content is available both in 18
+        languages.
+        """),
+    Section('classical-dances-of-india', 'Cultural Expressions', 'Classical Dances of India', """
+        Classical Dances of Indian (India's classical dances are a vibrant expression of its
+        diverse cultural heritage, deeply rooted in tradition, mythology, and spiritual
+        practice. Each form tells stories through graceful movements, intricate rhythms, and
+        expressive gestures. These dance forms not only reflect regional identities but also
+        embody centuries-old philosophies and artistic disciplines. This category explores the
+        origins, evolution, and unique characteristics of India's classical dance styles,
+        offering a window into the artistic soul of the nation.) (url =
+        https://icpdelhi.nvli.in/classical-dances-of-india)
+        """),
+    Section('festivals-of-india', 'Cultural Expressions', 'Festivals of India', """
+        Festivals Of India (To experience the festivals of India is to experience the grandeur
+        and richness of the Indian cultural heritage. The festivals of India thrive in a culture
+        of diversity, and the celebration of these festivals has become a time for
+        cross-cultural exchanges. Filled with rituals, music, performances, culinary treats, and
+        more, each festival presents its own fascinating history and unique charm. A large
+        diversity of customs, traditions, and tales are also associated with festivals. Learn
+        about the cultural diversity, customs and traditions, as well as the fascinating stories
+        associated with the festivals presented in the categories below, or explore the vibrant
+        festivals of the states by clicking on the map or finding your favourite festival.) (url
+        = https://icpdelhi.nvli.in/festivals-of-india)
+        """),
+    Section('food-and-culture', 'Cultural Expressions', 'Food and Culture', """
+        Food And Culture(The Indian culinary repertoire reflects the cultural diversity of the
+        country. The term “Indian food” denotes a mélange of flavours from different parts of
+        the country and showcases centuries of cultural exchange with the far corners of the
+        world. Here, on our portal, we are making a small effort of gradually building a
+        treasure trove of information about the countless exquisite flavours of our country. It
+        is an ongoing venture and over time we aim to capture as much as possible of the
+        incredible culinary diversity of this land.) (url =
+        https://icpdelhi.nvli.in/food-and-culture)
+        """),
+    Section('musical-instruments-of-india', 'Cultural Expressions', 'Musical Instruments of India', """
+        Musical Instruments of India(The Musical Instruments section of the Indian Culture
+        portal contains information about a range of instruments from across India. The Indian
+        Culture portal has researched and is happy to present information about the countless
+        exquisite musical instruments of our country.) (url =
+        https://icpdelhi.nvli.in/musical-instruments-of-india)
+        """),
+    Section('textiles-and-fabrics-of-india', 'Cultural Expressions', 'Textiles and Fabrics of India', """
+        Textiles and fabrics of India (Textiles and Fabrics of India is an attempt to showcase
+        and celebrate the long and diverse tradition of Textiles in India. The history of this
+        craft goes back to the ancient period. This section highlights and honours the
+        craftsmanship of the Indian handloom workers, embroiderers, block printers, painters and
+        others who have immensely contributed to build a distinct textile industry for India.)
+        (url = https://icpdelhi.nvli.in/textiles-and-fabrics-of-india)
+        """),
+    Section('timeless-trends', 'Cultural Expressions', 'Timeless Trends', """
+        Timeless Trends (n both its traditional and modern manifestations, Indian art exhibits a
+        powerful sense of design and a vivid imagination. These are reflected in sculptures,
+        paintings, murals, architecture, coins, and items of personal adornment like jewellery,
+        clothing, and more. Surviving the vagaries of time, many of these artefacts are now
+        preserved in museums, archaeological sites and cultural institutions. These seemingly
+        ordinary artefacts act as a repository of knowledge that conveys information about the
+        society of their time. Timeless Trends celebrates the interconnectedness of the past and
+        the present and attempts to discover the links between the cultures and traditions we
+        cherish, the structures and sites that dot our modern landscapes, and the little things
+        that we do and say every day.) (url = https://icpdelhi.nvli.in/timeless-trends)
+        """),
+    Section('folktales-of-india', 'Legends and Legacies', 'Folktales of India', """
+        Folktales Of India (India has a rich and diverse tradition of folktales, shaped by its
+        many languages, cultures, and regions. These stories—ranging from fables and fairytales
+        to myths and legends—have been passed down through generations, reflecting the values,
+        beliefs, and imaginations of the people. Fables use animal characters to teach moral
+        lessons, while fairytales often involve magical beings, heroic quests, and
+        transformations. Myths recount the exploits of gods and divine beings, explaining
+        creation, duty, and cosmic order, whereas legends celebrate the lives of saints,
+        warriors, poets, and jesters whose deeds live on in collective memory. Whether shared in
+        gatherings, temples, courts, or classrooms, these tales continue to captivate audiences,
+        preserving the spirit of India's vibrant storytelling heritage.) (url =
+        https://icpdelhi.nvli.in/folktales-of-india)
+        """),
+    Section('healing-through-the-ages', 'Legends and Legacies', 'Healing Through the Ages', """
+        Healing Through The Ages(The 'Healing Through the Ages' category aims to trace the
+        various dimensions and understanding of ailments and cures across India. It is a
+        repository which brings together the different meanings of 'health' and provides an
+        overview of both conventional and unconventional approaches to maintaining balance and
+        restoring a sense of well-being. It will help you traverse historical, regional and
+        cultural boundaries, and help you to cultivate a nuanced understanding of suffering and
+        healing.) (url = https://icpdelhi.nvli.in/healing-through-the-ages)
+        """),
+    Section('iconic-battles-of-india', 'Legends and Legacies', 'Iconic Battles of India', """
+        Iconic Battles Of India(Warfare has shaped the course of Indian history. The
+        subcontinent has witnessed epic battles that not only altered its destiny but also
+        influenced the world at large. This section delves into twelve iconic battles that
+        changed the tide of Indian history, tracing the evolution of warfare across different
+        eras. Each of these conflicts marked the rise or fall of dynasties, introduced new
+        systems of governance, and gave birth to lasting traditions, beliefs, and cultural
+        patterns that continue to shape India's identity today.) (url =
+        https://icpdelhi.nvli.in/iconic-battles-of-india)
+        """),
+    Section('jewellery-of-the-nizams', 'Legends and Legacies', 'Jewellery of the Nizams', """
+        Jewellery Of The Nizams (url = https://icpdelhi.nvli.in/jewellery-of-the-nizams)
+        """),
+    Section('legendary-figures-of-india', 'Legends and Legacies', 'Legendary Figures of India', """
+        Legendary Figures Of India(Throughout its rich and diverse history India has been home
+        to towering personalities whose contributions transcended their time. This category
+        explores the lives and legacies of such extraordinary individuals who have profoundly
+        shaped India's history through their vision courage and intellect. Spanning a diverse
+        spectrum of emperors spiritual leaders social reformers scholars and freedom fighters
+        these iconic personalities represent the enduring spirit of resilience innovation and
+        leadership. Their contributions not only influenced the course of the nation's political
+        and cultural development but also continue to inspire generations with their unwavering
+        commitment to justice knowledge and progress. Through their remarkable journeys they
+        have helped define the soul of India and left an indelible imprint on its collective
+        memory.) (url = https://icpdelhi.nvli.in/legendary-figures-of-india)
+        """),
+    Section('historic-cities-of-india', 'Pan India Explorations', 'Historic Cities of India', """
+        Historic Cities Of India(The map of India is dotted with cities that so many of us call
+        home. Many of these cities have origins in our collective history. While they may now be
+        modern and dynamic centres, they continue to represent centuries of culture and heritage
+        that even today, sets them apart from every other city across the globe. Explore these
+        unique urban centres and everything that they have to offer at your own pace, through a
+        virtual expedition. Click on the icons to the right to begin a virtual visit to these
+        historic cities! Each city has its own story, one that is told here through a collection
+        of rare photographs, multimedia, specially-narrated tales, and more. We invite you to
+        sift through them, explore, and discover your own favourite stories about every city.)
+        (url = 'https://icpdelhi.nvli.in/historic-cities-of-india')
+        """),
+    Section('states-of-india', 'Pan India Explorations', 'States of India', """
+        States Of India(India, a vast and vibrant nation, is a mosaic of diverse states, each
+        woven with a unique thread of culture, history, and tradition. From the majestic,
+        snow-capped mountains in the north to the sun-drenched coastlines in the south, each
+        state offers a rich and varied blend of languages, cuisines, arts, and festivals. This
+        category delves into the architectural marvels that adorn the country, the profound
+        literary contributions from various corners, and the abundant interesting anecdotes that
+        shape each state's identity. It also meticulously charts the historical development of
+        these regions through different ages, reflecting India's millennia- old heritage. Each
+        state, with its distinct character, forms a thread in the extraordinary fabric of
+        India.) (url = 'https://icpdelhi.nvli.in/states-of-india')
+        """),
+    Section('unesco', 'Pan India Explorations', 'UNESCO', """
+        Unesco (url = https://icpdelhi.nvli.in/unesco)
+        """),
+    Section('3d-explorations', 'Built Heritage', '3D Explorations', """
+        3d Explorations(The Indian culinary repertoire reflects the cultural diversity of the
+        country. The term “Indian food” denotes a mélange of flavours from different parts of
+        the country and showcases centuries of cultural exchange with the far corners of the
+        world. Here, on our portal, we are making a small effort of gradually building a
+        treasure trove of information about the countless exquisite flavours of our country. It
+        is an ongoing venture and over time we aim to capture as much as possible of the
+        incredible culinary diversity of this land.) (url =
+        https://icpdelhi.nvli.in/3d-Explorations)
+        """),
+    Section('ajanta-caves', 'Built Heritage', 'Ajanta Caves', """
+        Ajanta Caves(The Ajantā caves are rock-cut Buddhist cave temples carved out of a
+        horseshoe shaped valley near the Waghora river at the edge of the Indyadhri range. The
+        caves are a UNESCO World Heritage site and are thronged by thousands of tourists who
+        come to admire its serene location, rock-cut architecture and beautiful Buddhist
+        paintings that are found in the caves. These 30 rock-cut caves are part of a
+        constellation of Buddhist cave temples dotting the Sahayādri or Western Ghats in
+        Maharashtra. But Ajantā is unique as it hosts the finest specimens of art - Cave 9 and
+        10 contain the oldest Buddhist narrative paintings in India.) (url =
+        https://icpdelhi.nvli.in/3d-Explorations)
+        """),
+    Section('forts-of-india', 'Built Heritage', 'Forts of India', """
+        Forts Of India(The Forts of India are some of the most awe-inspiring monuments found in
+        the country. From the Himalayas to the peninsular tip, from the deserts to the lush
+        valleys of North-East, forts adorn each and every corner of the landscape of the Indian
+        subcontinent. This section aims to provide a comprehensive overview of these magnificent
+        monuments that bear the stories of the political vicissitudes of our country.) (url =
+        https://icpdelhi.nvli.in/forts-of-india)
+        """),
+    Section('districts-of-defiance', 'Footprint of Freedom', 'Districts of Defiance', """
+        Districts Of Defiance(The history of the freedom movement in India comprises a multitude
+        of revolutionary events that helped achieve independence. While a few momentous
+        upheavals and personalities stand out in this historical narrative, the independence of
+        India is also attributed to a series of valuable yet lesser-known incidents that took
+        place in different districts across the country. The Digital District Repository is an
+        attempt to discover and document the memory of these countless stories, events, sites
+        and individuals.) (url = https://icpdelhi.nvli.in/digital-district-repository)
+        """),
+    Section('freedom-archive', 'Footprint of Freedom', 'Freedom Archive', """
+        Freedom Archive(This section contains a collection of rare archival material such as
+        books, photographs, gazetteers, letters, newspaper clippings and much more on the
+        freedom struggle of India. The freedom movement engulfed the entire country and people
+        from all walks of life joined hands to drive the foreign oppressors out of this land.
+        Even after more than 7 decades of freedom, these stories of courage, selflessness and
+        determination continue to inspire and instill pride in us. The present section aims to
+        preserve and bring to light rare glimpses of the fight for freedom in the form of
+        digital records.) (url = https://icpdelhi.nvli.in/freedom-archive)
+        """),
+    Section('photo-essays', 'Cultural Chronicles', 'Photo Essays', """
+        Photo Essays (url = https://icpdelhi.nvli.in/photo-essays)
+        """),
+    Section('retrieved-artefacts-of-india', 'Cultural Chronicles', 'Retrieved Artefacts of India', """
+        Retrieved Artefacts Of India(For millennia, India has been a melting pot of diverse
+        cultures, boasting a rich heritage of breathtaking sculptures and artwork. Yet, over
+        centuries, conquerors and colonial powers relentlessly pillaged this heritage, a trend
+        continued by modern looters and smugglers. Consequently, much of India's historical
+        wealth found its way to Western museums and private collections, resulting in a profound
+        cultural loss that deprives future generations of their rich and intricate heritage. The
+        theft or loss of an artefact signifies the erasure of a piece of history and the
+        collective memory it embodies. Removing artefacts from their original locations strips
+        them of their intrinsic significance, depriving future generations of cultural insights.
+        However, in the past decade, concerted efforts by Indian and international governments,
+        NGOs, journalists, and heritage activists have succeeded in repatriating 358 artefacts
+        back to India. Explore this section to delve into the world of Retrieved Artefacts,
+        uncovering their repatriation stories, heritage, and the legal frameworks that protect
+        them.) (url = https://icpdelhi.nvli.in/retrieved-artefacts-of-india)
+        """),
+    Section('snippets', 'Cultural Chronicles', 'Snippets', """
+        Snippets (url = https://icpdelhi.nvli.in/retrieved-artefacts-of-india)
+        """),
+    Section('stories', 'Cultural Chronicles', 'Stories', """
+        Stories (url = https://icpdelhi.nvli.in/stories)
+        """),
+    Section('textual-repository', 'Textual Repository', 'Textual Repository', """
+        Textual Repository: Archives (url = https://icpdelhi.nvli.in/archives), E-Books (url =
+        https://icpdelhi.nvli.in/e-books), Gazettes and Gazetteers (url =
+        https://icpdelhi.nvli.in/gazettes-and-gazetteers), Indian National Bibliography (url =
+        https://inb.nvli.in/cgi-bin/koha/opac-search.pl?advsearch=1&idx=kw&limit=branch%3ACRL&sort_by=relevance&do=Search),
+        Manuscripts (url = https://icpdelhi.nvli.in/manuscripts), Other-Collections (url =
+        https://icpdelhi.nvli.in/other-collections), Rare Books (url =
+        https://icpdelhi.nvli.in/rare-books), Reports and Proceedings (url =
+        https://icpdelhi.nvli.in/reports-and-proceedings) , Research Papers (url =
+        https://icpdelhi.nvli.in/research-papers), Union Catalogue (url =
+        https://indianculture.gov.in/union-catalogue)
+        """),
+    Section('audio-visual-repository', 'Audio & Visual Repository', 'Audio & Visual Repository', """
+        Audio & Visual Repository: Audios (url = https://icpdelhi.nvli.in/audios), Images (url =
+        https://icpdelhi.nvli.in/images), Intangible-Cultural-Heritage (url =
+        https://icpdelhi.nvli.in/intangible-cultural-heritage), Museum-Collections (url =
+        https://icpdelhi.nvli.in/museum-collections), Paintings(url =
+        https://icpdelhi.nvli.in/paintings), Photos-Archives (url =
+        https://icpdelhi.nvli.in/photo-archives), Videos (url = https://icpdelhi.nvli.in/videos)
+        """),
+    Section('activities', 'Activities', 'Activities (Games)', """
+        Activities (Games): Crossword (url = https://icpdelhi.nvli.in/Crossword), Puzzle (url =
+        https://icpdelhi.nvli.in/Puzzle), Quiz (url = https://icpdelhi.nvli.in/Quiz)
+        """),
+    Section('flagship-events', 'Tools', 'Flagship Events', """
+        Flagship Events: The Indian Culture Portal (ICP) was an integral participant in five
+        flagship events organized by the Ministry of Culture. Beyond its interactive and
+        informative exhibition booths, ICP played a pivotal role in the conceptualization,
+        design, and production of key publications and launches. Through thoughtfully curated
+        content, immersive visitor experiences, and innovative communication tools, ICP
+        contributes significantly to the dissemination and celebration of India's cultural
+        heritage (url = https://icpdelhi.nvli.in/flagship-events)
+        """),
+    Section('outreach', 'Tools', 'Outreach', """
+        Outreach: Discover how the Indian Culture Portal connects with institutions,
+        communities, and experts across the country to preserve and promote India’s rich
+        cultural heritage. Our outreach initiatives foster collaboration, build awareness, and
+        bring culture closer to people through workshops, partnerships, and public engagement
+        (url = https://icpdelhi.nvli.in/outreach)
+        """),
+    Section('publications', 'Tools', 'Publications', """
+        Publications: This section showcases original publications, books, and graphic novels
+        developed by the Indian Culture Portal, alongside publications created by partner
+        organizations within the Ministry of Culture. It also includes select works that were
+        officially unveiled during key Ministry events (url =
+        https://icpdelhi.nvli.in/publications)
+        """),
+    Section('capabilities', 'Portal', 'Capabilities', """
+        Capabilties: Q/A with the content, Search the website, summarise pages when pages
+        contain lot of text.
+        """),]
+SECTIONS = [section._replace(text=' '.join(section.text.split())) for section in SECTIONS]
+
+
+def category_overview(sections):
+    """One section naming every category, grouped as on the portal"""
+    groups = {}
+    for section in sections:
+        if section.group != 'Portal':
+            groups.setdefault(section.group, []).append(section.title)
+    original = '; '.join(f'{group}: {", ".join(groups[group])}' for group in ORIGINAL_GROUPS if group in groups)
+    others = ', '.join(group for group in groups if group not in ORIGINAL_GROUPS)
+    return Section('categories', 'Portal', 'Categories available on the website', (
+        'Categories available on the website: Original Categories (prepared with original research '
+        f'by researchers here), in subcategories {original}. Also available: {others}.'
+    ))
+
+
+SECTIONS.append(category_overview(SECTIONS))
+
+# Always in the prompt, before any ranked section
+PINNED_SECTIONS = ('portal', 'categories', 'capabilities')
+
+
+def render(section):
+    if section.group in ORIGINAL_GROUPS:
+        return f'Original category, subcategory {section.group}: {section.text}'
+    return section.text
+
+
+knowledge_context = '\n\n'.join(render(section) for section in SECTIONS)
+
+
+class KnowledgeIndex:
+    def __init__(self, sections=SECTIONS, pinned=PINNED_SECTIONS):
+        self.sections = {section.id: section for section in sections}
+        self.pinned = [self.sections[section_id] for section_id in pinned if section_id in self.sections]
+        ranked = [section for section in sections if section.id not in pinned]
+        # The title counts twice so a category named in the question ranks first
+        vectors = [
+            centroid([featurize(section.title), featurize(section.title), featurize(section.text)])
+            for section in ranked
+        ]
+        # Features every section shares ("india", "the", " of") say little about relevance
+        document_frequency = {}
+        for vector in vectors:
+            for feature in vector:
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        self.idf = {
+            feature: math.log(1 + len(vectors) / count) for feature, count in document_frequency.items()
+        }
+        self.vectors = [(section, self.weigh(vector)) for section, vector in zip(ranked, vectors)]
+        self.tokens = {section.id: count_tokens(render(section)) for section in sections}
+
+    def weigh(self, vector):
+        return normalize({feature: value * self.idf.get(feature, 0.0) for feature, value in vector.items()})
+
+    def rank(self, query):
+        vector = self.weigh(featurize(query))
+        scored = [(cosine(vector, section_vector), section) for section, section_vector in self.vectors]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def select(self, query, max_tokens=KNOWLEDGE_TOKEN_BUDGET, top_k=KNOWLEDGE_TOP_SECTIONS,
+               min_score=KNOWLEDGE_MIN_SCORE):
+        """Pinned sections plus the top_k best matches that fit the budget"""
+        chosen = list(self.pinned)
+        used = sum(self.tokens[section.id] for section in chosen)
+        ranked = 0
+        for score, section in self.rank(query):
+            if ranked >= top_k or score < min_score:
+                break
+            if used + self.tokens[section.id] > max_tokens:
+                continue
+            chosen.append(section)
+            used += self.tokens[section.id]
+            ranked += 1
+        return chosen
+
+    def context(self, query, **kwargs):
+        """Returns (knowledge text, report) for the prompt"""
+        chosen = self.select(query, **kwargs)
+        text = '\n\n'.join(render(section) for section in chosen)
+        return text, {
+            'sections': [section.id for section in chosen],
+            'tokens': sum(self.tokens[section.id] for section in chosen)
+        }
+
+
+_knowledge_index = None
+_knowledge_index_lock = threading.Lock()
+
+
+def get_knowledge_index():
+    """Shared KnowledgeIndex, built on first use; its token counts may load tiktoken's vocabulary"""
+    global _knowledge_index
+    if _knowledge_index is None:
+        with _knowledge_index_lock:
+            if _knowledge_index is None:
+                _knowledge_index = KnowledgeIndex()
+    return _knowledge_index
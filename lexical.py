@@ -0,0 +1,102 @@
+"""
+Lexical (SQLite FTS5 / BM25) search over catalog titles and descriptions.
+
+Used by fetch_similar_titles alongside vector search: results from both
+are merged with reciprocal-rank fusion, and when the top lexical hit
+already contains every term of a short query the vector search is skipped.
+
+Build or rebuild the index inside the catalog database with:
+
+    python lexical.py
+"""
+import os
+import re
+import sqlite3
+
+from catalog import CATALOG_DB_PATH, CatalogRepository
+
+FTS_TABLE = 'CategoriesFTS'
+LEXICAL_MAX_TERMS = int(os.getenv('LEXICAL_MAX_TERMS', '4'))
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = {
+    'a', 'about', 'an', 'and', 'any', 'are', 'books', 'can', 'find', 'for', 'give',
+    'i', 'in', 'info', 'information', 'is', 'me', 'of', 'on', 'show', 'tell', 'the',
+    'to', 'want', 'what', 'which', 'who', 'with', 'you'
+}
+
+SEARCH_SQL = (
+    f'SELECT rowid, title, bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH ? ORDER BY 3 LIMIT ?'
+)
+
+_repository = None
+_available = True
+
+
+def build_fts_index(db_path=CATALOG_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(f"""
+            DROP TABLE IF EXISTS {FTS_TABLE};
+            CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                title, description, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            INSERT INTO {FTS_TABLE} (rowid, title, description)
+                SELECT "index", title, description FROM Categories;
+        """)
+        count = conn.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}').fetchone()[0]
+    finally:
+        conn.close()
+    print(f'FTS index built: {count} rows')
+
+
+def query_terms(query):
+    """Lower-cased content words of a query"""
+    return [t for t in TOKEN_RE.findall(query.lower()) if t not in STOPWORDS]
+
+
+def lexical_search(query, k=20):
+    """Return [(id, title, bm25)] best first; bm25 is negative, lower is better"""
+    global _repository, _available
+    terms = query_terms(query)
+    if not terms or not _available:
+        return []
+
+    if _repository is None:
+        _repository = CatalogRepository()
+
+    match = ' OR '.join(f'"{term}"' for term in terms)
+    try:
+        with _repository.connection() as conn:
+            return conn.execute(SEARCH_SQL, (match, k)).fetchall()
+    except sqlite3.OperationalError as e:
+        # No FTS table in this database: run vector-only until it is built
+        if 'no such table' in str(e):
+            print(f"Lexical search disabled: {e}")
+            _available = False
+        else:
+            print(f"Lexical search error: {e}")
+        return []
+
+
+def is_confident(query, hits):
+    """True when a short query is fully contained in the best matching title"""
+    terms = query_terms(query)
+    if not hits or not terms or len(terms) > LEXICAL_MAX_TERMS:
+        return False
+    title_terms = set(TOKEN_RE.findall((hits[0][1] or '').lower()))
+    return all(term in title_terms for term in terms)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge ranked id lists; an id scores sum(1 / (k + rank)) over the lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_val in enumerate(ranking, start=1):
+            scores[id_val] = scores.get(id_val, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+if __name__ == '__main__':
+    build_fts_index()
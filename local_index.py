@@ -0,0 +1,116 @@
+"""
+In-process vector index over the catalog titles.
+
+Exact cosine search over a normalised NumPy matrix. It exposes the same
+search methods that database.py uses on PineconeVectorStore, returning
+(Document, score) pairs, so either one can back fetch_similar_titles.
+"""
+import os
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class LocalVectorIndex:
+    def __init__(self, ids, texts, vectors, embedding=None):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids) or len(ids) != len(texts):
+            raise ValueError("ids, texts and vectors must have the same length")
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self.ids = [str(id_val) for id_val in ids]
+        self.texts = [str(text) for text in texts]
+        self.matrix = matrix / norms
+        self.embedding = embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ============================================
+    # BUILDING AND SNAPSHOTS
+    # ============================================
+
+    @classmethod
+    def from_documents(cls, documents, ids, embedding, batch_size=500):
+        """Embed documents with the given embedding model and index them"""
+        texts = [doc.page_content for doc in documents]
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(embedding.embed_documents(texts[start:start + batch_size]))
+        return cls(ids, texts, vectors, embedding=embedding)
+
+    @classmethod
+    def from_pinecone(cls, index, embedding=None, namespace=None, text_key='text', batch_size=100):
+        """Copy every vector already stored in a Pinecone index, no re-embedding"""
+        all_ids = []
+        for page in index.list(namespace=namespace):
+            all_ids.extend(page)
+
+        ids, texts, vectors = [], [], []
+        for start in range(0, len(all_ids), batch_size):
+            response = index.fetch(ids=all_ids[start:start + batch_size], namespace=namespace)
+            for id_val, record in response.vectors.items():
+                ids.append(id_val)
+                texts.append((record.metadata or {}).get(text_key, ''))
+                vectors.append(record.values)
+
+        return cls(ids, texts, vectors, embedding=embedding)
+
+    def save(self, path):
+        """Write the index to an .npz snapshot, replacing any previous one atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    ids=np.array(self.ids, dtype=str),
+                    texts=np.array(self.texts, dtype=str),
+                    matrix=self.matrix
+                )
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, embedding=None):
+        with np.load(path) as snapshot:
+            return cls(
+                snapshot['ids'].tolist(),
+                snapshot['texts'].tolist(),
+                snapshot['matrix'],
+                embedding=embedding
+            )
+
+    # ============================================
+    # SEARCH
+    # ============================================
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, **kwargs):
+        """Return the k most similar documents with their cosine similarity"""
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.matrix @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (Document(id=self.ids[i], page_content=self.texts[i]), float(scores[i]))
+            for i in top
+        ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        if self.embedding is None:
+            raise ValueError("LocalVectorIndex needs an embedding model to search by text")
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k)
@@ -0,0 +1,84 @@
+"""
+In-process counters, gauges and latency stats.
+
+Everything is kept per worker process and exposed as one JSON snapshot
+through the /metrics endpoint. Modules that keep their own stats (caches
+for example) register a collector that is called at snapshot time.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Recent samples kept per latency series, for percentiles
+LATENCY_WINDOW = 1024
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_latencies = {}
+_collectors = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def record_latency(name, seconds):
+    with _lock:
+        series = _latencies.get(name)
+        if series is None:
+            series = _latencies[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'recent': deque(maxlen=LATENCY_WINDOW)}
+        series['count'] += 1
+        series['total'] += seconds
+        series['max'] = max(series['max'], seconds)
+        series['recent'].append(seconds)
+
+
+@contextmanager
+def timed(name):
+    """Record the duration of the with-block under `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_latency(name, time.perf_counter() - start)
+
+
+def register_collector(name, fn):
+    """Include fn() under `name` in every snapshot"""
+    _collectors[name] = fn
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        latencies = {}
+        for name, series in _latencies.items():
+            ordered = sorted(series['recent'])
+            latencies[name] = {
+                'count': series['count'],
+                'mean_ms': round(series['total'] / series['count'] * 1000, 2),
+                'p50_ms': round(_percentile(ordered, 0.50) * 1000, 2),
+                'p95_ms': round(_percentile(ordered, 0.95) * 1000, 2),
+                'max_ms': round(series['max'] * 1000, 2)
+            }
+
+    result = {'counters': counters, 'gauges': gauges, 'latencies': latencies}
+    for name, fn in list(_collectors.items()):
+        try:
+            result[name] = fn()
+        except Exception as e:
+            result[name] = {'error': str(e)}
+    return result
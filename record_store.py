@@ -0,0 +1,167 @@
+"""
+Memory-mapped, array-backed copy of the Categories table.
+
+The file is built once from the SQLite catalog and opened read-only with
+mmap by every worker, so all gunicorn workers share the same pages from
+the OS page cache. An id table maps each id straight to its record slot,
+so a lookup is O(1) with no SQL.
+
+Layout (little-endian):
+
+    header      magic, version, max_id, record count, category count,
+                offsets of the sections below
+    id table    (max_id + 1) x u32 record slot, MISSING if absent
+    records     n x (category, title off/len, description off/len, url off/len) as u32
+    categories  k x (off, len) as u32
+    strings     UTF-8 string pool; equal strings are stored once
+
+A length of NULL_LEN marks a NULL column.
+"""
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+
+from catalog import CatalogRow, group_by_category
+
+MAGIC = b'ICPREC01'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIQQQQ')
+SLOT = struct.Struct('<I')
+RECORD = struct.Struct('<7I')
+CATEGORY = struct.Struct('<II')
+MISSING = 0xFFFFFFFF
+NULL_LEN = 0xFFFFFFFF
+
+
+class _StringPool:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, value):
+        if value is None:
+            return 0, NULL_LEN
+        encoded = str(value).encode('utf-8')
+        offset = self.offsets.get(encoded)
+        if offset is None:
+            offset = len(self.data)
+            self.offsets[encoded] = offset
+            self.data.extend(encoded)
+        return offset, len(encoded)
+
+
+def build_record_store(db_path, out_path):
+    """Write the record store file for a catalog database, replacing it atomically"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute(
+            'SELECT "index", title, category, description, url FROM Categories ORDER BY "index"'
+        ).fetchall()
+    finally:
+        conn.close()
+
+    pool = _StringPool()
+    category_slots = {}
+    categories = []
+    records = bytearray()
+    max_id = max((row[0] for row in rows), default=0)
+    id_table = bytearray(SLOT.pack(MISSING) * (max_id + 1))
+
+    for slot, (id_val, title, category, description, url) in enumerate(rows):
+        if category not in category_slots:
+            category_slots[category] = len(categories)
+            categories.append(pool.add(category))
+        records += RECORD.pack(
+            category_slots[category],
+            *pool.add(title),
+            *pool.add(description),
+            *pool.add(url)
+        )
+        SLOT.pack_into(id_table, id_val * SLOT.size, slot)
+
+    category_table = b''.join(CATEGORY.pack(offset, length) for offset, length in categories)
+
+    ids_offset = HEADER.size
+    records_offset = ids_offset + len(id_table)
+    categories_offset = records_offset + len(records)
+    strings_offset = categories_offset + len(category_table)
+    header = HEADER.pack(
+        MAGIC, VERSION, max_id, len(rows), len(categories),
+        ids_offset, records_offset, categories_offset, strings_offset
+    )
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.bin')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for section in (header, id_table, records, category_table, pool.data):
+                f.write(section)
+        os.replace(tmp_path, out_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+    print(f'Record store built: {len(rows)} rows, {len(categories)} categories -> {out_path}')
+
+
+class RecordStore:
+    """Read-only view over a record store file; same lookups as CatalogRepository"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.max_id, self.size, category_count,
+         self._ids_offset, self._records_offset, categories_offset,
+         self._strings_offset) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} record store')
+
+        # Few distinct categories: decode them once
+        self._categories = [
+            self._string(*CATEGORY.unpack_from(self._buf, categories_offset + i * CATEGORY.size))
+            for i in range(category_count)
+        ]
+
+    def _string(self, offset, length):
+        if length == NULL_LEN:
+            return None
+        start = self._strings_offset + offset
+        return self._buf[start:start + length].decode('utf-8')
+
+    def get(self, id_val):
+        id_val = int(id_val)
+        if id_val < 0 or id_val > self.max_id:
+            return None
+        (slot,) = SLOT.unpack_from(self._buf, self._ids_offset + id_val * SLOT.size)
+        if slot == MISSING:
+            return None
+
+        category, title_off, title_len, desc_off, desc_len, url_off, url_len = RECORD.unpack_from(
+            self._buf, self._records_offset + slot * RECORD.size
+        )
+        return CatalogRow(
+            id_val,
+            self._string(title_off, title_len),
+            self._categories[category],
+            self._string(desc_off, desc_len),
+            self._string(url_off, url_len)
+        )
+
+    def fetch_by_ids(self, ids):
+        """Rows for the given ids, ordered by category then title like the SQL lookup"""
+        rows = [row for row in map(self.get, dict.fromkeys(ids)) if row is not None]
+        rows.sort(key=lambda row: (row.category or '', row.title or ''))
+        return rows
+
+    def fetch_grouped(self, ids):
+        return group_by_category(self.fetch_by_ids(ids))
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self._buf.close()
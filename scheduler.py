@@ -0,0 +1,260 @@
+"""
+Admission control for requests that call the LLM.
+
+A chat graph run or a page summary first takes a slot from the process's
+LlmScheduler. At most LLM_MAX_CONCURRENCY requests hold a slot at once,
+whether they come from Flask worker threads or async_app tasks. The rest
+wait in a bounded FIFO queue per lane ('chat' for /chat and /chat/stream,
+'summarise' for /summarise_page). A freed slot goes to the lanes in turn,
+so a burst on one endpoint cannot starve the other.
+
+A request is turned away at once with 429 when its lane's queue is full,
+and with 503 when it waited SCHEDULER_QUEUE_TIMEOUT seconds without a
+slot. Both carry a Retry-After worked out from recent slot hold times and
+the queue ahead. Queue depth, slots in flight and wait times are in
+/metrics, so workers can be scaled before latency collapses.
+
+The cap counts admitted requests, not individual LLM calls, and applies
+per process. A slot is held for a whole graph run or page summary, so one
+slot can cover several calls: intent, answer, JSON repair and Hindi
+translation run one after another, and a General answer may run a
+history fold alongside. A translated Specialised request makes three or
+more calls under its single slot. Size LLM_MAX_CONCURRENCY as the
+provider concurrency you want to allow, divided by the number of
+processes and by about two calls per request.
+
+Only processes that serve several requests at once (threaded workers
+such as gunicorn gthread, or async_app) ever queue or shed load. A sync
+worker handles one request at a time, so its single slot is always free
+and the worker count is the effective cap.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+# Requests (not LLM calls) holding a slot at once, per process; see above for sizing
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+# Requests allowed to wait for a slot, per lane
+SCHEDULER_QUEUE_LIMITS = {
+    'chat': int(os.getenv('SCHEDULER_CHAT_QUEUE', '32')),
+    'summarise': int(os.getenv('SCHEDULER_SUMMARISE_QUEUE', '16'))
+}
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv('SCHEDULER_QUEUE_TIMEOUT', '20'))
+SCHEDULER_MAX_RETRY_AFTER = int(os.getenv('SCHEDULER_MAX_RETRY_AFTER', '60'))
+
+# Slot hold time assumed until requests have been measured, and the weight of each new measurement
+DEFAULT_HOLD_SECONDS = 5.0
+HOLD_SMOOTHING = 0.1
+
+
+class Overloaded(Exception):
+    """No slot for the request: answer with `status` and Retry-After `retry_after` seconds"""
+    def __init__(self, lane, status, retry_after, reason):
+        super().__init__(f"{lane} lane {reason}")
+        self.lane = lane
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A held LLM slot; release() or leaving the with-block hands it on, once"""
+    def __init__(self, scheduler, lane, held=True):
+        self._scheduler = scheduler
+        self.lane = lane
+        self.held = held
+        self.acquired_at = time.monotonic()
+
+    def release(self):
+        self._scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ('lane', 'wake', 'granted')
+
+    def __init__(self, lane, wake):
+        self.lane = lane
+        self.wake = wake
+        # Set under the scheduler lock when a released slot is handed to this waiter
+        self.granted = False
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LlmScheduler:
+    def __init__(self, capacity=LLM_MAX_CONCURRENCY, queue_limits=None, queue_timeout=SCHEDULER_QUEUE_TIMEOUT,
+                 enabled=SCHEDULER_ENABLED):
+        self.capacity = capacity
+        self.queue_limits = dict(queue_limits or SCHEDULER_QUEUE_LIMITS)
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queues = {lane: deque() for lane in self.queue_limits}
+        self._lanes = list(self.queue_limits)
+        self._next_lane = 0
+        self._hold_seconds = DEFAULT_HOLD_SECONDS
+        with self._lock:
+            self._publish()
+
+    def acquire(self, lane):
+        """Wait for a slot in `lane`; raises Overloaded when the queue is full or the wait times out"""
+        if not self.enabled:
+            return Slot(self, lane, held=False)
+        started = time.monotonic()
+        event = threading.Event()
+        slot, waiter = self._enqueue(_Waiter(lane, event.set))
+        if waiter is not None:
+            event.wait(self.queue_timeout)
+            slot = self._claim(waiter)
+        self._admitted(lane, started)
+        return slot
+
+    async def aacquire(self, lane):
+        """acquire for coroutines: waits on the event loop instead of blocking it"""
+        if not self.enabled:
+            return Slot(self, lane, held=False)
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Bound before wake is defined: a release on another thread may call wake as soon as it is queued
+        waiter = _Waiter(lane, None)
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The loop closed along with the request waiting on it: pass the slot on
+                self._abandon(waiter)
+
+        waiter.wake = wake
+        slot, waiter = self._enqueue(waiter)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            slot = self._claim(waiter)
+        self._admitted(lane, started)
+        return slot
+
+    def _enqueue(self, waiter):
+        """(slot, None) when a slot is free, otherwise (None, waiter) queued in its lane"""
+        lane = waiter.lane
+        with self._lock:
+            if self._in_flight < self.capacity:
+                self._in_flight += 1
+                self._publish()
+                return Slot(self, lane), None
+            queue = self._queues[lane]
+            if len(queue) >= self.queue_limits[lane]:
+                retry_after = self._retry_after()
+            else:
+                queue.append(waiter)
+                self._publish()
+                metrics.increment(f'scheduler.{lane}.queued')
+                return None, waiter
+
+        metrics.increment(f'scheduler.{lane}.rejected')
+        raise Overloaded(lane, 429, retry_after, 'queue is full')
+
+    def _claim(self, waiter):
+        """The waiter's slot once woken; a waiter still queued has timed out"""
+        with self._lock:
+            if waiter.granted:
+                return Slot(self, waiter.lane)
+            self._queues[waiter.lane].remove(waiter)
+            self._publish()
+            retry_after = self._retry_after()
+
+        metrics.increment(f'scheduler.{waiter.lane}.timed_out')
+        raise Overloaded(waiter.lane, 503, retry_after, f'wait exceeded {self.queue_timeout:g}s')
+
+    def _abandon(self, waiter):
+        """Drop a waiter whose request went away, passing on a slot it was already given"""
+        with self._lock:
+            if not waiter.granted:
+                self._queues[waiter.lane].remove(waiter)
+                self._publish()
+                return
+        Slot(self, waiter.lane).release()
+
+    def _admitted(self, lane, started):
+        metrics.increment(f'scheduler.{lane}.admitted')
+        metrics.record_latency(f'scheduler.{lane}.wait', time.monotonic() - started)
+
+    def _release(self, slot):
+        with self._lock:
+            if not slot.held:
+                return
+            slot.held = False
+            held = time.monotonic() - slot.acquired_at
+            self._hold_seconds += HOLD_SMOOTHING * (held - self._hold_seconds)
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._in_flight -= 1
+            else:
+                # The slot passes straight to the waiter, so in_flight is unchanged
+                waiter.granted = True
+            self._publish()
+
+        metrics.record_latency(f'scheduler.{slot.lane}.hold', held)
+        if waiter is not None:
+            waiter.wake()
+
+    def _next_waiter(self):
+        """Oldest waiter of the next lane in turn that has one"""
+        for offset in range(len(self._lanes)):
+            index = (self._next_lane + offset) % len(self._lanes)
+            queue = self._queues[self._lanes[index]]
+            if queue:
+                self._next_lane = (index + 1) % len(self._lanes)
+                return queue.popleft()
+        return None
+
+    def _retry_after(self):
+        """Seconds for the queue ahead of a new request to drain at the recent hold time"""
+        queued = sum(len(queue) for queue in self._queues.values())
+        seconds = self._hold_seconds * (queued + 1) / max(self.capacity, 1)
+        return max(1, min(SCHEDULER_MAX_RETRY_AFTER, math.ceil(seconds)))
+
+    def _publish(self):
+        metrics.set_gauge('scheduler.in_flight', self._in_flight)
+        for lane, queue in self._queues.items():
+            metrics.set_gauge(f'scheduler.{lane}.queue_depth', len(queue))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'queue_timeout': self.queue_timeout,
+                'hold_seconds': round(self._hold_seconds, 3),
+                'retry_after': self._retry_after(),
+                'lanes': {
+                    lane: {'queued': len(queue), 'queue_limit': self.queue_limits[lane]}
+                    for lane, queue in self._queues.items()
+                }
+            }
+
+
+llm_scheduler = LlmScheduler()
+metrics.register_collector('scheduler', llm_scheduler.stats)
@@ -0,0 +1,81 @@
+"""
+Semantic cache for final specialised answers.
+
+Entries are keyed by the query embedding and the response language. A
+lookup returns the stored answer of the most similar cached query in the
+same language when its cosine similarity reaches the threshold, so
+rephrasings of an already answered question skip intent classification,
+retrieval and the answer call. app.py looks it up in the graph's first
+node, cached_answer, unless the local intent classifier has already
+ruled the question out as Specialised.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.95, maxsize=512, ttl=3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, language):
+        """Return (answer, similarity) for the closest live entry, or None"""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        best_key, best_score = None, -1.0
+
+        with self._lock:
+            for key, (entry_language, vector, _, expires_at) in list(self._entries.items()):
+                if expires_at is not None and expires_at <= now:
+                    del self._entries[key]
+                    continue
+                if entry_language != language:
+                    continue
+                score = float(vector @ query)
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                return self._entries[best_key][2], best_score
+
+            self.misses += 1
+            return None
+
+    def store(self, key, embedding, language, answer):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[(key, language)] = (language, self._normalize(embedding), answer, expires_at)
+            self._entries.move_to_end((key, language))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
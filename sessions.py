@@ -0,0 +1,124 @@
+"""
+Conversation sessions and the LangGraph thread each one is on.
+
+A session id comes from the client (the "session_id" field of the
+request body or an X-Session-Id header) or from the session cookie; a
+request with none gets a new id, returned as a cookie and in the
+X-Session-Id response header. Each session has a generation; its graph
+thread is "<session_id>:<generation>". Clearing the memory, or finishing
+a Specialised answer, moves the session to the next generation and
+deletes the previous thread's checkpoints.
+
+The sessions table lives in the checkpoint database, so every worker
+sees the same generation. Sessions idle for longer than the checkpoint
+idle TTL are forgotten, like their threads.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+from checkpoint_store import CHECKPOINT_DB_PATH, CHECKPOINT_IDLE_TTL, CHECKPOINT_MAINTENANCE_INTERVAL, connect
+
+SESSION_COOKIE = os.getenv('SESSION_COOKIE', 'session_id')
+SESSION_COOKIE_MAX_AGE = int(os.getenv('SESSION_COOKIE_MAX_AGE', str(30 * 24 * 3600)))
+SESSION_HEADER = 'X-Session-Id'
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and bool(SESSION_ID_RE.match(session_id))
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def thread_name(session_id, generation):
+    return f'{session_id}:{generation}'
+
+
+class SessionStore:
+    def __init__(self, path=CHECKPOINT_DB_PATH, checkpointer=None, idle_ttl=CHECKPOINT_IDLE_TTL,
+                 prune_interval=CHECKPOINT_MAINTENANCE_INTERVAL):
+        self.checkpointer = checkpointer
+        self.idle_ttl = idle_ttl
+        self.prune_interval = prune_interval
+        self._last_prune = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def resolve(self, candidate):
+        """Return (session_id, issued): the client's id when valid, otherwise a new one"""
+        if valid_session_id(candidate):
+            return candidate, False
+        metrics.increment('sessions.issued')
+        return new_session_id(), True
+
+    def thread_id(self, session_id):
+        """The session's current graph thread, registering the session on first use"""
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO sessions VALUES (?, 0, ?, ?) '
+                'ON CONFLICT (session_id) DO UPDATE SET last_seen = excluded.last_seen',
+                (session_id, now, now)
+            )
+            generation = self._conn.execute(
+                'SELECT generation FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()[0]
+            self._conn.commit()
+        return thread_name(session_id, generation)
+
+    def advance(self, session_id):
+        """Start a fresh thread for the session and drop the old one; returns the new thread id"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO sessions VALUES (?, 1, ?, ?) ON CONFLICT (session_id) DO UPDATE '
+                'SET generation = generation + 1, last_seen = excluded.last_seen',
+                (session_id, now, now)
+            )
+            generation = self._conn.execute(
+                'SELECT generation FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()[0]
+            self._conn.commit()
+
+        if self.checkpointer is not None:
+            try:
+                self.checkpointer.delete_thread(thread_name(session_id, generation - 1))
+            except (sqlite3.Error, NotImplementedError) as e:
+                print(f"Could not delete the previous thread of session {session_id}: {e}")
+        return thread_name(session_id, generation)
+
+    def prune(self):
+        """Forget sessions idle for longer than idle_ttl; returns how many"""
+        self._last_prune = time.monotonic()
+        with self._lock:
+            removed = self._conn.execute(
+                'DELETE FROM sessions WHERE last_seen < ?', (time.time() - self.idle_ttl,)
+            ).rowcount
+            self._conn.commit()
+        if removed:
+            metrics.increment('sessions.expired', removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        return {'sessions': count}
@@ -0,0 +1,57 @@
+"""
+Helpers for the server-sent-events variant of /chat.
+"""
+import json
+
+
+def sse(event, data):
+    """One server-sent event with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class CategoryStreamParser:
+    """
+    Incremental parser for the specialised answer, a JSON array of
+    category objects streamed token by token. feed() returns every
+    top-level object completed by the new text. Anything before the
+    opening '[' (a markdown fence, say) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth > 0:
+                self.in_string = True
+            elif char in '[{':
+                if self.depth == 1 and char == '{':
+                    self.object_start = self.position
+                self.depth += 1
+            elif char in ']}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 1 and char == '}' and self.object_start is not None:
+                    try:
+                        item = json.loads(self.buffer[self.object_start:self.position + 1])
+                        if isinstance(item, dict):
+                            completed.append(item)
+                    except ValueError:
+                        pass
+                    self.object_start = None
+            self.position += 1
+        return completed
@@ -0,0 +1,48 @@
+"""
+Sparse bag-of-words vectors for small local text classifiers and indexes.
+
+A text becomes {feature: weight} with word unigrams and character
+trigrams, so short queries and light misspellings still overlap. No
+model, no network: cheap enough to run on every request.
+"""
+import math
+import re
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def words(text):
+    return WORD_RE.findall((text or '').lower())
+
+
+def featurize(text):
+    features = {}
+    for word in words(text):
+        features['w:' + word] = features.get('w:' + word, 0.0) + 1.0
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            gram = 'c:' + padded[i:i + 3]
+            features[gram] = features.get(gram, 0.0) + 0.5
+    return normalize(features)
+
+
+def normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return vector
+    return {key: value / norm for key, value in vector.items()}
+
+
+def cosine(a, b):
+    """Dot product of two normalised sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(key, 0.0) for key, value in a.items())
+
+
+def centroid(vectors):
+    total = {}
+    for vector in vectors:
+        for key, value in vector.items():
+            total[key] = total.get(key, 0.0) + value
+    return normalize(total)
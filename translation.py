@@ -0,0 +1,303 @@
+"""
+Hindi translation of generated answers.
+
+translate_to_hindi handles a single text. translate_batch_to_hindi
+translates every field of a response at once: repeated strings are sent
+once, and all of them go out in a single LLM call as a JSON object keyed
+by field, so the output maps back to the right field. When that output
+does not validate, the strings are translated one by one with bounded
+parallelism. The number of LLM calls saved against one call per field
+goes to /metrics.
+
+Both consult a persistent translation memory first, keyed by a hash of
+the whitespace-normalised source text, and store every new translation
+in it. The memory can be exported to and imported from JSON lines, so a
+warmed memory can be shipped to new nodes:
+
+    python translation.py export memory.jsonl
+    python translation.py import memory.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.prompts import PromptTemplate
+
+import metrics
+from cache import TieredCache
+from database import get_llm
+
+# Parallel per-field calls when a batch has to fall back
+TRANSLATION_FALLBACK_WORKERS = int(os.getenv('TRANSLATION_FALLBACK_WORKERS', '4'))
+
+TRANSLATION_MEMORY_ENABLED = os.getenv('TRANSLATION_MEMORY_ENABLED', 'true').lower() == 'true'
+TRANSLATION_MEMORY_PATH = os.getenv('TRANSLATION_MEMORY_PATH', 'translation_memory.db')
+# Entries kept on disk (least recently used are evicted) and in process memory
+TRANSLATION_MEMORY_SIZE = int(os.getenv('TRANSLATION_MEMORY_SIZE', '50000'))
+TRANSLATION_MEMORY_CACHE_SIZE = int(os.getenv('TRANSLATION_MEMORY_CACHE_SIZE', '2048'))
+
+translation_prompt = PromptTemplate.from_template(
+    """You are a professional translator. Translate the following text into Hindi.
+
+    Preserve:
+    - Formatting
+    - Structure (headings, bullet points, etc.)
+    - Punctuation
+    - Names of people, places, and organizations (as appropriate)
+    - Do not give the answer as here is the hindi translation. Give give response as given in the english text.
+    - Preserve the gender as well.
+
+    Text:
+    {text}
+
+    Hindi Translation:
+    """
+)
+
+batch_translation_prompt = PromptTemplate.from_template(
+    """You are a professional translator. Translate every value of the JSON object below into Hindi.
+
+    Rules:
+    - Respond ONLY with a JSON object that has exactly the same keys as the input.
+    - Translate the values only. Never translate, rename, add or drop keys.
+    - Preserve formatting, punctuation and the gender used in the text.
+    - Keep names of people, places, and organizations as appropriate.
+    - DO NOT include markdown or any text outside the JSON object.
+
+    Input:
+    {items}
+
+    Output:
+    """
+)
+
+
+def normalize_source(text):
+    return ' '.join(unicodedata.normalize('NFC', text or '').split())
+
+
+class TranslationMemory:
+    """Hindi translations keyed by a hash of the normalised source, in memory and on disk"""
+
+    def __init__(self, path=TRANSLATION_MEMORY_PATH, maxsize=TRANSLATION_MEMORY_SIZE,
+                 cache_size=TRANSLATION_MEMORY_CACHE_SIZE):
+        self.cache = TieredCache('translation_hi', maxsize=cache_size, disk_path=path, disk_maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(normalize_source(text).encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        entry = self.cache.get(self.key(text))
+        if entry is None:
+            self.misses += 1
+            metrics.increment('translation.memory.miss')
+            return None
+        self.hits += 1
+        metrics.increment('translation.memory.hit')
+        return entry['translation']
+
+    def put(self, text, translation):
+        self.cache.set(self.key(text), {'source': normalize_source(text), 'translation': translation})
+
+    def export(self, path):
+        """Write every stored entry as a JSON line; returns the number written"""
+        if self.cache.disk is None:
+            raise ValueError("Translation memory has no disk store to export")
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, entry in self.cache.disk.items():
+                f.write(json.dumps({'key': key, **entry}, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+
+    def import_file(self, path):
+        """Add the entries of an exported file; returns the number imported"""
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.put(entry['source'], entry['translation'])
+                count += 1
+        return count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.cache.stats()
+        }
+
+
+translation_memory = None
+if TRANSLATION_MEMORY_ENABLED:
+    translation_memory = TranslationMemory()
+    metrics.register_collector('translation_memory', translation_memory.stats)
+
+
+def _remembered(text):
+    return translation_memory.get(text) if translation_memory is not None else None
+
+
+def _remember(text, translation):
+    if translation_memory is not None:
+        translation_memory.put(text, translation)
+
+
+def translate_to_hindi(text: str) -> str:
+    remembered = _remembered(text)
+    if remembered is not None:
+        return remembered
+    try:
+        chain = translation_prompt | get_llm()
+        result = chain.invoke({'text': text}, config={'tags': ['translation']})
+        _remember(text, result.content)
+        return result.content
+    except Exception as e:
+        print("Translation error:", e)
+        return text
+
+
+async def atranslate_to_hindi(text: str) -> str:
+    remembered = _remembered(text)
+    if remembered is not None:
+        return remembered
+    try:
+        chain = translation_prompt | get_llm()
+        result = await chain.ainvoke({'text': text}, config={'tags': ['translation']})
+        _remember(text, result.content)
+        return result.content
+    except Exception as e:
+        print("Translation error:", e)
+        return text
+
+
+def _unique_texts(texts):
+    """Distinct non-blank strings, in first-seen order"""
+    return list(dict.fromkeys(text for text in texts if text and text.strip()))
+
+
+def _batch_items(unique):
+    return json.dumps({f't{i}': text for i, text in enumerate(unique)}, ensure_ascii=False, indent=2)
+
+
+def parse_batch(content, unique):
+    """Translations keyed by source text; raises ValueError unless every key came back translated"""
+    start, end = content.find('{'), content.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in batch translation")
+    parsed = json.loads(content[start:end + 1])
+
+    expected = {f't{i}' for i in range(len(unique))}
+    if not isinstance(parsed, dict) or set(parsed) != expected:
+        raise ValueError("Batch translation keys do not match the input")
+    if not all(isinstance(value, str) and value.strip() for value in parsed.values()):
+        raise ValueError("Batch translation has empty values")
+    return {text: parsed[f't{i}'] for i, text in enumerate(unique)}
+
+
+def _split_remembered(unique):
+    """Return (translations already in memory, texts still to translate)"""
+    translations = {}
+    pending = []
+    for text in unique:
+        remembered = _remembered(text)
+        if remembered is None:
+            pending.append(text)
+        else:
+            translations[text] = remembered
+    return translations, pending
+
+
+def _remember_batch(content, pending):
+    """Parsed batch translations, stored in the translation memory"""
+    batch = parse_batch(content, pending)
+    for text, translated in batch.items():
+        _remember(text, translated)
+    return batch
+
+
+def _finish(texts, translations, calls):
+    fields = len(texts)
+    saved = fields - calls
+    metrics.increment('translation.batch.requests')
+    metrics.increment('translation.batch.fields', fields)
+    metrics.increment('translation.batch.llm_calls', calls)
+    metrics.increment('translation.batch.calls_saved', saved)
+    print(f"Batch translation: {fields} fields, {calls} LLM calls, {saved} saved")
+    return [translations.get(text, text) for text in texts]
+
+
+def translate_batch_to_hindi(texts):
+    """Translate a list of strings, returning the translations in the same order"""
+    translations, pending = _split_remembered(_unique_texts(texts))
+    if not pending:
+        return _finish(texts, translations, 0)
+    if len(pending) == 1:
+        translations[pending[0]] = translate_to_hindi(pending[0])
+        return _finish(texts, translations, 1)
+
+    try:
+        chain = batch_translation_prompt | get_llm()
+        result = chain.invoke({'items': _batch_items(pending)}, config={'tags': ['translation']})
+        batch = _remember_batch(result.content, pending)
+        return _finish(texts, {**translations, **batch}, 1)
+    except Exception as e:
+        print(f"Batch translation failed, translating per field: {e}")
+        metrics.increment('translation.batch.fallbacks')
+
+    with ThreadPoolExecutor(max_workers=TRANSLATION_FALLBACK_WORKERS) as pool:
+        translated = list(pool.map(translate_to_hindi, pending))
+    return _finish(texts, {**translations, **dict(zip(pending, translated))}, 1 + len(pending))
+
+
+async def atranslate_batch_to_hindi(texts):
+    """translate_batch_to_hindi on the async LLM client"""
+    translations, pending = _split_remembered(_unique_texts(texts))
+    if not pending:
+        return _finish(texts, translations, 0)
+    if len(pending) == 1:
+        translations[pending[0]] = await atranslate_to_hindi(pending[0])
+        return _finish(texts, translations, 1)
+
+    try:
+        chain = batch_translation_prompt | get_llm()
+        result = await chain.ainvoke({'items': _batch_items(pending)}, config={'tags': ['translation']})
+        batch = _remember_batch(result.content, pending)
+        return _finish(texts, {**translations, **batch}, 1)
+    except Exception as e:
+        print(f"Batch translation failed, translating per field: {e}")
+        metrics.increment('translation.batch.fallbacks')
+
+    semaphore = asyncio.Semaphore(TRANSLATION_FALLBACK_WORKERS)
+
+    async def translate(text):
+        async with semaphore:
+            return await atranslate_to_hindi(text)
+
+    translated = await asyncio.gather(*(translate(text) for text in pending))
+    return _finish(texts, {**translations, **dict(zip(pending, translated))}, 1 + len(pending))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export or import the translation memory')
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('path', help='JSON lines file')
+    args = parser.parse_args()
+
+    if translation_memory is None:
+        parser.error('TRANSLATION_MEMORY_ENABLED is false')
+    if args.action == 'export':
+        print(f"Exported {translation_memory.export(args.path)} translations to {args.path}")
+    else:
+        print(f"Imported {translation_memory.import_file(args.path)} translations from {args.path}")